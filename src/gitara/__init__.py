@@ -0,0 +1,4 @@
+import time
+
+# When gitara was first imported, where the `imports` stage of `--timings` starts.
+STARTED = time.perf_counter()
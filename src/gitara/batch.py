@@ -0,0 +1,85 @@
+import time
+from collections.abc import Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+
+from gitara.model_client import DistilLabsLLM
+from gitara.renderer import render_git_command
+from gitara.timings import collect, span
+
+DEFAULT_CONCURRENCY = 4
+
+
+def translate(client: DistilLabsLLM, query: str, timings: bool = False) -> dict:
+    """
+    Translate one query into a batch result record, capturing any error instead of raising.
+
+    With `timings`, the record holds the query's stages under "timings" (see `gitara.timings`).
+    """
+    start = time.perf_counter()
+    tool_call: dict | None
+    command: str | None
+    with collect(start) if timings else nullcontext() as recorded:
+        try:
+            tool_call = client.invoke(query)
+            with span("render"):
+                command = render_git_command(tool_call)
+            error = None
+        except Exception as e:
+            tool_call = command = None
+            error = str(e) or repr(e)
+    record = {
+        "query": query,
+        "tool_call": tool_call,
+        "command": command,
+        "latency": round(time.perf_counter() - start, 6),
+        "error": error,
+    }
+    if recorded is not None:
+        record["timings"] = recorded.to_dict()
+    return record
+
+
+def translate_many(
+    client: DistilLabsLLM,
+    queries: Iterable[str],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    ordered: bool = True,
+    timings: bool = False,
+) -> Iterator[dict]:
+    """
+    Translate queries concurrently over one shared client, yielding records as they complete.
+
+    At most `concurrency` requests are in flight. Queries are read lazily and at most
+    `2 * concurrency` results are held at once, so arbitrarily long inputs run in constant
+    memory. With `ordered`, records are yielded in input order (a slow query holds back
+    the ones after it); otherwise they are yielded in completion order. With `timings`, each
+    record holds the stages of its query (see `translate`).
+    """
+    window = 2 * concurrency
+    pending: dict[Future, int] = {}
+    finished: dict[int, dict] = {}
+    next_index = 0
+    queue = enumerate(queries)
+    exhausted = False
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while True:
+            while not exhausted and len(pending) + len(finished) < window:
+                try:
+                    index, query = next(queue)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending[pool.submit(translate, client, query, timings)] = index
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                if ordered:
+                    finished[index] = future.result()
+                else:
+                    yield future.result()
+            while next_index in finished:
+                yield finished.pop(next_index)
+                next_index += 1
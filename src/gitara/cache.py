@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_MAX_ENTRIES = 10_000
+DEFAULT_TTL = 30 * 24 * 60 * 60
+
+
+def cache_dir() -> Path:
+    """Return gitara's cache directory, following the XDG base directory spec."""
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "gitara"
+
+
+def normalize_question(question: str) -> str:
+    # Only whitespace is normalized: branch names, paths and messages are case sensitive.
+    return " ".join(question.split())
+
+
+class ResponseCache:
+    """
+    Persistent SQLite cache of tool calls keyed on (namespace, normalized question).
+
+    The namespace should identify everything the answer depends on apart from the question
+    (model name, tool schema, prompt), so that changing any of them misses old entries.
+    Entries expire after `ttl` seconds and the least recently used ones are evicted once
+    the cache holds more than `max_entries`.
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike | None = None,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl: float = DEFAULT_TTL,
+    ) -> None:
+        self.path = Path(path) if path is not None else cache_dir() / "responses.sqlite3"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+
+    @staticmethod
+    def make_key(namespace: str, question: str) -> str:
+        return hashlib.sha256(f"{namespace}\0{normalize_question(question)}".encode()).hexdigest()
+
+    def get(self, namespace: str, question: str) -> dict | None:
+        key = self.make_key(namespace, question)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, created_at = row
+            if now - created_at > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(value)
+
+    def put(self, namespace: str, question: str, tool_call: dict) -> None:
+        key = self.make_key(namespace, question)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(tool_call), now, now),
+            )
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+        [count] = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed_at ASC LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+
+    def __len__(self) -> int:
+        with self._lock:
+            [count] = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        return count
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -1,48 +1,288 @@
 import json
 import sys
+import time
+from contextlib import nullcontext
 
 import click
 
+import gitara
+from gitara import daemon as gitara_daemon
+from gitara import lifecycle
+from gitara.batch import DEFAULT_CONCURRENCY, translate_many
+from gitara.cache import ResponseCache
+from gitara.grammar import DECODING_MODES, DEFAULT_DECODING
+from gitara.hedging import HedgePolicy
+from gitara.intent import IntentClassifier
 from gitara.model_client import DistilLabsLLM
-from gitara.renderer import render_git_command
+from gitara.nearest import NearestIndex
+from gitara.renderer import render_git_command, render_many
+from gitara.repair import RepairError, parse_message
+from gitara.rules import RuleSet
+from gitara.streaming import ToolCallStream
+from gitara.timings import Timings, add_span, collect, span, summarize
+from gitara.tools import DEFAULT_TOOL_PROFILE, TOOL_PROFILES
+from gitara.validation import VALIDATOR
+
+IMPORTED = time.perf_counter()
 
 MODEL = "gitara"
 PORT = 11434
 
 
 def parse_tool_call(response: str) -> dict | None:
+    """Parse a tool call from the model's text, repairing what it can; None if that fails or the call is invalid."""
     try:
-        tool_call = json.loads(response)
-        if not isinstance(tool_call, dict):
-            return None
+        tool_call, _ = parse_message([], response)
+    except RepairError:
+        return None
+    if VALIDATOR.errors(tool_call):
+        return None
+    return tool_call
 
-        if "name" not in tool_call:
-            return None
 
-        if "arguments" in tool_call and isinstance(tool_call["arguments"], str):
-            try:
-                tool_call["arguments"] = json.loads(tool_call["arguments"])
-            except json.JSONDecodeError:
-                pass
-        return tool_call
+def show_timings(timings: Timings) -> None:
+    for line in timings.format():
+        click.secho(f"# {line}", fg="cyan", err=True)
 
-    except json.JSONDecodeError:
-        return None
 
+_endpoints = click.option(
+    "--endpoint",
+    "endpoints",
+    multiple=True,
+    envvar="GITARA_ENDPOINTS",
+    help="Base URL of an OpenAI-compatible backend; repeat to spread requests over several "
+    f"[default: http://127.0.0.1:{PORT}/v1]",
+)
+_keep_alive = click.option(
+    "--keep-alive",
+    envvar="GITARA_KEEP_ALIVE",
+    help="How long the backend keeps the model loaded after each request, as seconds or e.g. 30m; -1 for ever "
+    "(Ollama) [default: the backend's]",
+)
 
-@click.command()
-@click.argument("query", type=str)
-@click.option("--show-json", is_flag=True, help="Also show tool call JSON")
-def main(query, show_json):
+
+class DefaultCommandGroup(click.Group):
+    """A group that runs its `query` command when the first argument is not a subcommand, so `gitara QUERY` works."""
+
+    def parse_args(self, ctx: click.Context, args: list[str]) -> list[str]:
+        if not args or (args[0] not in self.commands and args[0] not in ctx.help_option_names):
+            args.insert(0, "query")
+        return super().parse_args(ctx, args)
+
+
+@click.group(cls=DefaultCommandGroup)
+def main():
     """Git Assistant - Convert natural language to git commands"""
+
+
+@main.command("query")
+@click.argument("query", type=str, required=False)
+@click.option("--show-json", is_flag=True, help="Also show tool call JSON")
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    help="Always query the model, skipping the rules, the response cache and the nearest-neighbour bypass",
+)
+@click.option(
+    "--templates",
+    is_flag=True,
+    help="Also answer from the cached answer to a question that differs only in branch names, paths, messages "
+    "or counts (about 3% of these answers differ from the model's)",
+)
+@click.option(
+    "--bypass",
+    "use_bypass",
+    is_flag=True,
+    help="Answer questions close to a training question from the nearest-neighbour index, without calling the "
+    "model (build the index with python -m gitara.nearest build)",
+)
+@click.option(
+    "--bypass-shadow",
+    is_flag=True,
+    help="Always query the model, and show what the nearest-neighbour bypass would have answered",
+)
+@click.option(
+    "--stream",
+    is_flag=True,
+    help="Stream the model's answer, stop reading once the tool call is complete, and show timings",
+)
+@click.option(
+    "--prune-tools",
+    is_flag=True,
+    help="Send only the tool schemas the intent classifier picks (train it with python -m gitara.intent train)",
+)
+@click.option(
+    "--tool-profile",
+    type=click.Choice(list(TOOL_PROFILES)),
+    default=DEFAULT_TOOL_PROFILE,
+    show_default=True,
+    help="How verbose the tool schemas sent to the model are",
+)
+@click.option(
+    "--decoding",
+    type=click.Choice(DECODING_MODES),
+    default=DEFAULT_DECODING,
+    show_default=True,
+    help="How the answer is kept to one valid tool call: native tool calling, or a JSON schema or GBNF grammar "
+    "for backends that support them",
+)
+@_endpoints
+@_keep_alive
+@click.option(
+    "--hedge",
+    "hedge_percentile",
+    type=click.FloatRange(0, 100, min_open=True),
+    help="Send a duplicate request to another endpoint when the model has not answered within this percentile "
+    "of recent latencies (at most 10% of requests; needs a second --endpoint or --hedge-model)",
+)
+@click.option("--hedge-model", help="Send hedged requests to this model instead of another endpoint")
+@click.option(
+    "--batch",
+    type=click.File("r"),
+    help="Translate every line of a file ('-' for stdin) and write JSONL results to stdout",
+)
+@click.option(
+    "--concurrency",
+    type=click.IntRange(min=1),
+    default=DEFAULT_CONCURRENCY,
+    show_default=True,
+    help="Maximum number of requests in flight in batch mode",
+)
+@click.option(
+    "--unordered", is_flag=True, help="In batch mode, write results as they complete instead of in input order"
+)
+@click.option(
+    "--timings",
+    is_flag=True,
+    help="Show how long each stage took and the tokens used on stderr; in batch mode, add them to each result "
+    "and show per-stage percentiles",
+)
+@click.option(
+    "--timings-json",
+    type=click.File("a"),
+    help="Append each query's stages and tokens to this file as a JSON line, for aggregating into percentiles",
+)
+def query_command(
+    query,
+    show_json,
+    no_cache,
+    templates,
+    use_bypass,
+    bypass_shadow,
+    stream,
+    prune_tools,
+    tool_profile,
+    decoding,
+    endpoints,
+    keep_alive,
+    hedge_percentile,
+    hedge_model,
+    batch,
+    concurrency,
+    unordered,
+    timings,
+    timings_json,
+):
+    """Convert QUERY to a git command (the default when no subcommand is given)"""
+    if (query is None) == (batch is None):
+        raise click.UsageError("Pass either a QUERY or --batch FILE")
+    if stream and decoding != "tools":
+        raise click.UsageError(f"--stream cannot be used with --decoding {decoding}")
+    if hedge_percentile and len(endpoints) < 2 and not hedge_model:
+        raise click.UsageError("--hedge needs a second --endpoint or a --hedge-model to send the duplicate to")
+    timed = timings or timings_json is not None
     try:
-        client = DistilLabsLLM(model_name=MODEL, port=PORT)
-        tool_call = client.invoke(query)
+        with collect(gitara.STARTED) if timed and batch is None else nullcontext() as recorded:
+            add_span("imports", gitara.STARTED, IMPORTED)
+            with span("setup"):
+                cache = None if no_cache else ResponseCache()
+                bypass = None
+                if (use_bypass or bypass_shadow) and not no_cache and (bypass := NearestIndex.load()) is None:
+                    raise click.UsageError("No bypass index, build one with: python -m gitara.nearest build")
+                tool_filter = None
+                if prune_tools and (tool_filter := IntentClassifier.load()) is None:
+                    raise click.UsageError("No intent classifier, train one with: python -m gitara.intent train")
+                rules = None if no_cache else RuleSet.load()
+                client = DistilLabsLLM(
+                    model_name=MODEL,
+                    port=PORT,
+                    endpoints=list(endpoints),
+                    hedge=HedgePolicy(hedge_percentile, model=hedge_model) if hedge_percentile else None,
+                    cache=cache,
+                    templates=templates,
+                    bypass=bypass,
+                    bypass_shadow=bypass_shadow,
+                    rules=rules,
+                    stream=stream,
+                    tool_filter=tool_filter,
+                    tool_profile=tool_profile,
+                    decoding=decoding,
+                    keep_alive=lifecycle.parse_keep_alive(keep_alive),
+                )
+
+            if batch is None:
+                streamed: list[ToolCallStream] = []
+                live = sys.stderr.isatty()
+
+                def show_partial(state: ToolCallStream) -> None:
+                    streamed[:] = [state]
+                    if live and state.name:
+                        click.echo(f"\r\033[K# {render_git_command(state.tool_call())}", err=True, nl=False)
+
+                tool_call = client.invoke(query, on_partial=show_partial if stream else None)
+                with span("render"):
+                    command = render_git_command(tool_call) if tool_call else None
+
+        if batch is not None:
+            queries = (line.strip() for line in batch if line.strip())
+            failed = 0
+            records = []
+            for record in translate_many(
+                client, queries, concurrency=concurrency, ordered=not unordered, timings=timed
+            ):
+                failed += record["error"] is not None
+                if timed:
+                    records.append({"query": record["query"], "timings": record["timings"]})
+                    if timings_json is not None:
+                        timings_json.write(json.dumps(records[-1]) + "\n")
+                    if not timings:
+                        del record["timings"]
+                click.echo(json.dumps(record))
+            if len(endpoints) > 1:
+                for stats in client.pool.stats():
+                    click.secho(f"# Endpoint: {json.dumps(stats)}", fg="cyan", err=True)
+            if client.hedge is not None:
+                click.secho(f"# Hedging: {json.dumps(client.hedge.stats())}", fg="cyan", err=True)
+            if client.coalescer.coalesced:
+                click.secho(f"# Coalescing: {json.dumps(client.coalescer.stats())}", fg="cyan", err=True)
+            if timings:
+                click.secho(f"# Timings: {json.dumps(summarize(records))}", fg="cyan", err=True)
+            if failed:
+                click.secho(f"Error: {failed} queries failed", fg="red", err=True)
+                sys.exit(1)
+            return
+
+        if streamed:
+            if live:
+                click.echo("\r\033[K", err=True, nl=False)
+            [state] = streamed
+            ttft = "none" if state.ttft is None else f"{state.ttft:.3f}s"
+            click.secho(
+                f"# Time to first token: {ttft}, to complete tool call: {state.time_to_call:.3f}s",
+                fg="cyan",
+                err=True,
+            )
+        for entry in client.bypass_log:
+            click.secho(f"# Bypass shadow: {json.dumps(entry)}", fg="yellow", err=True)
+        if timings:
+            show_timings(recorded)
+        if timings_json is not None:
+            timings_json.write(json.dumps({"query": query, "timings": recorded.to_dict()}) + "\n")
 
         if tool_call:
             if show_json:
                 click.secho(f"# Tool call: {tool_call}", fg="cyan", err=True)
-            click.echo(render_git_command(tool_call))
+            click.echo(command)
             return
         click.secho(f"Error: Could not parse tool call from '{tool_call}'", fg="red", err=True)
         sys.exit(1)
@@ -52,5 +292,120 @@ def main(query, show_json):
         sys.exit(1)
 
 
+@main.command("render")
+@click.option(
+    "--jsonl",
+    type=click.File("r"),
+    required=True,
+    help="JSONL file ('-' for stdin) of finetuning examples or tool calls to render as git commands",
+)
+@click.option(
+    "--workers",
+    type=click.IntRange(min=0),
+    default=0,
+    show_default=True,
+    help="Render in this many processes, for large files",
+)
+@click.option("--validate", is_flag=True, help="Report tool calls that do not match their schema as errors")
+def render_command(jsonl, workers, validate):
+    """Render the tool calls of a JSONL file as git commands, writing JSONL results to stdout"""
+    failed = 0
+    for record in render_many(jsonl, workers=workers, validate=validate):
+        failed += record["error"] is not None
+        click.echo(json.dumps(record))
+    if failed:
+        click.secho(f"Error: {failed} rows failed", fg="red", err=True)
+        sys.exit(1)
+
+
+@main.command()
+@_endpoints
+@_keep_alive
+def warmup(endpoints, keep_alive):
+    """Load the model on the backend before the first query needs it, and keep it loaded for --keep-alive"""
+    client = DistilLabsLLM(
+        model_name=MODEL, port=PORT, endpoints=list(endpoints), keep_alive=lifecycle.parse_keep_alive(keep_alive)
+    )
+    failed = False
+    for result in lifecycle.warmup(client):
+        if "error" in result:
+            failed = True
+            click.secho(f"Error: {result['url']}: {result['error']}", fg="red", err=True)
+        else:
+            click.echo(f"{result['url']}: model ready after {result['seconds']:.2f}s")
+    client.close()
+    if failed:
+        sys.exit(1)
+
+
+@main.command()
+@_endpoints
+def unload(endpoints):
+    """Free the memory the model takes on the backend (Ollama only)"""
+    client = DistilLabsLLM(model_name=MODEL, port=PORT, endpoints=list(endpoints))
+    failed = False
+    for result in lifecycle.unload(client):
+        if "error" in result:
+            failed = True
+            click.secho(f"Error: {result['url']}: {result['error']}", fg="red", err=True)
+        else:
+            click.echo(f"{result['url']}: model unloaded")
+    client.close()
+    if failed:
+        sys.exit(1)
+
+
+@main.group()
+def daemon():
+    """Manage a background gitara process that keeps the model client warm"""
+
+
+@daemon.command()
+@click.option(
+    "--bypass",
+    "use_bypass",
+    is_flag=True,
+    help="Answer questions close to a training question from the nearest-neighbour index, without calling the model",
+)
+@click.option("--prune-tools", is_flag=True, help="Send only the tool schemas the intent classifier picks")
+@_endpoints
+@_keep_alive
+def start(use_bypass, prune_tools, endpoints, keep_alive):
+    """Start the daemon, if it is not running yet"""
+    try:
+        status = gitara_daemon.start(
+            MODEL, PORT, bypass=use_bypass, prune_tools=prune_tools, endpoints=list(endpoints), keep_alive=keep_alive
+        )
+    except RuntimeError as e:
+        click.secho(f"Error: {e}", fg="red", err=True)
+        sys.exit(1)
+    click.echo(f"gitara daemon running (pid {status['pid']}) on {status['socket']}")
+    if status.get("settings") != {"endpoints": list(endpoints), "keep_alive": lifecycle.parse_keep_alive(keep_alive)}:
+        click.secho(
+            "Warning: the running daemon uses other endpoints or another keep-alive; "
+            "stop it and start it again to use these",
+            fg="yellow",
+            err=True,
+        )
+
+
+@daemon.command()
+def stop():
+    """Stop the running daemon"""
+    if not gitara_daemon.stop():
+        click.echo("gitara daemon is not running")
+        return
+    click.echo("gitara daemon stopped")
+
+
+@daemon.command()
+def status():
+    """Show whether the daemon is running, with its request and cache statistics"""
+    if (daemon_status := gitara_daemon.status()) is None:
+        click.echo("gitara daemon is not running")
+        sys.exit(1)
+    click.echo(json.dumps(daemon_status, indent=2))
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,97 @@
+import asyncio
+import copy
+import threading
+from collections.abc import Awaitable, Callable, Hashable
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time; callers that arrive while it runs share its result.
+
+    The first caller with a key runs the call in its own thread, and later callers wait for it
+    and get a copy of its result, or its exception raised again. Once the call has finished,
+    the next caller with the key runs it anew: results are not kept (that is the cache's job).
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, call: Callable[[], object]):
+        future: Future = Future()
+        with self._lock:
+            running = self._calls.get(key)
+            if running is None:
+                self._calls[key] = future
+                self.calls += 1
+            else:
+                self.coalesced += 1
+        if running is not None:
+            return copy.deepcopy(running.result())
+        try:
+            result = call()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            requests = self.calls + self.coalesced
+            return {
+                "requests": requests,
+                "coalesced": self.coalesced,
+                "coalesced_rate": round(self.coalesced / requests, 4) if requests else None,
+                "in_flight": len(self._calls),
+            }
+
+
+class AsyncSingleFlight:
+    """
+    asyncio counterpart of `SingleFlight`.
+
+    The call runs in its own task, which callers await without owning it: a caller that is
+    cancelled or times out stops waiting, and the call is only cancelled once every caller has.
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[Hashable, tuple[asyncio.Task, list[int]]] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable]):
+        if (entry := self._calls.get(key)) is None:
+            task = asyncio.ensure_future(call())
+            entry = self._calls[key] = (task, [0])
+            task.add_done_callback(lambda _: self._calls.pop(key, None) if self._calls.get(key) is entry else None)
+            self.calls += 1
+            leader = True
+        else:
+            self.coalesced += 1
+            leader = False
+        task, waiters = entry
+        waiters[0] += 1
+        try:
+            result = await asyncio.shield(task)
+        finally:
+            waiters[0] -= 1
+            if not waiters[0] and not task.done():
+                task.cancel()
+        return result if leader else copy.deepcopy(result)
+
+    def stats(self) -> dict:
+        requests = self.calls + self.coalesced
+        return {
+            "requests": requests,
+            "coalesced": self.coalesced,
+            "coalesced_rate": round(self.coalesced / requests, 4) if requests else None,
+            "in_flight": len(self._calls),
+        }
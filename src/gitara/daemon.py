@@ -0,0 +1,236 @@
+import argparse
+import json
+import os
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+from gitara.batch import translate
+from gitara.cache import ResponseCache, cache_dir
+from gitara.launcher import request, socket_path
+from gitara.lifecycle import parse_keep_alive
+from gitara.intent import IntentClassifier
+from gitara.model_client import DistilLabsLLM
+from gitara.nearest import NearestIndex
+from gitara.rules import RuleSet
+
+START_TIMEOUT = 15.0
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        # One JSON request per line; a connection may send several.
+        for line in self.rfile:
+            try:
+                response = self.server.dispatch(json.loads(line))  # type: ignore[attr-defined]
+            except Exception as e:
+                response = {"error": str(e) or repr(e)}
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+            if response.get("stopping"):
+                # Only after replying: the process exits as soon as serve_forever returns.
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return
+
+
+class DaemonServer(socketserver.ThreadingUnixStreamServer):
+    """
+    A long-lived gitara process serving queries over a Unix socket.
+
+    It keeps a warm client (with its backend connection pool), the response cache, the rules and,
+    with `bypass`, the nearest-neighbour index open across requests, so each query only pays for
+    the model call itself, or for nothing on a rule, cache or bypass hit. Requests are
+    `{"op": "invoke", "query": ..., "no_cache": ..., "settings": ...}`, `{"op": "status"}` or
+    `{"op": "shutdown"}`. An invoke whose `settings` (the caller's `endpoints` and `keep_alive`)
+    differ from the daemon's is not answered but gets `{"settings_differ": true}`, so that the caller can run the
+    query itself rather than have its settings ignored.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        path: str,
+        model_name: str,
+        port: int,
+        cache: ResponseCache | None = None,
+        bypass: bool = False,
+        prune_tools: bool = False,
+        endpoints: list[str] | None = None,
+        keep_alive: str | int | None = None,
+    ) -> None:
+        self.model_name = model_name
+        self.port = port
+        self.endpoints = list(endpoints or [])
+        self.keep_alive = keep_alive
+        self.cache = cache if cache is not None else ResponseCache()
+        tool_filter = IntentClassifier.load() if prune_tools else None
+        if prune_tools and tool_filter is None:
+            raise RuntimeError("No intent classifier, train one with: python -m gitara.intent train")
+        index = NearestIndex.load() if bypass else None
+        if bypass and index is None:
+            raise RuntimeError("No bypass index, build one with: python -m gitara.nearest build")
+        self.client = DistilLabsLLM(
+            model_name=model_name,
+            port=port,
+            endpoints=self.endpoints,
+            keep_alive=keep_alive,
+            cache=self.cache,
+            bypass=index,
+            rules=RuleSet.load(),
+            tool_filter=tool_filter,
+        )
+        self.uncached_client = DistilLabsLLM(
+            model_name=model_name, tool_filter=tool_filter, pool=self.client.pool, keep_alive=keep_alive
+        )
+        self.started_at = time.time()
+        self.requests_served = 0
+        self._lock = threading.Lock()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True, mode=0o700)
+        if os.path.exists(path):
+            if request({"op": "status"}, path=path) is not None:
+                raise RuntimeError(f"A gitara daemon is already listening on {path}")
+            os.unlink(path)
+        super().__init__(path, DaemonHandler)
+        os.chmod(path, 0o600)
+
+    def dispatch(self, payload: dict) -> dict:
+        match payload.get("op"):
+            case "invoke":
+                if "settings" in payload and self.parse_settings(payload["settings"]) != self.settings():
+                    return {"settings_differ": True}
+                with self._lock:
+                    self.requests_served += 1
+                client = self.uncached_client if payload.get("no_cache") else self.client
+                return translate(client, payload["query"])
+            case "status":
+                return self.status()
+            case "shutdown":
+                return {"stopping": True}
+            case op:
+                return {"error": f"Unknown daemon op: {op}"}
+
+    def settings(self) -> dict:
+        """The settings a query's environment must have to be answered here, as `gitara.launcher` sends them."""
+        return {"endpoints": self.endpoints, "keep_alive": self.keep_alive}
+
+    @staticmethod
+    def parse_settings(settings: dict) -> dict:
+        """A query's settings as `settings` holds them, with its keep-alive parsed as the CLI parses it."""
+        return {"endpoints": settings.get("endpoints", []), "keep_alive": parse_keep_alive(settings.get("keep_alive"))}
+
+    def status(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "socket": self.server_address,
+            "model": self.model_name,
+            "port": self.port,
+            "uptime": round(time.time() - self.started_at, 3),
+            "requests": self.requests_served,
+            "cache_hits": self.cache.hits,
+            "cache_misses": self.cache.misses,
+            "bypass_hits": self.client.bypass_hits,
+            "rule_hits": self.client.rule_hits,
+            "repairs": dict(self.client.repairs + self.uncached_client.repairs),
+            "requeries": self.client.requeries + self.uncached_client.requeries,
+            "coalesced": self.client.coalescer.coalesced + self.uncached_client.coalescer.coalesced,
+            "endpoints": self.client.pool.stats(),
+            "settings": self.settings(),
+        }
+
+    def server_close(self) -> None:
+        super().server_close()
+        try:
+            os.unlink(self.server_address)  # type: ignore[arg-type]
+        except FileNotFoundError:
+            pass
+
+
+def start(
+    model_name: str,
+    port: int,
+    path: str | None = None,
+    bypass: bool = False,
+    prune_tools: bool = False,
+    endpoints: list[str] | None = None,
+    keep_alive: str | None = None,
+) -> dict:
+    """Start a daemon in the background unless one is already running; return its status."""
+    path = path or socket_path()
+    if (status := request({"op": "status"}, path=path)) is not None:
+        return status
+    command = [sys.executable, "-m", "gitara.daemon", "--model", model_name, "--port", str(port), "--socket", path]
+    if bypass:
+        command.append("--bypass")
+    if prune_tools:
+        command.append("--prune-tools")
+    for endpoint in endpoints or []:
+        command += ["--endpoint", endpoint]
+    if keep_alive is not None:
+        # With `=`, as a keep-alive of -1 would otherwise read as an option.
+        command.append(f"--keep-alive={keep_alive}")
+    log_path = cache_dir() / "daemon.log"
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(log_path, "ab") as log:
+        process = subprocess.Popen(
+            command,
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        if (status := request({"op": "status"}, path=path)) is not None:
+            return status
+        if process.poll() is not None:
+            raise RuntimeError(f"gitara daemon exited with status {process.returncode}, see {log_path}")
+        time.sleep(0.05)
+    process.terminate()
+    raise RuntimeError(f"gitara daemon did not start within {START_TIMEOUT:.0f}s, see {log_path}")
+
+
+def stop(path: str | None = None) -> bool:
+    """Ask the daemon to shut down and wait for its socket to go away; return False if none was running."""
+    path = path or socket_path()
+    if request({"op": "shutdown"}, path=path) is None:
+        return False
+    deadline = time.monotonic() + START_TIMEOUT
+    while os.path.exists(path) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return True
+
+
+def status(path: str | None = None) -> dict | None:
+    return request({"op": "status"}, path=path)
+
+
+def serve(model_name: str, port: int, path: str, **kwargs) -> None:
+    with DaemonServer(path, model_name=model_name, port=port, **kwargs) as server:
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", type=str, default="gitara", required=False)
+    parser.add_argument("--port", type=int, default=11434, required=False)
+    parser.add_argument("--socket", type=str, default=None, required=False)
+    parser.add_argument("--bypass", action="store_true", help="Answer near-duplicate questions from the bypass index")
+    parser.add_argument("--prune-tools", action="store_true", help="Send only the tools the intent classifier picks")
+    parser.add_argument("--endpoint", dest="endpoints", action="append", help="Base URL of a backend; repeatable")
+    parser.add_argument("--keep-alive", help="How long the backend keeps the model loaded, as seconds or e.g. 30m")
+    args = parser.parse_args()
+
+    serve(
+        args.model,
+        args.port,
+        args.socket or socket_path(),
+        bypass=args.bypass,
+        prune_tools=args.prune_tools,
+        endpoints=args.endpoints,
+        keep_alive=parse_keep_alive(args.keep_alive),
+    )
@@ -0,0 +1,297 @@
+import hashlib
+import json
+import sys
+import unicodedata
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from contextlib import ExitStack
+from pathlib import Path
+
+import click
+
+from gitara.dataset import DEFAULT_CHUNK_SIZE, map_chunks
+from gitara.leakage import DEFAULT_NUM_PERM, DEFAULT_SHINGLE_SIZE, DEFAULT_THRESHOLD, find_leaks
+from gitara.rules import normalize
+from gitara.tools import TOOLS
+from gitara.validation import VALIDATOR
+
+DEFAULT_TEST_FRACTION = 0.1
+TOOL_INDEX = {tool["function"]["name"]: i for i, tool in enumerate(TOOLS)}
+
+
+def normalize_question(question: str) -> str:
+    """The question as written to the output: NFC, with whitespace collapsed."""
+    return " ".join(unicodedata.normalize("NFC", question).split())
+
+
+def _digest(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "little")
+
+
+def prepare_row(text: str) -> dict:
+    """
+    Parse and validate one finetuning row, and compute the keys it is deduplicated on.
+
+    `exact` identifies the row as written; `question_key` its question up to case, spacing,
+    quote and dash style and trailing punctuation; `answer_key` its tool call up to argument
+    order and arguments left at their default.
+    """
+    try:
+        row = json.loads(text)
+        question = normalize_question(row["question"])
+        answer = json.loads(row["answer"])
+        tool_call = {"name": answer["name"], "arguments": answer.get("parameters", {})}
+    except (ValueError, KeyError, TypeError) as e:
+        return {"status": "invalid_json", "errors": [f"{type(e).__name__}: {e}"]}
+    if errors := VALIDATOR.errors(tool_call):
+        return {"status": "invalid_call", "errors": errors, "tool": tool_call.get("name")}
+    canonical = json.dumps(VALIDATOR.normalize(tool_call), sort_keys=True)
+    return {
+        "status": "ok",
+        "question": question,
+        "answer": row["answer"],
+        "tool_call": tool_call,
+        "exact": _digest(question + "\0" + canonical),
+        "question_key": _digest(normalize(question).lower()),
+        "answer_key": _digest(canonical),
+    }
+
+
+def _prepare_chunk(chunk: list[str]) -> list[dict]:
+    return [prepare_row(text) for text in chunk]
+
+
+def new_report() -> dict:
+    return {
+        "rows": 0,
+        "accepted": 0,
+        "rejected": Counter(),
+        "by_tool": Counter(),
+        "by_argument": {},
+        "errors": Counter(),
+    }
+
+
+def scan(
+    lines: Iterable[str],
+    report: dict,
+    near_duplicates: bool = True,
+    workers: int = 0,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[dict]:
+    """
+    Yield the valid, distinct rows of `lines`, counting everything in `report`.
+
+    Rows are parsed and validated in `workers` processes (see `map_chunks`); deduplication
+    happens here and keeps one 64-bit hash per distinct row and per distinct question, the
+    only memory that grows with the input. Rejected rows are counted as `invalid_json`,
+    `invalid_call`, `duplicate` (the same question and answer), `near_duplicate` (the same
+    answer to a question that differs only in case, spacing or punctuation) and `conflict` (a
+    different answer to such a question, which the first answer wins).
+    """
+    seen: set[int] = set()
+    answers: dict[int, int] = {}
+    rows = (text for text in lines if text.strip())
+    for row in map_chunks(_prepare_chunk, rows, workers, chunk_size):
+        report["rows"] += 1
+        status = row["status"]
+        if status == "ok":
+            if row["exact"] in seen:
+                status = "duplicate"
+            elif (first := answers.get(row["question_key"])) is not None:
+                if first != row["answer_key"]:
+                    status = "conflict"
+                elif near_duplicates:
+                    status = "near_duplicate"
+        if status != "ok":
+            report["rejected"][status] += 1
+            report["errors"].update(row.get("errors", []))
+            continue
+        seen.add(row["exact"])
+        answers.setdefault(row["question_key"], row["answer_key"])
+        tool = row["tool_call"]["name"]
+        report["accepted"] += 1
+        report["by_tool"][tool] += 1
+        report["by_argument"].setdefault(tool, Counter()).update(row["tool_call"]["arguments"].keys())
+        yield row
+
+
+class StratifiedSplitter:
+    """
+    Deterministic train/test split and sharding that keeps each tool's share everywhere.
+
+    Within each tool, rows go to the test split at evenly spaced positions so that exactly
+    `test_fraction` of them (rounded down) are test rows at any point, and round-robin over
+    the shards of their split, starting at a different shard for each tool. The result only
+    depends on the order of the input.
+    """
+
+    def __init__(self, test_fraction: float = DEFAULT_TEST_FRACTION, shards: int = 1) -> None:
+        self.test_fraction = test_fraction
+        self.shards = shards
+        self.seen: Counter[str] = Counter()
+        self.placed: Counter[tuple[str, str]] = Counter()
+
+    def assign(self, tool: str) -> tuple[str, int]:
+        """Return the split and shard of the next row of `tool`."""
+        n = self.seen[tool]
+        self.seen[tool] += 1
+        split = "test" if int((n + 1) * self.test_fraction) > int(n * self.test_fraction) else "train"
+        shard = (self.placed[split, tool] + TOOL_INDEX.get(tool, 0)) % self.shards
+        self.placed[split, tool] += 1
+        return split, shard
+
+
+def shard_name(split: str, shard: int, shards: int) -> str:
+    return f"{split}.jsonl" if shards == 1 else f"{split}-{shard:05d}-of-{shards:05d}.jsonl"
+
+
+def finish_report(report: dict) -> dict:
+    """`report` with its counters as plain, sorted dicts, ready for JSON."""
+    return {
+        **report,
+        "rejected": dict(report["rejected"].most_common()),
+        "by_tool": dict(report["by_tool"].most_common()),
+        "by_argument": {
+            tool: dict(report["by_argument"][tool].most_common()) for tool in sorted(report["by_argument"])
+        },
+        "errors": dict(report["errors"].most_common(20)),
+    }
+
+
+def build(
+    paths: list[str],
+    out_dir: Path,
+    test_fraction: float = DEFAULT_TEST_FRACTION,
+    shards: int = 1,
+    near_duplicates: bool = True,
+    workers: int = 0,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> dict:
+    """Write the valid, distinct rows of `paths` to stratified train and test shards in `out_dir`; return the report."""
+    report = new_report()
+    splitter = StratifiedSplitter(test_fraction, shards)
+    counts: Counter[str] = Counter()
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with ExitStack() as stack:
+        files = {
+            (split, shard): stack.enter_context(open(out_dir / shard_name(split, shard, shards), "w"))
+            for split in ("train", "test")
+            for shard in range(shards)
+        }
+        lines = (line for path in paths for line in stack.enter_context(open(path)))
+        for row in scan(lines, report, near_duplicates, workers, chunk_size):
+            split, shard = splitter.assign(row["tool_call"]["name"])
+            counts[shard_name(split, shard, shards)] += 1
+            files[split, shard].write(json.dumps({"question": row["question"], "answer": row["answer"]}) + "\n")
+    report = finish_report(report)
+    report["files"] = {name: counts[name] for name in sorted({shard_name(s, i, shards) for s, i in files})}
+    (out_dir / "report.json").write_text(json.dumps(report, indent=2) + "\n")
+    return report
+
+
+@click.group()
+def main():
+    """Validate, deduplicate, split and shard finetuning JSONL files"""
+
+
+_workers = click.option(
+    "--workers",
+    type=click.IntRange(min=0),
+    default=0,
+    show_default=True,
+    help="Process rows in this many worker processes",
+)
+_near = click.option(
+    "--keep-near-duplicates",
+    is_flag=True,
+    help="Only drop exact duplicates, not questions that differ only in case, spacing or punctuation",
+)
+
+
+@main.command()
+@click.argument("paths", nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@_workers
+@_near
+def validate(paths, workers, keep_near_duplicates):
+    """Report counts by tool and argument and the rows that would be rejected, without writing anything"""
+    report = new_report()
+    with ExitStack() as stack:
+        lines = (line for path in paths for line in stack.enter_context(open(path)))
+        for _ in scan(lines, report, not keep_near_duplicates, workers):
+            pass
+    report = finish_report(report)
+    click.echo(json.dumps(report, indent=2))
+    if report["rejected"].get("invalid_json") or report["rejected"].get("invalid_call"):
+        sys.exit(1)
+
+
+@main.command("build")
+@click.argument("paths", nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option("--out", type=click.Path(file_okay=False, path_type=Path), required=True, help="Output directory")
+@click.option(
+    "--test-fraction",
+    type=click.FloatRange(0, 1),
+    default=DEFAULT_TEST_FRACTION,
+    show_default=True,
+    help="Share of each tool's rows that goes to the test split",
+)
+@click.option("--shards", type=click.IntRange(min=1), default=1, show_default=True, help="Shards per split")
+@_workers
+@_near
+def build_command(paths, out, test_fraction, shards, workers, keep_near_duplicates):
+    """Write the valid, distinct rows of PATHS to tool-stratified train/test shards, with a report"""
+    report = build(list(paths), out, test_fraction, shards, not keep_near_duplicates, workers)
+    click.echo(json.dumps({key: report[key] for key in ("rows", "accepted", "rejected", "files")}, indent=2))
+
+
+@main.command()
+@click.argument("directory", required=False, type=click.Path(exists=True, file_okay=False, path_type=Path))
+@click.option(
+    "--train", type=click.Path(exists=True, dir_okay=False), help="Training set [default: DIRECTORY/train.jsonl]"
+)
+@click.option("--test", type=click.Path(exists=True, dir_okay=False), help="Test set [default: DIRECTORY/test.jsonl]")
+@click.option(
+    "--shingle-size",
+    type=click.IntRange(min=1),
+    default=DEFAULT_SHINGLE_SIZE,
+    show_default=True,
+    help="Characters per shingle",
+)
+@click.option(
+    "--threshold",
+    type=click.FloatRange(0, 1, min_open=True),
+    default=DEFAULT_THRESHOLD,
+    show_default=True,
+    help="Jaccard similarity of the questions' shingles from which a pair leaks",
+)
+@click.option(
+    "--num-perm", type=click.IntRange(min=1), default=DEFAULT_NUM_PERM, show_default=True, help="MinHash functions"
+)
+@click.option(
+    "--clean-test", type=click.Path(dir_okay=False, path_type=Path), help="Write the test rows that do not leak here"
+)
+@_workers
+def leakage(directory, train, test, shingle_size, threshold, num_perm, clean_test, workers):
+    """
+    Report test questions that (nearly) appear in the training set, using MinHash-LSH
+
+    DIRECTORY is a finetuning directory with train.jsonl and test.jsonl. Exits with 1 if any
+    test question leaks.
+    """
+    if directory is None and (train is None or test is None):
+        raise click.UsageError("Pass a DIRECTORY or both --train and --test")
+    train = train or str(directory / "train.jsonl")
+    test = test or str(directory / "test.jsonl")
+    report = find_leaks(train, test, shingle_size, threshold, num_perm, workers)
+    clean = report.pop("clean_test")
+    if clean_test is not None:
+        clean_test.write_text("".join(clean))
+        report["clean_test"] = {"path": str(clean_test), "rows": len(clean)}
+    click.echo(json.dumps(report, indent=2, ensure_ascii=False))
+    if report["pairs"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
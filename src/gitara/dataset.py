@@ -0,0 +1,44 @@
+import itertools
+import json
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def read_dataset(path: str):
+    """Yield (question, tool call) pairs from a finetuning JSONL file with double-encoded answers."""
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            answer = json.loads(row["answer"])
+            yield row["question"], {"name": answer["name"], "arguments": answer.get("parameters", {})}
+
+
+def map_chunks(
+    function: Callable[[list], list], items: Iterable, workers: int = 0, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator:
+    """
+    Apply `function` to chunks of `chunk_size` items and yield its results one by one, in input order.
+
+    With `workers`, chunks are processed in that many processes (`function` must then be
+    picklable); at most `2 * workers` chunks are in flight, so any input runs in constant
+    memory either way.
+    """
+    items = iter(items)
+    chunks = iter(lambda: list(itertools.islice(items, chunk_size)), [])
+    if not workers:
+        for chunk in chunks:
+            yield from function(chunk)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending: deque[Future] = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(function, chunk))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
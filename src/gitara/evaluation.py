@@ -0,0 +1,244 @@
+import json
+import math
+import sys
+from collections import Counter
+
+import click
+
+from gitara.batch import DEFAULT_CONCURRENCY, translate_many
+from gitara.dataset import read_dataset
+from gitara.grammar import DECODING_MODES, DEFAULT_DECODING
+from gitara.hedging import HedgePolicy
+from gitara.intent import IntentClassifier
+from gitara.model_client import DistilLabsLLM
+from gitara.nearest import THRESHOLD_GRID, NearestIndex
+from gitara.tools import DEFAULT_TOOL_PROFILE, TOOL_PROFILES, normalize_tool_call
+
+DEFAULT_DATA = "finetuning/data/test.jsonl"
+DEFAULT_OUTPUT = "eval-report.json"
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(sorted_values: list[float], q: float) -> float | None:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(q / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def evaluate(
+    client: DistilLabsLLM, rows, concurrency: int = DEFAULT_CONCURRENCY, bypass: NearestIndex | None = None
+) -> dict:
+    """
+    Run (question, expected tool call) pairs through `client` and score the answers.
+
+    Answers are compared structurally after normalizing defaults away. Latency is the
+    client-side time of each `invoke` call, including requests that failed. With a `bypass`
+    index, the report also shows, for a range of thresholds, how many rows the bypass would
+    have answered and how often its answer was right and agreed with the model's.
+    """
+    rows = iter(rows)
+    expected: dict[str, list[dict]] = {}
+
+    def questions():
+        for question, tool_call in rows:
+            expected.setdefault(question, []).append(tool_call)
+            yield question
+
+    total = correct = errors = 0
+    latencies = []
+    per_tool_rows: Counter[str] = Counter()
+    per_tool_correct: Counter[str] = Counter()
+    failures = []
+    shadow = []
+    for record in translate_many(client, questions(), concurrency=concurrency):
+        target = expected[record["query"]].pop(0)
+        tool = target["name"]
+        total += 1
+        per_tool_rows[tool] += 1
+        latencies.append(record["latency"])
+        if record["error"] is not None:
+            errors += 1
+            ok = False
+        else:
+            ok = normalize_tool_call(record["tool_call"]) == normalize_tool_call(target)
+        if ok:
+            correct += 1
+            per_tool_correct[tool] += 1
+        else:
+            failures.append({**record, "expected": target})
+        if bypass is not None and (match := bypass.nearest(record["query"], THRESHOLD_GRID[0])) is not None:
+            model_answer = normalize_tool_call(record["tool_call"]) if record["error"] is None else None
+            bypass_answer = normalize_tool_call(match.tool_call)
+            shadow.append(
+                (match.similarity, bypass_answer == normalize_tool_call(target), bypass_answer == model_answer)
+            )
+
+    latencies.sort()
+    return {
+        "model": client.model_name,
+        "rows": total,
+        "correct": correct,
+        "errors": errors,
+        "accuracy": correct / total if total else None,
+        "per_tool": {
+            tool: {
+                "rows": per_tool_rows[tool],
+                "correct": per_tool_correct[tool],
+                "accuracy": per_tool_correct[tool] / per_tool_rows[tool],
+            }
+            for tool in sorted(per_tool_rows)
+        },
+        "latency": {
+            "mean": sum(latencies) / len(latencies) if latencies else None,
+            **{f"p{q}": percentile(latencies, q) for q in PERCENTILES},
+        },
+        "failures": failures,
+        **({"bypass": bypass_report(shadow, total)} if bypass is not None else {}),
+    }
+
+
+def bypass_report(shadow: list[tuple[float, bool, bool]], total: int) -> list[dict]:
+    report = []
+    for threshold in THRESHOLD_GRID:
+        answered = [(correct, agrees) for similarity, correct, agrees in shadow if similarity >= threshold]
+        report.append(
+            {
+                "threshold": threshold,
+                "coverage": len(answered) / total if total else None,
+                "accuracy": sum(correct for correct, _ in answered) / len(answered) if answered else None,
+                "agreement": sum(agrees for _, agrees in answered) / len(answered) if answered else None,
+            }
+        )
+    return report
+
+
+@click.command()
+@click.option(
+    "--data",
+    type=click.Path(exists=True, dir_okay=False),
+    default=DEFAULT_DATA,
+    show_default=True,
+    help="JSONL test set with question and double-encoded answer fields",
+)
+@click.option("--model", default="gitara", show_default=True, help="Model name served by the backend")
+@click.option("--port", type=int, default=11434, show_default=True, help="Port of the OpenAI-compatible backend")
+@click.option(
+    "--endpoint",
+    "endpoints",
+    multiple=True,
+    help="Base URL of an OpenAI-compatible backend, instead of --port; repeat to spread requests over several",
+)
+@click.option(
+    "--hedge",
+    "hedge_percentile",
+    type=click.FloatRange(0, 100, min_open=True),
+    help="Send a duplicate request to another endpoint when the model has not answered within this percentile "
+    "of recent latencies (at most 10% of requests; needs a second --endpoint or --hedge-model)",
+)
+@click.option("--hedge-model", help="Send hedged requests to this model instead of another endpoint")
+@click.option(
+    "--concurrency",
+    type=click.IntRange(min=1),
+    default=DEFAULT_CONCURRENCY,
+    show_default=True,
+    help="Maximum number of requests in flight",
+)
+@click.option(
+    "--bypass-index",
+    type=click.Path(exists=True, dir_okay=False),
+    help="Also report how a nearest-neighbour bypass index would have done at different thresholds",
+)
+@click.option(
+    "--intent-model",
+    type=click.Path(exists=True, dir_okay=False),
+    help="Send only the tools this intent classifier picks, to measure the accuracy cost of tool pruning",
+)
+@click.option(
+    "--tool-profile",
+    type=click.Choice(list(TOOL_PROFILES)),
+    default=DEFAULT_TOOL_PROFILE,
+    show_default=True,
+    help="How verbose the tool schemas sent to the model are",
+)
+@click.option(
+    "--decoding",
+    type=click.Choice(DECODING_MODES),
+    default=DEFAULT_DECODING,
+    show_default=True,
+    help="How the answer is kept to one valid tool call: native tool calling, or a JSON schema or GBNF grammar "
+    "for backends that support them",
+)
+@click.option(
+    "--output",
+    type=click.Path(dir_okay=False, writable=True),
+    default=DEFAULT_OUTPUT,
+    show_default=True,
+    help="Where to write the JSON report",
+)
+def main(
+    data,
+    model,
+    port,
+    endpoints,
+    hedge_percentile,
+    hedge_model,
+    concurrency,
+    bypass_index,
+    intent_model,
+    tool_profile,
+    decoding,
+    output,
+):
+    """Evaluate the model's accuracy and latency on a test set"""
+    if hedge_percentile and len(endpoints) < 2 and not hedge_model:
+        raise click.UsageError("--hedge needs a second --endpoint or a --hedge-model to send the duplicate to")
+    tool_filter = None
+    if intent_model and (tool_filter := IntentClassifier.load(intent_model)) is None:
+        raise click.BadParameter("the model was trained for a different set of tools", param_hint="--intent-model")
+    client = DistilLabsLLM(
+        model_name=model,
+        port=port,
+        endpoints=list(endpoints),
+        hedge=HedgePolicy(hedge_percentile, model=hedge_model) if hedge_percentile else None,
+        tool_filter=tool_filter,
+        tool_profile=tool_profile,
+        decoding=decoding,
+    )
+    bypass = NearestIndex.load(bypass_index) if bypass_index else None
+    report = {
+        "data": data,
+        "tool_profile": tool_profile,
+        "decoding": decoding,
+        **evaluate(client, read_dataset(data), concurrency=concurrency, bypass=bypass),
+        "repairs": dict(client.repairs),
+        "requeries": client.requeries,
+        "coalescing": client.coalescer.stats(),
+        "endpoints": client.pool.stats(),
+        **({"hedging": client.hedge.stats()} if client.hedge is not None else {}),
+    }
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    if not report["rows"]:
+        click.secho(f"Error: no rows in {data}", fg="red", err=True)
+        sys.exit(1)
+
+    latency = report["latency"]
+    click.echo(f"accuracy: {report['correct']}/{report['rows']} = {report['accuracy']:.3f} ({report['errors']} errors)")
+    for tool, stats in report["per_tool"].items():
+        click.echo(f"  {tool:<12} {stats['correct']:>4}/{stats['rows']:<4} {stats['accuracy']:.3f}")
+    click.echo(
+        f"latency: mean {latency['mean']:.3f}s  " + "  ".join(f"p{q} {latency[f'p{q}']:.3f}s" for q in PERCENTILES)
+    )
+    for row in report.get("bypass", []):
+        click.echo(
+            f"bypass >= {row['threshold']:.2f}: coverage {row['coverage']:.3f}, accuracy {row['accuracy']}, agreement {row['agreement']}"
+        )
+    click.echo(f"report written to {output}")
+    if report["errors"] == report["rows"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import argparse
+import json
+
+from gitara.tools import TOOL_PROFILES, TOOLS
+
+# How the answer's format is enforced: "tools" relies on the backend's native tool calling;
+# "json_schema" sends a JSON Schema `response_format`, "gbnf" a llama.cpp grammar. Both
+# constrain decoding to exactly one {"name", "parameters"} object and need a backend that
+# supports them, so they are opt-in.
+DECODING_MODES: tuple[str, ...] = ("tools", "json_schema", "gbnf")
+DEFAULT_DECODING = "tools"
+
+# Bounds added to the schemas so that a call has a maximum size. The training data has no
+# value longer than 139 characters and no list longer than 4 items.
+STRING_MAX_LENGTH = 200
+ARRAY_MAX_ITEMS = 8
+INTEGER_MAX_DIGITS = 9
+# A JSON string cannot hold a raw newline and the answer never needs a blank line, so a
+# blank line can only follow a complete call; it stops a model that keeps emitting whitespace.
+STOP = ["\n\n"]
+
+_GBNF_COMMON = rf"""char ::= [^"\\\x00-\x1F\x7F] | "\\" ["\\/bfnrt]
+integer ::= "-"? ("0" | [1-9] [0-9]{{0,{INTEGER_MAX_DIGITS - 1}}})
+natural ::= [1-9] [0-9]{{0,{INTEGER_MAX_DIGITS - 1}}}
+boolean ::= "true" | "false"
+"""
+
+
+def _bounded(spec: dict) -> dict:
+    spec = {key: value for key, value in spec.items() if key not in ("description", "default")}
+    if spec["type"] == "string" and "enum" not in spec:
+        spec["maxLength"] = STRING_MAX_LENGTH
+    elif spec["type"] == "array":
+        spec["items"] = _bounded(spec["items"])
+        spec["maxItems"] = ARRAY_MAX_ITEMS
+    return spec
+
+
+def call_schema(tools: list[dict] = TOOLS) -> dict:
+    """JSON Schema matching exactly one call of one of `tools`, as a {"name", "parameters"} object."""
+    variants = []
+    for tool in tools:
+        function = tool["function"]
+        parameters = function["parameters"]
+        variants.append(
+            {
+                "type": "object",
+                "properties": {
+                    "name": {"const": function["name"]},
+                    "parameters": {
+                        "type": "object",
+                        "properties": {key: _bounded(spec) for key, spec in parameters["properties"].items()},
+                        "required": parameters.get("required", []),
+                        "additionalProperties": False,
+                    },
+                },
+                "required": ["name", "parameters"],
+                "additionalProperties": False,
+            }
+        )
+    return {"anyOf": variants}
+
+
+def response_format(tools: list[dict] = TOOLS) -> dict:
+    return {"type": "json_schema", "json_schema": {"name": "tool_call", "strict": True, "schema": call_schema(tools)}}
+
+
+def _literal(text: str) -> str:
+    return json.dumps(text)
+
+
+def _gbnf_value(spec: dict) -> str:
+    if "enum" in spec:
+        return " | ".join(_literal(json.dumps(value)) for value in spec["enum"])
+    if spec["type"] == "string":
+        return f'"\\"" char{{{spec.get("minLength", 0)},{STRING_MAX_LENGTH}}} "\\""'
+    if spec["type"] == "integer":
+        return "natural" if spec.get("minimum", 0) >= 1 else "integer"
+    if spec["type"] == "boolean":
+        return "boolean"
+    if spec["type"] == "array":
+        item = f"({_gbnf_value(spec['items'])})"
+        least = spec.get("minItems", 0)
+        items = f'{item} (", " {item}){{{max(least - 1, 0)},{ARRAY_MAX_ITEMS - 1}}}'
+        return f'"[" {items} "]"' if least else f'"[" ({items})? "]"'
+    raise ValueError(f"Cannot compile schema type {spec['type']!r}")
+
+
+def gbnf(tools: list[dict] = TOOLS) -> str:
+    """
+    llama.cpp grammar matching exactly one call of one of `tools`, formatted like `json.dumps`.
+
+    Parameters may come in any order, as they do in the training data, with the required ones
+    in their schema order. Keeping the grammar linear in the number of parameters means it
+    cannot also rule out a repeated optional parameter; `json.loads` keeps the last one.
+    """
+    rules = []
+    for tool in tools:
+        function = tool["function"]
+        rule = function["name"].replace("_", "-")
+        properties = function["parameters"]["properties"]
+        required = function["parameters"].get("required", [])
+        optional = [key for key in properties if key not in required]
+        for key, spec in properties.items():
+            rules.append(f"{rule}-{key.replace('_', '-')} ::= {_literal(json.dumps(key) + ': ')} ({_gbnf_value(spec)})")
+        if optional:
+            rules.append(f"{rule}-optional ::= {' | '.join(f'{rule}-' + key.replace('_', '-') for key in optional)}")
+        if not required:
+            body = f'({rule}-optional (", " {rule}-optional){{0,{len(optional) - 1}}})?' if optional else '""'
+        else:
+            some = f"{{0,{len(optional)}}}"
+            parts = [f'({rule}-optional ", "){some}'] if optional else []
+            for i, key in enumerate(required):
+                parts.append(f"{rule}-{key.replace('_', '-')}" if i == 0 else f'", " {rule}-{key.replace("_", "-")}')
+                if optional:
+                    parts.append(f'(", " {rule}-optional){some}')
+            body = " ".join(parts)
+        opening = _literal(f'{{"name": {json.dumps(function["name"])}, "parameters": {{')
+        rules.append(f'{rule} ::= {opening} {body} "}}}}"')
+    names = [tool["function"]["name"].replace("_", "-") for tool in tools]
+    return f"root ::= {' | '.join(names)}\n" + "\n".join(rules) + "\n" + _GBNF_COMMON
+
+
+def _max_value_length(spec: dict) -> int:
+    if "enum" in spec:
+        return max(len(json.dumps(value)) for value in spec["enum"])
+    if spec["type"] == "string":
+        return 2 + STRING_MAX_LENGTH
+    if spec["type"] == "integer":
+        return 1 + INTEGER_MAX_DIGITS
+    if spec["type"] == "boolean":
+        return len("false")
+    if spec["type"] == "array":
+        return 2 + ARRAY_MAX_ITEMS * (_max_value_length(spec["items"]) + len(", ")) - len(", ")
+    raise ValueError(f"Cannot bound schema type {spec['type']!r}")
+
+
+def max_call_length(tools: list[dict] = TOOLS) -> int:
+    """Length in characters of the longest call the constraints allow, with every parameter at its longest."""
+    longest = 0
+    for tool in tools:
+        function = tool["function"]
+        pairs = [
+            len(json.dumps(key)) + len(": ") + _max_value_length(spec)
+            for key, spec in function["parameters"]["properties"].items()
+        ]
+        size = (
+            len(json.dumps({"name": function["name"], "parameters": {}}))
+            + sum(pairs)
+            + len(", ") * max(len(pairs) - 1, 0)
+        )
+        longest = max(longest, size)
+    return longest
+
+
+def constraint_kwargs(mode: str, tools: list[dict]) -> dict:
+    """
+    Request arguments that constrain the answer to one call of `tools` in `mode`.
+
+    `max_tokens` allows one token per character of the longest allowed call, more than any
+    answer in a Latin script needs; a longer one is cut and fails to parse like any malformed
+    answer. The tools are still sent, so the prompt stays the same, but with
+    `tool_choice="none"` so that the backend applies the constraint to the message content.
+    """
+    if mode == "json_schema":
+        constraint = {"response_format": response_format(tools)}
+    elif mode == "gbnf":
+        constraint = {"extra_body": {"grammar": gbnf(tools)}}
+    else:
+        raise ValueError(f"Unknown constrained decoding mode {mode!r}, expected one of {DECODING_MODES[1:]}")
+    return {**constraint, "tool_choice": "none", "max_tokens": max_call_length(tools), "stop": STOP}
+
+
+def parse_call(content: str) -> dict:
+    """Turn a constrained answer, a {"name", "parameters"} object, into a tool call dict."""
+    call = json.loads(content)
+    if (
+        not isinstance(call, dict)
+        or not isinstance(call.get("name"), str)
+        or not isinstance(call.get("parameters"), dict)
+    ):
+        raise ValueError(f"Not a tool call: {content!r}")
+    return {"name": call["name"], "arguments": call["parameters"]}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print the constraints compiled from the tool schemas")
+    parser.add_argument("mode", choices=DECODING_MODES[1:])
+    parser.add_argument("--tool-profile", choices=list(TOOL_PROFILES), default="full", required=False)
+    args = parser.parse_args()
+
+    tools = TOOL_PROFILES[args.tool_profile]
+    if args.mode == "gbnf":
+        print(gbnf(tools), end="")
+    else:
+        print(json.dumps(response_format(tools), indent=2))
+    print(f"# max_tokens={max_call_length(tools)} stop={STOP!r}")
@@ -0,0 +1,105 @@
+import math
+import threading
+from collections import deque
+
+DEFAULT_PERCENTILE = 95.0
+DEFAULT_MAX_RATE = 0.1
+DEFAULT_WINDOW = 200
+# Until this many requests have completed, hedges wait `initial_delay`.
+MIN_SAMPLES = 20
+DEFAULT_INITIAL_DELAY = 1.0
+
+
+def _percentile(values, q: float) -> float | None:
+    """Nearest-rank percentile, as in `gitara.evaluation`."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(math.ceil(q / 100 * len(ordered)), 1) - 1]
+
+
+class HedgePolicy:
+    """
+    When to send a duplicate request, and what hedging has done so far.
+
+    A request that has not answered after the `percentile` of the last `window` first-attempt
+    latencies gets a duplicate, sent to another endpoint of the pool or, with `model`, to
+    another model; the first valid answer wins and the other request is dropped. At most
+    `max_rate` of the requests are hedged, so a backend that is slow across the board does not
+    get twice the load.
+
+    `stats` compares the latency the client saw with that of the first attempts, which the
+    synchronous client lets finish. The async client cancels a first attempt that lost to its
+    hedge, so its latency is the time it had taken until then and the improvement a lower bound.
+    """
+
+    def __init__(
+        self,
+        percentile: float = DEFAULT_PERCENTILE,
+        max_rate: float = DEFAULT_MAX_RATE,
+        window: int = DEFAULT_WINDOW,
+        initial_delay: float = DEFAULT_INITIAL_DELAY,
+        model: str | None = None,
+    ) -> None:
+        self.percentile = percentile
+        self.max_rate = max_rate
+        self.initial_delay = initial_delay
+        self.model = model
+        self.primary_latencies: deque[float] = deque(maxlen=window)
+        self.latencies: deque[float] = deque(maxlen=window)
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.capped = 0
+        self._lock = threading.Lock()
+
+    def delay(self) -> float:
+        """How long the first attempt gets before it is hedged."""
+        with self._lock:
+            if len(self.primary_latencies) < MIN_SAMPLES:
+                return self.initial_delay
+            delay = _percentile(self.primary_latencies, self.percentile)
+            return self.initial_delay if delay is None else delay
+
+    def allow(self) -> bool:
+        """
+        Whether a request that is due for a hedge may get one under `max_rate`.
+
+        The budget counts the request asking, so the first slow request can be hedged even in
+        a process that has sent no others, such as a single `gitara --hedge` query.
+        """
+        with self._lock:
+            if self.hedged >= self.max_rate * (self.requests + 1):
+                self.capped += 1
+                return False
+            self.hedged += 1
+            return True
+
+    def record(self, latency: float, hedge_won: bool = False) -> None:
+        """Record how long the client waited for an answer."""
+        with self._lock:
+            self.requests += 1
+            self.hedge_wins += hedge_won
+            self.latencies.append(latency)
+
+    def record_primary(self, latency: float) -> None:
+        """Record how long a first attempt ran, whether or not its answer was used."""
+        with self._lock:
+            self.primary_latencies.append(latency)
+
+    def stats(self) -> dict:
+        with self._lock:
+            p99 = _percentile(self.latencies, 99)
+            primary_p99 = _percentile(self.primary_latencies, 99)
+            return {
+                "requests": self.requests,
+                "hedged": self.hedged,
+                "hedge_rate": round(self.hedged / self.requests, 4) if self.requests else None,
+                "hedge_wins": self.hedge_wins,
+                "capped": self.capped,
+                "p99": p99,
+                "p99_unhedged_at_least": primary_p99,
+                "p99_improvement_at_least": (
+                    round(primary_p99 - p99, 4) if p99 is not None and primary_p99 is not None else None
+                ),
+            }
@@ -0,0 +1,215 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import struct
+import zlib
+from array import array
+from pathlib import Path
+
+from gitara.cache import cache_dir
+from gitara.dataset import read_dataset
+from gitara.tools import TOOLS
+
+MAGIC = b"GIC1"
+FORMAT_VERSION = 1
+DEFAULT_DATA = "finetuning/synthetic-data/train.jsonl"
+EVAL_DATA = ("finetuning/synthetic-data/test.jsonl", "finetuning/data/test.jsonl")
+DEFAULT_BUCKETS = 1 << 13
+DEFAULT_EPOCHS = 5
+DEFAULT_TOP_K = 3
+DEFAULT_MIN_CONFIDENCE = 0.95
+TOOL_NAMES = [tool["function"]["name"] for tool in TOOLS]
+
+
+def default_model_path() -> Path:
+    return cache_dir() / "intent-model.bin"
+
+
+def features(question: str) -> list[str]:
+    """Word unigrams and bigrams, plus character 4-grams of each word for unseen spellings and names."""
+    words = question.lower().replace("-", " ").split()
+    grams = [f"w:{word}" for word in words]
+    grams += [f"b:{a} {b}" for a, b in zip(["^", *words], [*words, "$"])]
+    for word in words:
+        padded = f"<{word}>"
+        grams += [f"c:{padded[i : i + 4]}" for i in range(max(len(padded) - 3, 1))]
+    return grams
+
+
+def bucket(feature: str, buckets: int) -> int:
+    # crc32 rather than hash(): the buckets must be the same in every process.
+    return zlib.crc32(feature.encode()) % buckets
+
+
+def softmax(scores: list[float]) -> list[float]:
+    top = max(scores)
+    exps = [math.exp(score - top) for score in scores]
+    total = sum(exps)
+    return [e / total for e in exps]
+
+
+class IntentClassifier:
+    """
+    Linear classifier over hashed n-grams that predicts which tool a question needs.
+
+    Used to send the model only the schemas of the likely tools: `candidates` returns the top-k
+    tools, or None when their total probability is below `min_confidence` and all tools should
+    be sent. The model is a multinomial logistic regression trained with SGD; its weights are a
+    `buckets x tools` float32 matrix, saved with a small JSON header.
+    """
+
+    def __init__(self, header: dict, weights: array) -> None:
+        self.header = header
+        self.labels: list[str] = header["labels"]
+        self.buckets: int = header["buckets"]
+        self.weights = weights
+
+    @classmethod
+    def train(
+        cls, rows, buckets: int = DEFAULT_BUCKETS, epochs: int = DEFAULT_EPOCHS, seed: int = 0
+    ) -> "IntentClassifier":
+        """Fit the model to the tools of (question, tool call) pairs with a decaying learning rate."""
+        digest = hashlib.sha256()
+        examples = []
+        for question, tool_call in rows:
+            digest.update(json.dumps([question, tool_call["name"]]).encode())
+            if tool_call["name"] in TOOL_NAMES:
+                examples.append((question, TOOL_NAMES.index(tool_call["name"])))
+        classes = len(TOOL_NAMES)
+        weights = [[0.0] * classes for _ in range(buckets + 1)]  # The last row is the bias.
+        encoded = [(sorted({bucket(f, buckets) for f in features(q)}) + [buckets], label) for q, label in examples]
+        rng = random.Random(seed)
+        step = 0
+        for _ in range(epochs):
+            rng.shuffle(encoded)
+            for active, label in encoded:
+                step += 1
+                rate = 0.5 / (1 + step / len(encoded))
+                scale = 1 / math.sqrt(len(active))
+                scores = [0.0] * classes
+                for row in active:
+                    scores = [s + w for s, w in zip(scores, weights[row])]
+                probabilities = softmax([s * scale for s in scores])
+                probabilities[label] -= 1
+                update = [rate * scale * p for p in probabilities]
+                for row in active:
+                    weights[row] = [w - u for w, u in zip(weights[row], update)]
+
+        header = {
+            "format": FORMAT_VERSION,
+            "labels": TOOL_NAMES,
+            "buckets": buckets,
+            "source": digest.hexdigest()[:16],
+        }
+        return cls(header, array("f", (w for row in weights for w in row)))
+
+    def to_bytes(self) -> bytes:
+        header_bytes = json.dumps(self.header).encode()
+        return MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes + self.weights.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "IntentClassifier":
+        if data[: len(MAGIC)] != MAGIC:
+            raise ValueError("Not a gitara intent model")
+        [header_length] = struct.unpack_from("<I", data, len(MAGIC))
+        start = len(MAGIC) + 4
+        header = json.loads(data[start : start + header_length])
+        weights = array("f")
+        weights.frombytes(data[start + header_length :])
+        return cls(header, weights)
+
+    @classmethod
+    def load(cls, path: str | os.PathLike | None = None) -> "IntentClassifier | None":
+        """Load a trained model; return None if it is missing or was trained for a different set of tools."""
+        path = Path(path) if path is not None else default_model_path()
+        try:
+            model = cls.from_bytes(path.read_bytes())
+        except FileNotFoundError:
+            return None
+        if model.header["format"] != FORMAT_VERSION or model.labels != TOOL_NAMES:
+            return None
+        return model
+
+    def predict(self, question: str) -> list[tuple[str, float]]:
+        """All tools with their probability for `question`, most likely first."""
+        classes, buckets, weights = len(self.labels), self.buckets, self.weights
+        rows = sorted({bucket(f, buckets) for f in features(question)}) + [buckets]
+        scores = [0.0] * classes
+        for row in rows:
+            scores = [s + w for s, w in zip(scores, weights[row * classes : (row + 1) * classes])]
+        scale = 1 / math.sqrt(len(rows))
+        probabilities = softmax([s * scale for s in scores])
+        return sorted(zip(self.labels, probabilities), key=lambda pair: pair[1], reverse=True)
+
+    def candidates(
+        self, question: str, k: int = DEFAULT_TOP_K, min_confidence: float = DEFAULT_MIN_CONFIDENCE
+    ) -> list[str] | None:
+        """The `k` most likely tools, or None if they are not likely enough together and all tools should be sent."""
+        top = self.predict(question)[:k]
+        if sum(probability for _, probability in top) < min_confidence:
+            return None
+        return [name for name, _ in top]
+
+
+def evaluate(model: IntentClassifier, rows, ks=(1, 2, 3, 4, 5), min_confidence: float = DEFAULT_MIN_CONFIDENCE):
+    """
+    For each k, measure how often the right tool is among the top k and how much tool schema is saved.
+
+    `recall` counts every row, including those that fall back to all tools; `pruned` is the
+    share of rows that did not fall back; `schema_bytes` is the mean size of the tools sent,
+    relative to sending all of them.
+    """
+    rows = [(question, tool_call["name"]) for question, tool_call in rows]
+    sizes = {tool["function"]["name"]: len(json.dumps(tool)) for tool in TOOLS}
+    full = sum(sizes.values())
+    predictions = [(model.predict(question), name) for question, name in rows]
+    results = []
+    for k in ks:
+        hits = pruned = sent = top_k_hits = 0
+        for ranked, name in predictions:
+            top = ranked[:k]
+            names = [tool for tool, _ in top]
+            top_k_hits += name in names
+            if sum(probability for _, probability in top) < min_confidence:
+                hits += 1
+                sent += full
+            else:
+                pruned += 1
+                hits += name in names
+                sent += sum(sizes[tool] for tool in names)
+        results.append(
+            {
+                "k": k,
+                "top_k_recall": top_k_hits / len(rows) if rows else None,
+                "recall": hits / len(rows) if rows else None,
+                "pruned": pruned / len(rows) if rows else None,
+                "schema_bytes": sent / (full * len(rows)) if rows else None,
+            }
+        )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train or evaluate the intent classifier used for tool pruning")
+    parser.add_argument("action", choices=["train", "evaluate"])
+    parser.add_argument("--data", type=str, nargs="+", default=None, required=False)
+    parser.add_argument("--model", type=str, default=None, required=False)
+    parser.add_argument("--min-confidence", type=float, default=DEFAULT_MIN_CONFIDENCE, required=False)
+    args = parser.parse_args()
+
+    model_path = Path(args.model) if args.model else default_model_path()
+    if args.action == "train":
+        rows = [row for path in args.data or [DEFAULT_DATA] for row in read_dataset(path)]
+        data = IntentClassifier.train(rows).to_bytes()
+        model_path.parent.mkdir(parents=True, exist_ok=True)
+        model_path.write_bytes(data)
+        print(f"Trained on {len(rows)} questions, wrote {len(data)} bytes to {model_path}")
+    else:
+        if (model := IntentClassifier.load(model_path)) is None:
+            parser.error(f"No usable intent model at {model_path}, run the train action first")
+        for path in args.data or EVAL_DATA:
+            for result in evaluate(model, read_dataset(path), min_confidence=args.min_confidence):
+                print(json.dumps({"data": path, **result}))
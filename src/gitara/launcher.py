@@ -0,0 +1,110 @@
+import json
+import os
+import socket
+import sys
+
+QUERY_FLAGS = {"--show-json", "--no-cache"}
+# Keep in sync with the subcommands of `gitara.cli.main`.
+SUBCOMMANDS = {"query", "render", "daemon", "warmup", "unload"}
+REQUEST_TIMEOUT = 120.0
+
+
+def socket_path() -> str:
+    """Path of the daemon's Unix socket: $GITARA_SOCKET, else in $XDG_RUNTIME_DIR or the cache dir."""
+    if path := os.environ.get("GITARA_SOCKET"):
+        return path
+    if runtime_dir := os.environ.get("XDG_RUNTIME_DIR"):
+        return os.path.join(runtime_dir, "gitara.sock")
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "gitara", "daemon.sock")
+
+
+def request(payload: dict, path: str | None = None, timeout: float = REQUEST_TIMEOUT) -> dict | None:
+    """Send one request to the daemon and return its response, or None if no daemon is listening."""
+    path = path or socket_path()
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(path)
+            sock.sendall(json.dumps(payload).encode() + b"\n")
+            with sock.makefile("rb") as f:
+                line = f.readline()
+    except (FileNotFoundError, ConnectionRefusedError):
+        return None
+    except OSError as e:
+        # A daemon that accepted the request but failed is reported as an error, not silently retried.
+        return {"error": f"gitara daemon at {path} failed: {e}"}
+    return json.loads(line) if line else None
+
+
+def query_settings() -> dict:
+    """The settings from the environment that a daemon must share to answer a query (see `DaemonServer.settings`)."""
+    # Split as click splits the variable for `--endpoint`.
+    return {
+        "endpoints": os.environ.get("GITARA_ENDPOINTS", "").split(),
+        "keep_alive": os.environ.get("GITARA_KEEP_ALIVE"),
+    }
+
+
+def parse_query_args(argv: list[str]) -> dict | None:
+    """Return a daemon request for a plain `gitara [--show-json] [--no-cache] QUERY` call, else None."""
+    flags = [arg for arg in argv if arg in QUERY_FLAGS]
+    positional = [arg for arg in argv if arg not in QUERY_FLAGS]
+    if len(positional) != 1 or len(set(flags)) != len(flags):
+        return None
+    [query] = positional
+    if query.startswith("-") or query in SUBCOMMANDS:
+        return None
+    return {
+        "op": "invoke",
+        "query": query,
+        "no_cache": "--no-cache" in flags,
+        "show_json": "--show-json" in flags,
+        "settings": query_settings(),
+    }
+
+
+def _secho(message: str, color: str) -> None:
+    codes = {"red": 31, "cyan": 36}
+    if sys.stderr.isatty() and "NO_COLOR" not in os.environ:
+        message = f"\033[{codes[color]}m{message}\033[0m"
+    print(message, file=sys.stderr)
+
+
+def main() -> None:
+    """
+    Entry point of the `gitara` command.
+
+    A plain query is sent to the gitara daemon if one is running, which avoids importing
+    click and openai and building a client on every call. Anything else, or any query when
+    no daemon is listening or the daemon was started with other settings than the environment
+    has ($GITARA_ENDPOINTS, $GITARA_KEEP_ALIVE), falls through to the full CLI in `gitara.cli`. With
+    $GITARA_PROFILE set, the CLI always runs in this process, under that profiler (see
+    `gitara.profiling.run_profiled`).
+    """
+    argv = sys.argv[1:]
+    if mode := os.environ.get("GITARA_PROFILE"):
+        from gitara.profiling import run_profiled
+
+        run_profiled(mode, argv)
+        return
+    if (
+        (payload := parse_query_args(argv)) is not None
+        and (response := request(payload)) is not None
+        and not response.get("settings_differ")
+    ):
+        if response.get("error") is not None:
+            _secho(f"Error: {response['error']}", "red")
+            sys.exit(1)
+        if payload["show_json"]:
+            _secho(f"# Tool call: {response['tool_call']}", "cyan")
+        print(response["command"])
+        return
+
+    from gitara.cli import main as cli_main
+
+    cli_main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import math
+import struct
+from collections.abc import Iterable
+from functools import lru_cache, partial
+
+from gitara.dataset import DEFAULT_CHUNK_SIZE, map_chunks
+from gitara.rules import normalize
+
+DEFAULT_SHINGLE_SIZE = 5
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_NUM_PERM = 128
+
+
+def shingles(question: str, size: int = DEFAULT_SHINGLE_SIZE) -> frozenset[str]:
+    """The character `size`-grams of the question, normalized like the rules and lowercased."""
+    text = normalize(question).lower()
+    if len(text) <= size:
+        return frozenset([text])
+    return frozenset(text[i : i + size] for i in range(len(text) - size + 1))
+
+
+@lru_cache(maxsize=1 << 16)
+def _hashes(shingle: str, num_perm: int) -> tuple[int, ...]:
+    """
+    `num_perm` independent 32-bit hashes of `shingle`, one per MinHash function.
+
+    They are read from one SHAKE-128 digest rather than computed as `num_perm` permutations
+    in Python, and shingles repeat across questions, so most lookups hit the cache.
+    """
+    return struct.unpack(f"<{num_perm}I", hashlib.shake_128(shingle.encode()).digest(4 * num_perm))
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def lsh_params(threshold: float, num_perm: int) -> tuple[int, int]:
+    """
+    Return the (bands, rows per band) whose S-curve best separates pairs above and below `threshold`.
+
+    A pair with Jaccard similarity s shares at least one band with probability
+    1 - (1 - s^rows)^bands; the chosen split minimizes the area of that curve below the
+    threshold (false candidates, removed by the exact check) plus the area above it missing
+    from 1 (missed leaks), weighting misses twice as much.
+    """
+
+    def area(bands: int, rows: int, low: float, high: float) -> float:
+        steps = 200
+        width = (high - low) / steps
+        return sum(1 - (1 - (low + (i + 0.5) * width) ** rows) ** bands for i in range(steps)) * width
+
+    best = (math.inf, num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        false_positive = area(bands, rows, 0.0, threshold)
+        false_negative = (1 - threshold) - area(bands, rows, threshold, 1.0)
+        error = false_positive + 2 * false_negative
+        if error < best[0]:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+
+class LeakageIndex:
+    """
+    MinHash-LSH index over the questions of a test set, queried with training questions.
+
+    Each question is reduced to a MinHash signature of its character shingles, cut into bands;
+    questions sharing a band are candidates, and candidates are kept if the exact Jaccard
+    similarity of their shingle sets reaches `threshold`. Only the test set is held in memory,
+    so the training set can be streamed through `query` in any number of processes.
+    """
+
+    def __init__(
+        self,
+        questions: Iterable[str],
+        shingle_size: int = DEFAULT_SHINGLE_SIZE,
+        threshold: float = DEFAULT_THRESHOLD,
+        num_perm: int = DEFAULT_NUM_PERM,
+    ) -> None:
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+        self.bands, self.rows = lsh_params(threshold, num_perm)
+        self.num_perm = self.bands * self.rows
+        self.shingles: list[frozenset[str]] = []
+        self.buckets: dict[tuple[int, int], list[int]] = {}
+        for i, question in enumerate(questions):
+            row_shingles = shingles(question, shingle_size)
+            self.shingles.append(row_shingles)
+            for key in self._band_keys(row_shingles):
+                self.buckets.setdefault(key, []).append(i)
+
+    def signature(self, row_shingles: frozenset[str]) -> list[int]:
+        return list(map(min, zip(*(_hashes(shingle, self.num_perm) for shingle in row_shingles))))
+
+    def _band_keys(self, row_shingles: frozenset[str]) -> list[tuple[int, int]]:
+        signature = self.signature(row_shingles)
+        return [(band, hash(tuple(signature[band * self.rows : (band + 1) * self.rows]))) for band in range(self.bands)]
+
+    def query(self, question: str) -> list[tuple[int, float]]:
+        """The indexed questions at least `threshold` similar to `question`, as (position, similarity) pairs."""
+        row_shingles = shingles(question, self.shingle_size)
+        candidates = {i for key in self._band_keys(row_shingles) for i in self.buckets.get(key, ())}
+        matches = [(i, jaccard(row_shingles, self.shingles[i])) for i in sorted(candidates)]
+        return [(i, round(score, 4)) for i, score in matches if score >= self.threshold]
+
+
+def _query_chunk(chunk: list[tuple[int, str]], index: LeakageIndex) -> list[tuple[int, dict | None, list]]:
+    results: list[tuple[int, dict | None, list]] = []
+    for number, text in chunk:
+        try:
+            row = json.loads(text)
+            matches = index.query(row["question"])
+        except (ValueError, KeyError, TypeError):
+            results.append((number, None, []))
+            continue
+        results.append((number, row, matches))
+    return results
+
+
+def _read_rows(path: str) -> list[dict]:
+    rows = []
+    with open(path) as f:
+        for number, line in enumerate(f, start=1):
+            if line.strip():
+                rows.append({"line": number, "text": line, **json.loads(line)})
+    return rows
+
+
+def find_leaks(
+    train_path: str,
+    test_path: str,
+    shingle_size: int = DEFAULT_SHINGLE_SIZE,
+    threshold: float = DEFAULT_THRESHOLD,
+    num_perm: int = DEFAULT_NUM_PERM,
+    workers: int = 0,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> dict:
+    """
+    Find the training questions at least `threshold` similar to a test question.
+
+    The test set is indexed and the training set streamed through it, so memory grows with
+    the test set only. Each pair reports its line in both files, the Jaccard similarity of
+    the questions' shingles and whether the answers are the same.
+    """
+    test = _read_rows(test_path)
+    index = LeakageIndex((row["question"] for row in test), shingle_size, threshold, num_perm)
+    pairs = []
+    train_rows = invalid = 0
+    with open(train_path) as f:
+        lines = ((number, line) for number, line in enumerate(f, start=1) if line.strip())
+        for number, train, matches in map_chunks(partial(_query_chunk, index=index), lines, workers, chunk_size):
+            train_rows += 1
+            if train is None:
+                invalid += 1
+            for i, similarity in matches:
+                pairs.append(
+                    {
+                        "similarity": similarity,
+                        "test_line": test[i]["line"],
+                        "train_line": number,
+                        "test_question": test[i]["question"],
+                        "train_question": train["question"],
+                        "same_answer": json.loads(test[i]["answer"]) == json.loads(train["answer"]),
+                    }
+                )
+    pairs.sort(key=lambda pair: (-pair["similarity"], pair["test_line"], pair["train_line"]))
+    leaking = {pair["test_line"] for pair in pairs}
+    return {
+        "train": train_path,
+        "test": test_path,
+        "shingle_size": shingle_size,
+        "threshold": threshold,
+        "bands": index.bands,
+        "rows_per_band": index.rows,
+        "train_rows": train_rows,
+        "invalid_train_rows": invalid,
+        "test_rows": len(test),
+        "leaking_test_rows": len(leaking),
+        "pairs": pairs,
+        "clean_test": [row["text"] for row in test if row["line"] not in leaking],
+    }
@@ -0,0 +1,159 @@
+import argparse
+import json
+import re
+import statistics
+import time
+import urllib.error
+import urllib.request
+
+from gitara.model_client import DEFAULT_QUESTION, DistilLabsLLM
+from gitara.pool import Endpoint
+
+NATIVE_TIMEOUT = 300.0
+DEFAULT_WARM_ROUNDS = 3
+_SECONDS = re.compile(r"-?\d+")
+
+
+class LifecycleError(RuntimeError):
+    pass
+
+
+def parse_keep_alive(value: str | None) -> str | int | None:
+    """
+    A keep-alive as the backend expects it: whole seconds as a number, else a duration such as "30m".
+
+    Ollama reads -1 as for ever and 0 as unload right away.
+    """
+    if value is None or not value.strip():
+        return None
+    value = value.strip()
+    return int(value) if _SECONDS.fullmatch(value) else value
+
+
+def native_url(endpoint: Endpoint) -> str:
+    """The root of the backend's own API, beside its OpenAI-compatible /v1."""
+    return endpoint.base_url.removesuffix("/v1")
+
+
+def _call(url: str, payload: dict | None = None, timeout: float = NATIVE_TIMEOUT) -> dict | None:
+    """GET `url`, or POST `payload` to it, and return the JSON answer; None if the backend has no such route."""
+    data = json.dumps(payload).encode() if payload is not None else None
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read() or b"{}")
+    except urllib.error.HTTPError as e:
+        if e.code in (404, 405, 501):
+            return None
+        raise LifecycleError(f"{url} answered HTTP {e.code}: {e.read()[:200]!r}") from e
+    except OSError as e:
+        raise LifecycleError(f"Cannot reach {url}: {e}") from e
+
+
+def loaded_models(endpoint: Endpoint) -> list[dict] | None:
+    """The models the backend holds in memory, with their size (Ollama's /api/ps); None if it cannot tell."""
+    answer = _call(f"{native_url(endpoint)}/api/ps")
+    return None if answer is None else answer.get("models", [])
+
+
+def timed_request(client: DistilLabsLLM, endpoint: Endpoint, question: str = DEFAULT_QUESTION, **kwargs) -> float:
+    """Send gitara's request for `question` to `endpoint`, bypassing the cache, and return how long it took."""
+    start = time.perf_counter()
+    endpoint.client.chat.completions.create(**{**client.request_kwargs(question), **kwargs})
+    return time.perf_counter() - start
+
+
+def warmup(client: DistilLabsLLM) -> list[dict]:
+    """
+    Load the model on every endpoint of `client` and prime the backend's cache of gitara's prompt prefix.
+
+    Each endpoint gets one real gitara request cut to one token, with the client's
+    `keep_alive`, so any backend that loads models on demand loads it.
+    """
+    results: list[dict] = []
+    for endpoint in client.pool.endpoints:
+        try:
+            seconds = timed_request(client, endpoint, max_tokens=1)
+        except Exception as e:
+            results.append({"url": endpoint.base_url, "error": str(e) or repr(e)})
+            continue
+        results.append({"url": endpoint.base_url, "seconds": round(seconds, 3)})
+    return results
+
+
+def unload_endpoint(endpoint: Endpoint, model: str) -> dict:
+    """Ask the backend to drop `model` from memory, which only Ollama's own API can do."""
+    try:
+        answer = _call(f"{native_url(endpoint)}/api/generate", {"model": model, "keep_alive": 0})
+    except LifecycleError as e:
+        return {"url": endpoint.base_url, "error": str(e)}
+    if answer is None:
+        return {"url": endpoint.base_url, "error": "the backend cannot unload models"}
+    return {"url": endpoint.base_url, "unloaded": True}
+
+
+def unload(client: DistilLabsLLM) -> list[dict]:
+    return [unload_endpoint(endpoint, client.model_name) for endpoint in client.pool.endpoints]
+
+
+def probe(
+    client: DistilLabsLLM,
+    question: str = DEFAULT_QUESTION,
+    warm_rounds: int = DEFAULT_WARM_ROUNDS,
+    idle: list[float] | tuple[float, ...] = (),
+) -> dict:
+    """
+    Measure what a cold start costs on the first endpoint of `client`, and whether the model stays loaded.
+
+    The model is unloaded, then `question` is sent once cold and `warm_rounds` times warm; the
+    load time is the cold latency minus the median warm one. After each of the `idle` pauses
+    (in seconds, with the client's `keep_alive`) the question is sent again and reported as
+    cold if it took more than halfway from warm to cold. The memory the loaded model takes is
+    included where the backend reports it.
+    """
+    endpoint = client.pool.endpoints[0]
+    unloaded = unload_endpoint(endpoint, client.model_name)
+    cold = timed_request(client, endpoint, question)
+    warm = statistics.median(timed_request(client, endpoint, question) for _ in range(warm_rounds))
+    threshold = warm + (cold - warm) / 2
+    after_idle = []
+    for seconds in idle:
+        time.sleep(seconds)
+        latency = timed_request(client, endpoint, question)
+        after_idle.append({"idle": seconds, "seconds": round(latency, 3), "cold": latency > threshold})
+    models = loaded_models(endpoint)
+    memory = next((model for model in models or [] if model.get("name", "").split(":")[0] == client.model_name), None)
+    return {
+        "url": endpoint.base_url,
+        "model": client.model_name,
+        "keep_alive": client.keep_alive,
+        "unloaded": unloaded.get("unloaded", False),
+        "cold_seconds": round(cold, 3),
+        "warm_seconds": round(warm, 3),
+        "load_seconds": round(max(cold - warm, 0.0), 3),
+        "after_idle": after_idle,
+        "memory": {key: memory[key] for key in ("size", "size_vram") if key in memory} if memory else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure cold-start and warm latency of the model")
+    parser.add_argument("command", choices=["probe"])
+    parser.add_argument("--model", type=str, default="gitara")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--endpoint", type=str, help="Base URL of the backend, instead of --port")
+    parser.add_argument("--question", type=str, default=DEFAULT_QUESTION)
+    parser.add_argument("--keep-alive", type=str, help="Keep-alive sent with each request, e.g. 30s or 600")
+    parser.add_argument("--rounds", type=int, default=DEFAULT_WARM_ROUNDS, help="Warm requests to take the median of")
+    parser.add_argument(
+        "--idle", type=float, action="append", default=[], help="Seconds to wait before another request; repeatable"
+    )
+    args = parser.parse_args()
+
+    probe_client = DistilLabsLLM(
+        model_name=args.model,
+        port=args.port,
+        endpoints=[args.endpoint] if args.endpoint else None,
+        keep_alive=parse_keep_alive(args.keep_alive),
+    )
+    print(json.dumps(probe(probe_client, args.question, args.rounds, args.idle), indent=2))
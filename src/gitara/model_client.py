@@ -1,484 +1,676 @@
 import argparse
+import asyncio
+import contextvars
+import hashlib
 import logging
 import json
+import time
+from collections import Counter, deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 
-from openai import OpenAI, ChatCompletion
+from openai import OpenAI
+from openai.types.chat import ChatCompletion
+
+from gitara.cache import ResponseCache, normalize_question
+from gitara.coalescing import AsyncSingleFlight, SingleFlight
+from gitara.grammar import DECODING_MODES, DEFAULT_DECODING, constraint_kwargs, parse_call
+from gitara.hedging import HedgePolicy
+from gitara.intent import DEFAULT_MIN_CONFIDENCE, DEFAULT_TOP_K, IntentClassifier
+from gitara.nearest import DEFAULT_THRESHOLD, NearestIndex, NearestMatch
+from gitara.pool import ENDPOINT_ERRORS, Endpoint, EndpointPool, local_url
+from gitara.prompt import build_messages
+from gitara.repair import RepairError, parse_message
+from gitara.renderer import render_git_command
+from gitara.rules import RuleSet
+from gitara.streaming import ToolCallStream
+from gitara.templates import CANONICALIZER_VERSION, QuestionTemplate, canonicalize
+from gitara.timings import add_span, record_usage, span
+from gitara.tools import DEFAULT_TOOL_PROFILE, TOOL_PROFILES, TOOLS  # noqa: F401 (TOOLS is re-exported)
+from gitara.validation import VALIDATOR, ToolCallError, ToolCallValidator
 
 
 DEFAULT_QUESTION = "First time pushing this new branch to establish tracking with upstream."
 
-TOOLS = [
-    {
-        "type": "function",
-        "function": {
-            "name": "git_status",
-            "description": "Check the current status of the repository (modified files, staged changes, branch info)",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "verbose": {
-                        "type": "boolean",
-                        "description": "Show detailed status including diffs",
-                        "default": False,
-                    },
-                    "ignored": {
-                        "type": "boolean",
-                        "description": "Show ignored files",
-                        "default": False,
-                    },
-                },
-                "required": [],
-                "additionalProperties": False,
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "git_add",
-            "description": "Stage files for commit",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "files": {
-                        "type": "array",
-                        "description": "List of file paths to stage (use ['.'] for all files)",
-                        "items": {"type": "string"},
-                        "minItems": 1,
-                    }
-                },
-                "required": ["files"],
-                "additionalProperties": False,
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "git_commit",
-            "description": "Create a commit with staged changes",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "message": {
-                        "type": "string",
-                        "description": "Commit message describing the changes (required unless amend=true)",
-                        "minLength": 1,
-                    },
-                    "amend": {
-                        "type": "boolean",
-                        "description": "Amend the previous commit instead of creating new one",
-                        "default": False,
-                    },
-                },
-                "required": [],
-                "additionalProperties": False,
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "git_push",
-            "description": "Push commits to remote repository",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "remote": {
-                        "type": "string",
-                        "description": "Remote name",
-                        "default": "origin",
-                    },
-                    "branch": {
-                        "type": "string",
-                        "description": "Branch name (current branch if not specified)",
-                    },
-                    "force": {
-                        "type": "boolean",
-                        "description": "Force push (use with caution)",
-                        "default": False,
-                    },
-                    "set_upstream": {
-                        "type": "boolean",
-                        "description": "Set upstream tracking for the branch",
-                        "default": False,
-                    },
-                },
-                "required": [],
-                "additionalProperties": False,
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "git_pull",
-            "description": "Pull changes from remote repository",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "remote": {
-                        "type": "string",
-                        "description": "Remote name",
-                        "default": "origin",
-                    },
-                    "branch": {
-                        "type": "string",
-                        "description": "Branch name (current branch if not specified)",
-                    },
-                    "rebase": {
-                        "type": "boolean",
-                        "description": "Rebase instead of merge",
-                        "default": False,
-                    },
-                },
-                "required": [],
-                "additionalProperties": False,
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "git_branch",
-            "description": "List, or delete branches (use `git_switch` for branch creation)",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "action": {
-                        "type": "string",
-                        "description": "Action to perform",
-                        "enum": ["delete", "list"],
-                    },
-                    "branch_name": {
-                        "type": "string",
-                        "description": "Name of the branch (required for delete)",
-                    },
-                    "force": {
-                        "type": "boolean",
-                        "description": "Force delete even if not merged (only for delete action)",
-                        "default": False,
-                    },
-                    "all": {
-                        "type": "boolean",
-                        "description": "Show all branches including remotes (only for list action)",
-                        "default": False,
-                    },
-                },
-                "required": ["action"],
-                "additionalProperties": False,
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "git_switch",
-            "description": "Switch to a different branch",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "branch": {
-                        "type": "string",
-                        "description": "Branch name to switch to (not needed if detach is true)",
-                    },
-                    "create": {
-                        "type": "boolean",
-                        "description": "Create new branch before switching",
-                        "default": False,
-                    },
-                    "detach": {
-                        "type": "boolean",
-                        "description": "Switch to a commit in detached HEAD state",
-                        "default": False,
-                    },
-                },
-                "required": [],
-                "additionalProperties": False,
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "git_restore",
-            "description": "Restore files in working tree and/or staging area",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "files": {
-                        "type": "array",
-                        "description": "List of file paths to restore",
-                        "items": {"type": "string"},
-                        "minItems": 1,
-                    },
-                    "source": {
-                        "type": "string",
-                        "description": "Restore source (e.g., HEAD, commit hash)",
-                        "default": "HEAD",
-                    },
-                    "restore_target": {
-                        "type": "string",
-                        "enum": ["worktree", "staged", "both"],
-                        "default": "worktree",
-                    },
-                },
-                "required": ["files"],
-                "additionalProperties": False,
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "git_merge",
-            "description": "Merge branches together",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "branch": {
-                        "type": "string",
-                        "description": "Branch to merge into current branch",
-                    },
-                    "no_ff": {
-                        "type": "boolean",
-                        "description": "Always create a merge commit, even if fast-forward is possible",
-                        "default": False,
-                    },
-                    "ff_only": {
-                        "type": "boolean",
-                        "description": "Only allow fast-forward merges (fail if not possible)",
-                        "default": False,
-                    },
-                    "strategy": {
-                        "type": "string",
-                        "description": "Merge strategy to use",
-                        "enum": ["recursive", "resolve", "ours", "subtree"],
-                        "default": "recursive",
-                    },
-                },
-                "required": ["branch"],
-                "additionalProperties": False,
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "git_stash",
-            "description": "Temporarily save uncommitted changes",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "action": {
-                        "type": "string",
-                        "description": "Stash operation",
-                        "enum": [
-                            "save",
-                            "pop",
-                            "apply",
-                            "list",
-                            "drop",
-                            "clear",
-                            "show",
-                        ],
-                    },
-                    "message": {
-                        "type": "string",
-                        "description": "Message for stash save (only for save action)",
-                    },
-                    "stash_ref": {
-                        "type": "string",
-                        "description": "Stash reference (e.g., 'stash@{0}', 'stash@{2}') for pop/apply/drop/show actions",
-                        "default": "stash@{0}",
-                    },
-                    "include_untracked": {
-                        "type": "boolean",
-                        "description": "Include untracked files in stash (only for save action)",
-                        "default": False,
-                    },
-                    "patch": {
-                        "type": "boolean",
-                        "description": "Show full patch/diff when using action=show",
-                        "default": False,
-                    },
-                },
-                "required": ["action"],
-                "additionalProperties": False,
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "git_rebase",
-            "description": "Reapply commits on top of another base",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "target": {
-                        "type": "string",
-                        "description": "Target branch or commit to rebase onto (required unless continue or abort are true)",
-                    },
-                    "continue": {
-                        "type": "boolean",
-                        "description": "Continue after resolving conflicts",
-                        "default": False,
-                    },
-                    "abort": {
-                        "type": "boolean",
-                        "description": "Abort the rebase operation",
-                        "default": False,
-                    },
-                },
-                "required": [],
-                "additionalProperties": False,
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "git_reset",
-            "description": "Reset current HEAD to specified state",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "mode": {
-                        "type": "string",
-                        "description": "Reset mode",
-                        "enum": ["soft", "mixed", "hard"],
-                    },
-                    "target": {
-                        "type": "string",
-                        "description": "Commit hash or reference (e.g., HEAD~1)",
-                        "default": "HEAD",
-                    },
-                },
-                "required": ["mode"],
-                "additionalProperties": False,
-            },
-        },
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "git_log",
-            "description": "View commit history",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "ref": {
-                        "type": "string",
-                        "description": "Branch, tag, or commit to show history for (default: current branch)",
-                    },
-                    "limit": {
-                        "type": "integer",
-                        "description": "Number of commits to show",
-                        "default": 10,
-                        "minimum": 1,
-                    },
-                    "oneline": {
-                        "type": "boolean",
-                        "description": "Condensed one-line format",
-                        "default": False,
-                    },
-                    "graph": {
-                        "type": "boolean",
-                        "description": "Show branch graph",
-                        "default": False,
-                    },
-                },
-                "required": [],
-                "additionalProperties": False,
-            },
-        },
-    },
-]
-
-
-class DistilLabsLLM:
-    def __init__(self, model_name: str, port: int = 11434) -> None:
+
+DEFAULT_MAX_IN_FLIGHT = 4
+DEFAULT_MAX_REQUERIES = 1
+BYPASS_LOG_SIZE = 1000
+HEDGE_THREADS = 64
+
+
+class BaseDistilLabsLLM:
+    """
+    Prompt, caching and response parsing shared by the sync and async clients.
+
+    With `rules`, questions matching one of its patterns are answered before anything else,
+    without touching the cache or the model. With a `bypass` index, questions within
+    `bypass_threshold` of a known question are answered from the index without calling the
+    model. With `bypass_shadow`, the model is always called and every near match is recorded in
+    `bypass_log` next to the model's answer, for tuning the threshold.
+
+    With `templates`, a cache miss is also looked up by the question's template (see
+    `gitara.templates`), so "push feature-y" is answered from the cached answer to "push
+    feature-x". Off by default: on the synthetic data about 3% of such answers render to a
+    different command than the labelled one.
+
+    With `stream`, the model's answer is streamed and the request is closed as soon as it holds
+    one complete tool call, instead of waiting for the model to stop generating.
+
+    Every request starts with the same bytes (tools, system prompt and examples, see
+    `gitara.prompt`) and ends with the question, so the backend can reuse its cached prefix.
+    Pass `system_prompt=False` for a model whose Modelfile already sets the system prompt.
+
+    With a `tool_filter`, only the schemas of the `tool_top_k` most likely tools are sent, unless
+    the classifier is less than `tool_min_confidence` sure about them. Requests for the same
+    tools still share their prefix, as the schemas keep their order in TOOLS.
+
+    With `decoding="json_schema"` or `"gbnf"`, the backend is asked to constrain the answer to
+    one valid call with a schema or grammar compiled from the tools (see `gitara.grammar`),
+    for backends that support it. Such answers are not streamed.
+
+    Answers that are not a single well-formed tool call, such as a call written in the message
+    content or with a trailing comma, are repaired locally where possible (see
+    `gitara.repair`), counting each kind of repair in `repairs`. The model's answers are then
+    checked by `validator` before they are returned or cached; pass None to skip the check. An
+    answer that cannot be repaired or is invalid is asked for again up to `max_requeries`
+    times (counted in `requeries`), after which `RuntimeError` or `ToolCallError` is raised.
+
+    Requests go to the backend on `port`, or are spread over several with `endpoints`, a list
+    of base URLs (see `gitara.pool.EndpointPool`); a request whose endpoint cannot be reached is
+    retried once on another one. Clients can share a `pool`.
+
+    With a `hedge` policy, a model request that is slow to answer gets a duplicate on another
+    endpoint or model, and the first valid answer wins (see `gitara.hedging.HedgePolicy`).
+    Streamed requests are not hedged.
+
+    With `coalesce`, concurrent `invoke` calls for the same question (up to whitespace) share
+    one call, and its answer or error (see `gitara.coalescing`); `coalescer.stats()` counts
+    how many were coalesced, and stays at zero without `coalesce`. Calls with `on_partial` are
+    not coalesced.
+
+    With `keep_alive` (whole seconds, or a duration such as "30m"), every request asks the
+    backend to keep the model loaded for that long after it (see `gitara.lifecycle`); backends
+    that do not know the field ignore it.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        port: int = 11434,
+        cache: ResponseCache | None = None,
+        templates: bool = False,
+        bypass: NearestIndex | None = None,
+        bypass_threshold: float = DEFAULT_THRESHOLD,
+        bypass_shadow: bool = False,
+        rules: RuleSet | None = None,
+        stream: bool = False,
+        system_prompt: bool = True,
+        tool_filter: IntentClassifier | None = None,
+        tool_top_k: int = DEFAULT_TOP_K,
+        tool_min_confidence: float = DEFAULT_MIN_CONFIDENCE,
+        tool_profile: str = DEFAULT_TOOL_PROFILE,
+        decoding: str = DEFAULT_DECODING,
+        validator: ToolCallValidator | None = VALIDATOR,
+        endpoints: list[str] | None = None,
+        pool: EndpointPool | None = None,
+        hedge: HedgePolicy | None = None,
+        max_requeries: int = DEFAULT_MAX_REQUERIES,
+        coalesce: bool = True,
+        keep_alive: str | int | None = None,
+    ) -> None:
         self.model_name = model_name
-        self.client = OpenAI(base_url=f"http://127.0.0.1:{port}/v1", api_key="EMPTY")
+        self.coalesce = coalesce
+        self.keep_alive = keep_alive
+        self.pool = pool if pool is not None else EndpointPool(endpoints or [local_url(port)])
+        self.base_url = self.pool.endpoints[0].base_url
+        self.hedge = hedge
+        self.max_requeries = max_requeries
+        self.requeries = 0
+        self.repairs: Counter[str] = Counter()
+        self.cache = cache
+        self.templates = templates
+        self.bypass = bypass
+        self.bypass_threshold = bypass_threshold
+        self.bypass_shadow = bypass_shadow
+        self.bypass_hits = 0
+        self.bypass_log: deque[dict] = deque(maxlen=BYPASS_LOG_SIZE)
+        self.rules = rules
+        self.rule_hits = 0
+        self.stream = stream
+        self.system_prompt = system_prompt
+        self.tool_filter = tool_filter
+        self.tool_top_k = tool_top_k
+        self.tool_min_confidence = tool_min_confidence
+        if tool_profile not in TOOL_PROFILES:
+            raise ValueError(f"Unknown tool profile {tool_profile!r}, expected one of {sorted(TOOL_PROFILES)}")
+        self.tools = TOOL_PROFILES[tool_profile]
+        if decoding not in DECODING_MODES:
+            raise ValueError(f"Unknown decoding mode {decoding!r}, expected one of {DECODING_MODES}")
+        if decoding != "tools" and stream:
+            raise ValueError(f"Answers constrained with {decoding!r} are not streamed")
+        self.decoding = decoding
+        self.validator = validator
+        self._constraints: dict[tuple[str, ...], dict] = {}
+        self.cache_namespace = f"{model_name}:{self.prompt_fingerprint()}"
+        self.template_namespace = f"{self.cache_namespace}:templates-v{CANONICALIZER_VERSION}"
+
+    def prompt_fingerprint(self) -> str:
+        """Hash of everything besides the question that determines the answer (tool schema and prompt)."""
+        parts: list = [self.tools, self.get_prompt("\0")]
+        if self.tool_filter is not None:
+            # Pruning can change the answer, so it gets its own cache entries.
+            parts.append([self.tool_filter.header["source"], self.tool_top_k, self.tool_min_confidence])
+        if self.decoding != "tools":
+            parts.append(self.decoding)
+        payload = json.dumps(parts, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+    def flight_key(self, question: str) -> tuple[str, str]:
+        """What concurrent calls must agree on to share an answer: the model and prompt, and the question."""
+        return self.cache_namespace, normalize_question(question)
 
     def get_prompt(
         self,
         question: str,
     ) -> list[dict[str, str]]:
-        return [
-            {
-                "role": "system",
-                "content": """
-You are a tool-calling model working on the task in the 'task_description' XML block:
-
-<task_description>Respond with the next git operation tool call based on the desired action</task_description>
-
-You will be given a single task in the 'question' XML block.
-Solve the task in 'question' block by generating an appropriate tool call according to the provided tool schema.
-Generate only the answer, do not generate anything else.
-
-
-Rules for generating the answers:
-- It should be a JSON object with exactly two keys: "name" and "parameters".
-- Do not include any other keys.
-- Do not add anything, except valid JSON.
-- Do not include trailing commas.
-- Do not add anything before/after the tool call.
-- Stick to the format of the following examples:
-
-{"name": "refresh_page", "parameters": {}}
-{"name": "get_weather", "parameters": {"location": "Paris, France"}}
-""",
-            },
-            {
-                "role": "user",
-                "content": f"""Here are examples that show how this task can be solved
-In examples, contexts are in the context XML block, tasks in the question XML block, solutions in the answer XML block
-When solving a real task, generate only the answer, do not generate anything else
-
-
-<example>
-<question>apply stash@{{5}}</question>
-<answer>{{"name": "git_stash", "parameters": {{"action": "apply", "stash_ref": "stash@{{5}}"}}}}</answer>
-</example>
-
-
-<example>
-<question>commit fix: typos</question>
-<answer>{{"name": "git_commit", "parameters": {{"message": "fix: typos"}}}}</answer>
-</example>
-Now for the real task, solve the task in question block.
-Generate only the solution, do not generate anything else.
-
-<question>{question}</question>""",
-            },
-        ]
+        return build_messages(question, system_prompt=self.system_prompt)
 
     def is_valid_response(self, response: ChatCompletion) -> bool:
         tool_calls = response.choices[0].message.tool_calls
         return tool_calls is not None and len(tool_calls) == 1
 
-    def invoke(self, question: str) -> dict:
-        messages = self.get_prompt(question)
-        chat_response = self.client.chat.completions.create(
-            model=self.model_name,
-            messages=messages,
-            temperature=0.0,
-            tools=TOOLS,
-            tool_choice="required",
+    def rule_lookup(self, question: str) -> dict | None:
+        """Return the tool call of the first rule matching `question`, or None."""
+        if self.rules is None or (match := self.rules.match(question)) is None:
+            return None
+        self.rule_hits += 1
+        _, tool_call_dict = match
+        return tool_call_dict
+
+    def lookup(self, question: str) -> tuple[dict | None, QuestionTemplate | None]:
+        """Return the cached tool call for `question` (or None) and its template, if any."""
+        if self.cache is None:
+            return None, None
+        if (cached := self.cache.get(self.cache_namespace, question)) is not None:
+            return cached, None
+        template = canonicalize(question) if self.templates else None
+        if template is not None and (cached := self.cache.get(self.template_namespace, template.text)) is not None:
+            return template.fill(cached), template
+        return None, template
+
+    def bypass_lookup(self, question: str) -> NearestMatch | None:
+        """Return the bypass answer for `question`, or None if the model has to be called."""
+        if self.bypass is None:
+            return None
+        if self.bypass_shadow:
+            # Look as far as the index allows, so the log shows what any threshold would have done.
+            return self.bypass.nearest(question, self.bypass.header["min_threshold"])
+        if (match := self.bypass.nearest(question, self.bypass_threshold)) is not None:
+            self.bypass_hits += 1
+        return match
+
+    def record_shadow(self, question: str, match: NearestMatch, tool_call_dict: dict) -> None:
+        entry = {
+            "question": question,
+            "neighbour": match.question,
+            "similarity": match.similarity,
+            "would_bypass": match.similarity >= self.bypass_threshold,
+            "bypass": match.tool_call,
+            "model": tool_call_dict,
+            "agree": render_git_command(match.tool_call) == render_git_command(tool_call_dict),
+        }
+        self.bypass_log.append(entry)
+        logging.info(f"Bypass shadow: {json.dumps(entry)}")
+
+    def check(self, tool_call_dict: dict) -> dict:
+        if self.validator is not None:
+            self.validator.validate(tool_call_dict)
+        return tool_call_dict
+
+    def store(self, question: str, template: QuestionTemplate | None, tool_call_dict: dict) -> None:
+        if self.cache is None:
+            return
+        self.cache.put(self.cache_namespace, question, tool_call_dict)
+        if template is not None and (lifted := template.lift(tool_call_dict)) is not None:
+            self.cache.put(self.template_namespace, template.text, lifted)
+
+    def hedge_for(self, on_partial: Callable[[ToolCallStream], None] | None = None) -> HedgePolicy | None:
+        """
+        The policy a request is hedged under, or None if it is not hedged.
+
+        A duplicate needs another endpoint or the policy's own model; with neither it would go
+        to the same, stalled server. Streamed tool calls are never hedged.
+        """
+        if self.hedge is None or ((self.stream or on_partial is not None) and self.decoding == "tools"):
+            return None
+        if self.hedge.model is None and len(self.pool.endpoints) < 2:
+            return None
+        return self.hedge
+
+    def tools_for(self, question: str) -> list[dict]:
+        """The tool schemas to send with `question`: all of them, or the likely ones if there is a `tool_filter`."""
+        if self.tool_filter is None:
+            return self.tools
+        names = self.tool_filter.candidates(question, self.tool_top_k, self.tool_min_confidence)
+        if names is None:
+            return self.tools
+        return [tool for tool in self.tools if tool["function"]["name"] in names]
+
+    def request_kwargs(self, question: str, model: str | None = None) -> dict:
+        tools = self.tools_for(question)
+        kwargs: dict = {
+            "model": model or self.model_name,
+            "messages": self.get_prompt(question),
+            "temperature": 0.0,
+            "tools": tools,
+            "tool_choice": "required",
+        }
+        if self.decoding != "tools":
+            names = tuple(tool["function"]["name"] for tool in tools)
+            if names not in self._constraints:
+                # Compiled once per set of tools, which pruning keeps small.
+                self._constraints[names] = constraint_kwargs(self.decoding, tools)
+            kwargs.update(self._constraints[names])
+        if self.keep_alive is not None:
+            kwargs["extra_body"] = {**kwargs.get("extra_body", {}), "keep_alive": self.keep_alive}
+        return kwargs
+
+    def log_stream(self, state: ToolCallStream) -> None:
+        # finish_stream sets time_to_call; a stream whose chunks carried no token has no ttft.
+        if state.ttft is None or state.time_to_call is None:
+            logging.info(f"Streamed tool call complete without a timed first token ({state.chunks} chunks)")
+            return
+        add_span("first_token", state.started, state.started + state.ttft)
+        add_span("decode", state.started + state.ttft, state.started + state.time_to_call)
+        logging.info(
+            f"Streamed tool call complete after {state.time_to_call:.3f}s "
+            f"(first token after {state.ttft:.3f}s, {state.chunks} chunks)"
         )
+
+    def parse_response(self, chat_response: ChatCompletion) -> dict:
         message = chat_response.choices[0].message
+        if self.decoding != "tools" and not message.tool_calls:
+            try:
+                return parse_call(message.content or "")
+            except ValueError:
+                # Not the constrained format after all; try to repair it like any other answer.
+                pass
+        calls = [
+            (call.function.name, call.function.arguments)
+            for call in message.tool_calls or []
+            if call.type == "function" and call.function
+        ]
+        return self.repair(calls, message.content, chat_response)
+
+    def repair(self, calls: Iterable[tuple[str | None, str | None]], content: str | None, response: object) -> dict:
         try:
-            [tool_call] = message.tool_calls
-            tool_call_dict = {
-                "name": tool_call.function.name,
-                "arguments": json.loads(tool_call.function.arguments),
-            }
+            tool_call_dict, repairs = parse_message(calls, content)
+        except RepairError as e:
+            logging.error(f"Single tool call not found in LM response: {response}")
+            raise RuntimeError(f"Single tool call not found in LM response: {e}") from e
+        if repairs:
+            self.repairs.update(repairs)
+            logging.info(f"Repaired tool call ({', '.join(repairs)}): {tool_call_dict}")
+        return tool_call_dict
+
+    def finish_stream(self, state: ToolCallStream) -> dict:
+        """
+        The tool call a finished stream holds, parsed, repaired and coerced like a non-streamed answer.
+
+        A stream that ended without a well-formed call is completed from what it received.
+        """
+        calls = [(state.name, state.arguments_text)] if state.name else []
+        tool_call_dict = self.repair(calls, state.content, state.arguments_text)
+        state.name, state.arguments = tool_call_dict["name"], tool_call_dict["arguments"]
+        if not state.complete:
+            state.time_to_call = time.perf_counter() - state.started
+        return tool_call_dict
+
+
+class DistilLabsLLM(BaseDistilLabsLLM):
+    def __init__(self, model_name: str, port: int = 11434, **kwargs) -> None:
+        super().__init__(model_name, port=port, **kwargs)
+        self._hedge_threads: ThreadPoolExecutor | None = None
+        self.coalescer = SingleFlight()
+
+    @property
+    def client(self) -> OpenAI:
+        """The OpenAI client of the first endpoint, which is the only one unless several were given."""
+        return self.pool.endpoints[0].client
+
+    def invoke(self, question: str, on_partial: Callable[[ToolCallStream], None] | None = None) -> dict:
+        """
+        Return the tool call for `question`.
+
+        `on_partial`, if given, is called with the partial tool call as it streams in (the
+        request is streamed even without `stream`). It is not called for answers that do not
+        come from the model, or are constrained by `decoding`.
+        """
+        if not self.coalesce or on_partial is not None:
+            return self._invoke(question, on_partial)
+        return self.coalescer.do(self.flight_key(question), lambda: self._invoke(question))
+
+    def _invoke(self, question: str, on_partial: Callable[[ToolCallStream], None] | None = None) -> dict:
+        with span("rules"):
+            tool_call_dict = self.rule_lookup(question)
+        if tool_call_dict is not None:
             return tool_call_dict
-        except Exception as e:
-            logging.error(f"Single tool call not found in LM response: {chat_response}")
-            raise RuntimeError from e
+        with span("cache"):
+            cached, template = self.lookup(question)
+        if cached is not None:
+            return cached
+        with span("bypass"):
+            match = self.bypass_lookup(question)
+        if match is not None and not self.bypass_shadow:
+            return match.tool_call
+        with span("model"):
+            tool_call_dict = self.check(self._complete(question, on_partial))
+        if match is not None:
+            self.record_shadow(question, match, tool_call_dict)
+        self.store(question, template, tool_call_dict)
+        return tool_call_dict
+
+    def stream_tool_call(self, question: str, endpoint: Endpoint | None = None) -> Iterator[ToolCallStream]:
+        """
+        Stream the model's answer, yielding the partial tool call after each chunk until it is complete.
+
+        The last state yielded holds the call parsed, repaired and coerced by `finish_stream`.
+        """
+        if endpoint is None:
+            with self.pool.use() as endpoint:
+                yield from self.stream_tool_call(question, endpoint)
+            return
+        with span("prompt"):
+            kwargs = self.request_kwargs(question)
+        state = ToolCallStream()
+        with endpoint.client.chat.completions.create(**kwargs, stream=True) as chunks:
+            for chunk in chunks:
+                if state.feed(chunk):
+                    # Leaving the block closes the response, whatever the model still generates.
+                    break
+                yield state
+        self.finish_stream(state)
+        yield state
+
+    def _complete(self, question: str, on_partial: Callable[[ToolCallStream], None] | None = None) -> dict:
+        if (hedge := self.hedge_for(on_partial)) is None:
+            return self._answer(question, on_partial)
+        return self._hedged(question, hedge)
+
+    def _answer(self, question: str, on_partial=None, **kwargs) -> dict:
+        """A valid tool call from `_request`, asking again if the answer cannot be repaired or is invalid."""
+        for attempt in range(self.max_requeries + 1):
+            try:
+                tool_call_dict = self._request(question, on_partial, **kwargs)
+                with span("validate"):
+                    return self.check(tool_call_dict)
+            except (RuntimeError, ToolCallError) as e:
+                if attempt == self.max_requeries:
+                    raise
+                self.requeries += 1
+                logging.warning(f"Asking again for {question!r}: {e}")
+        raise AssertionError("the last attempt returns or raises")
+
+    def _request(
+        self,
+        question: str,
+        on_partial: Callable[[ToolCallStream], None] | None = None,
+        exclude: Endpoint | None = None,
+        model: str | None = None,
+        chosen: list[Endpoint] | None = None,
+    ) -> dict:
+        """Send `question` to an endpoint other than `exclude`, retrying once elsewhere if it cannot be reached."""
+        failed = exclude
+        for attempt in range(self.pool.attempts):
+            try:
+                with self.pool.use(exclude=failed) as endpoint:
+                    if chosen is not None:
+                        chosen.append(endpoint)
+                    return self._complete_on(endpoint, question, on_partial, model)
+            except ENDPOINT_ERRORS:
+                if attempt == self.pool.attempts - 1:
+                    raise
+                failed = endpoint
+                logging.warning(f"Endpoint {endpoint.base_url} failed, retrying on another one")
+        raise AssertionError("the last attempt returns or raises")
+
+    def _hedged(self, question: str, hedge: HedgePolicy) -> dict:
+        """
+        Answer `question` from a first attempt or, if it is slow, from whichever of it and a hedge is valid first.
+
+        The attempts run in threads. A synchronous request cannot be interrupted, so the losing
+        one finishes in the background and its answer is dropped; it still counts as in flight
+        for routing until then.
+        """
+        if self._hedge_threads is None:
+            self._hedge_threads = ThreadPoolExecutor(max_workers=HEDGE_THREADS, thread_name_prefix="gitara-hedge")
+        start = time.perf_counter()
+        chosen: list[Endpoint] = []
+        # Each attempt runs in a copy of this context, so its spans are timed with the call's.
+        primary = self._hedge_threads.submit(contextvars.copy_context().run, self._answer, question, chosen=chosen)
+        primary.add_done_callback(lambda _: hedge.record_primary(time.perf_counter() - start))
+        attempts: list[Future] = [primary]
+        if not wait(attempts, timeout=hedge.delay()).done and hedge.allow():
+            exclude = chosen[0] if chosen else None
+            model = hedge.model
+            attempts.append(
+                self._hedge_threads.submit(
+                    contextvars.copy_context().run, self._answer, question, exclude=exclude, model=model
+                )
+            )
+        pending = set(attempts)
+        errors: list[Exception] = []
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in sorted(done, key=attempts.index):
+                try:
+                    tool_call_dict = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                for other in pending:
+                    other.cancel()
+                hedge.record(time.perf_counter() - start, hedge_won=future is not primary)
+                return tool_call_dict
+        raise errors[0]
+
+    def _complete_on(
+        self,
+        endpoint: Endpoint,
+        question: str,
+        on_partial: Callable[[ToolCallStream], None] | None,
+        model: str | None = None,
+    ) -> dict:
+        if (not self.stream and on_partial is None) or self.decoding != "tools":
+            with span("prompt"):
+                kwargs = self.request_kwargs(question, model)
+            with span("request"):
+                chat_response = endpoint.client.chat.completions.create(**kwargs)
+                record_usage(chat_response.usage, chat_response.model_extra)
+            with span("parse"):
+                return self.parse_response(chat_response)
+        with span("request"):
+            for state in self.stream_tool_call(question, endpoint):
+                if on_partial is not None:
+                    on_partial(state)
+            self.log_stream(state)
+        # stream_tool_call has parsed, repaired and coerced the call it ends with (see finish_stream).
+        return state.tool_call()
+
+    def close(self) -> None:
+        if self._hedge_threads is not None:
+            self._hedge_threads.shutdown(wait=False, cancel_futures=True)
+        self.pool.close()
+
+
+class AsyncDistilLabsLLM(BaseDistilLabsLLM):
+    """
+    asyncio counterpart of `DistilLabsLLM` with the same prompt, cache and parsing.
+
+    All requests to an endpoint go through one `AsyncOpenAI` client, whose connection pool
+    keeps connections to the backend alive between requests. At most `max_in_flight` requests
+    are sent at once, not counting hedges; the rest wait for a slot. `timeout` bounds each
+    `invoke` call, including the wait; a coalesced call that times out stops waiting without
+    cancelling the request other calls still wait for.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        port: int = 11434,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        timeout: float | None = None,
+        **kwargs,
+    ) -> None:
+        super().__init__(model_name, port=port, **kwargs)
+        self.timeout = timeout
+        self._limiter = asyncio.Semaphore(max_in_flight)
+        self.coalescer = AsyncSingleFlight()
+
+    async def invoke(
+        self,
+        question: str,
+        timeout: float | None = None,
+        on_partial: Callable[[ToolCallStream], None] | None = None,
+    ) -> dict:
+        async with asyncio.timeout(timeout if timeout is not None else self.timeout):
+            if not self.coalesce or on_partial is not None:
+                return await self._invoke(question, on_partial)
+            return await self.coalescer.do(self.flight_key(question), lambda: self._invoke(question))
+
+    async def _invoke(self, question: str, on_partial: Callable[[ToolCallStream], None] | None = None) -> dict:
+        with span("rules"):
+            tool_call_dict = self.rule_lookup(question)
+        if tool_call_dict is not None:
+            return tool_call_dict
+        with span("cache"):
+            cached, template = self.lookup(question)
+        if cached is not None:
+            return cached
+        with span("bypass"):
+            match = self.bypass_lookup(question)
+        if match is not None and not self.bypass_shadow:
+            return match.tool_call
+        async with self._limiter:
+            with span("model"):
+                tool_call_dict = self.check(await self._complete(question, on_partial))
+        if match is not None:
+            self.record_shadow(question, match, tool_call_dict)
+        self.store(question, template, tool_call_dict)
+        return tool_call_dict
+
+    async def invoke_many(self, questions, return_exceptions: bool = False) -> list:
+        """Invoke all questions concurrently and return their results in order."""
+        return await asyncio.gather(
+            *(self.invoke(question) for question in questions), return_exceptions=return_exceptions
+        )
+
+    async def _complete(self, question: str, on_partial: Callable[[ToolCallStream], None] | None = None) -> dict:
+        if (hedge := self.hedge_for(on_partial)) is None:
+            return await self._answer(question, on_partial)
+        return await self._hedged(question, hedge)
+
+    async def _answer(self, question: str, on_partial=None, **kwargs) -> dict:
+        for attempt in range(self.max_requeries + 1):
+            try:
+                tool_call_dict = await self._request(question, on_partial, **kwargs)
+                with span("validate"):
+                    return self.check(tool_call_dict)
+            except (RuntimeError, ToolCallError) as e:
+                if attempt == self.max_requeries:
+                    raise
+                self.requeries += 1
+                logging.warning(f"Asking again for {question!r}: {e}")
+        raise AssertionError("the last attempt returns or raises")
+
+    async def _request(
+        self,
+        question: str,
+        on_partial: Callable[[ToolCallStream], None] | None = None,
+        exclude: Endpoint | None = None,
+        model: str | None = None,
+        chosen: list[Endpoint] | None = None,
+    ) -> dict:
+        failed = exclude
+        for attempt in range(self.pool.attempts):
+            try:
+                with self.pool.use(exclude=failed) as endpoint:
+                    if chosen is not None:
+                        chosen.append(endpoint)
+                    return await self._complete_on(endpoint, question, on_partial, model)
+            except ENDPOINT_ERRORS:
+                if attempt == self.pool.attempts - 1:
+                    raise
+                failed = endpoint
+                logging.warning(f"Endpoint {endpoint.base_url} failed, retrying on another one")
+        raise AssertionError("the last attempt returns or raises")
+
+    async def _hedged(self, question: str, hedge: HedgePolicy) -> dict:
+        """Like `DistilLabsLLM._hedged`, but the losing request is cancelled."""
+        start = time.perf_counter()
+        chosen: list[Endpoint] = []
+        primary = asyncio.create_task(self._answer(question, chosen=chosen))
+        primary.add_done_callback(lambda _: hedge.record_primary(time.perf_counter() - start))
+        attempts = [primary]
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=hedge.delay())
+            if not done and hedge.allow():
+                request = self._answer(question, exclude=chosen[0] if chosen else None, model=hedge.model)
+                attempts.append(asyncio.create_task(request))
+            pending = set(attempts)
+            errors: list[BaseException] = []
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in sorted(done, key=attempts.index):
+                    if (exception := task.exception()) is not None:
+                        errors.append(exception)
+                        continue
+                    hedge.record(time.perf_counter() - start, hedge_won=task is not primary)
+                    return task.result()
+            raise errors[0]
+        finally:
+            for task in attempts:
+                task.cancel()
+
+    async def _complete_on(
+        self,
+        endpoint: Endpoint,
+        question: str,
+        on_partial: Callable[[ToolCallStream], None] | None,
+        model: str | None = None,
+    ) -> dict:
+        client = endpoint.async_client
+        with span("prompt"):
+            kwargs = self.request_kwargs(question, model)
+        if (not self.stream and on_partial is None) or self.decoding != "tools":
+            with span("request"):
+                chat_response = await client.chat.completions.create(**kwargs)
+                record_usage(chat_response.usage, chat_response.model_extra)
+            with span("parse"):
+                return self.parse_response(chat_response)
+        with span("request"):
+            state = ToolCallStream()
+            async with await client.chat.completions.create(**kwargs, stream=True) as chunks:
+                async for chunk in chunks:
+                    if state.feed(chunk):
+                        break
+                    if on_partial is not None:
+                        on_partial(state)
+            tool_call_dict = self.finish_stream(state)
+            if on_partial is not None:
+                on_partial(state)
+            self.log_stream(state)
+        return tool_call_dict
+
+    async def close(self) -> None:
+        await self.pool.aclose()
+
+    async def __aenter__(self) -> "AsyncDistilLabsLLM":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,271 @@
+import argparse
+import hashlib
+import json
+import math
+import mmap
+import os
+import struct
+import time
+from array import array
+from collections import Counter
+from pathlib import Path
+
+from gitara.cache import cache_dir
+from gitara.dataset import read_dataset
+from gitara.renderer import render_git_command
+from gitara.templates import CANONICALIZER_VERSION, PLACEHOLDER, canonicalize
+
+MAGIC = b"GNN1"
+FORMAT_VERSION = 1
+ALIGNMENT = 8
+DEFAULT_DATA = "finetuning/synthetic-data/train.jsonl"
+DEFAULT_THRESHOLD = 0.8
+MIN_THRESHOLD = 0.6
+THRESHOLD_GRID = (0.6, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95, 1.0)
+
+
+def default_index_path() -> Path:
+    return cache_dir() / "nearest-index.bin"
+
+
+def question_key(question: str):
+    """Return the text the index compares (the question's template, or the question itself) and the template."""
+    template = canonicalize(question)
+    text = template.text if template is not None else " ".join(question.lower().split())
+    return text, template
+
+
+def header_end(header: dict) -> int:
+    end = len(MAGIC) + 4 + header["header_length"]
+    return end + (-end % ALIGNMENT)
+
+
+def trigrams(text: str) -> set[str]:
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class NearestMatch:
+    def __init__(self, question: str, tool_call: dict, similarity: float) -> None:
+        self.question = question
+        self.tool_call = tool_call
+        self.similarity = similarity
+
+    def __repr__(self) -> str:
+        return f"NearestMatch({self.question!r}, {self.tool_call!r}, similarity={self.similarity:.3f})"
+
+
+class NearestIndex:
+    """
+    Character-trigram index over known (question, tool call) pairs, answering near-paraphrases.
+
+    Questions are indexed by their template (see `gitara.templates`), so "push feature-y" can
+    reuse the answer to "push feature-x" with its own branch filled in, and a neighbour is only
+    used if it has exactly the same slots as the query. Similarity is the Jaccard index of the
+    two trigram sets.
+
+    Trigram ids are assigned from rarest to most common, so sorted ids start with the rarest
+    trigrams. A match with Jaccard >= t must share at least ceil(t * |x|) of the trigrams of
+    either side x, hence one of the |x| - ceil(t * |x|) + 1 rarest ones of both sides (prefix
+    filtering). The postings therefore only list each document under the trigrams of its prefix
+    for `min_threshold`, the lookup only probes the query's prefix, and the few candidates of
+    plausible length are verified exactly. The index file is memory-mapped: only the trigram
+    vocabulary is parsed on load.
+    """
+
+    def __init__(self, header: dict, buffer) -> None:
+        self.header = header
+        self.vocabulary = {trigram: i for i, trigram in enumerate(header["vocabulary"])}
+        self._buffer = buffer
+        view = memoryview(buffer)
+        sections = {}
+        offset = header_end(header)
+        for name, (size, typecode) in header["sections"].items():
+            section = view[offset : offset + size]
+            sections[name] = section.cast(typecode) if typecode != "B" else section
+            offset += size + (-size % ALIGNMENT)
+        self._post_ptr = sections["post_ptr"]
+        self._postings = sections["postings"]
+        self._doc_ptr = sections["doc_ptr"]
+        self._doc_tokens = sections["doc_tokens"]
+        self._entry_ptr = sections["entry_ptr"]
+        self._entries = sections["entries"]
+
+    def __len__(self) -> int:
+        return len(self._doc_ptr) - 1
+
+    @staticmethod
+    def build(rows, min_threshold: float = MIN_THRESHOLD) -> bytes:
+        """
+        Serialize an index over (question, tool call) pairs, keeping the majority answer per template.
+
+        Lookups with a threshold below `min_threshold` are not supported by the resulting index.
+        """
+        answers: dict[str, Counter] = {}
+        examples: dict[str, str] = {}
+        digest = hashlib.sha256()
+        for question, tool_call in rows:
+            digest.update(json.dumps([question, tool_call], sort_keys=True).encode())
+            text, template = question_key(question)
+            if template is not None:
+                if (tool_call := template.lift(tool_call)) is None:
+                    # The answer depends on an entity the template cannot carry over to other questions.
+                    continue
+            answers.setdefault(text, Counter())[json.dumps(tool_call, sort_keys=True)] += 1
+            examples.setdefault(text, question)
+
+        texts = sorted(answers)
+        doc_trigrams = [trigrams(text) for text in texts]
+        document_frequency = Counter(trigram for grams in doc_trigrams for trigram in grams)
+        vocabulary = sorted(document_frequency, key=lambda trigram: (document_frequency[trigram], trigram))
+        ids = {trigram: i for i, trigram in enumerate(vocabulary)}
+
+        postings_by_id: list[list[int]] = [[] for _ in vocabulary]
+        doc_ptr, doc_tokens = array("I", [0]), array("I")
+        entry_ptr, entries = array("I", [0]), bytearray()
+        for doc, (text, grams) in enumerate(zip(texts, doc_trigrams)):
+            token_ids = sorted(ids[trigram] for trigram in grams)
+            for token in token_ids[: len(token_ids) - math.ceil(min_threshold * len(token_ids)) + 1]:
+                postings_by_id[token].append(doc)
+            doc_tokens.extend(token_ids)
+            doc_ptr.append(len(doc_tokens))
+            [(answer, _)] = answers[text].most_common(1)
+            entries += json.dumps([examples[text], text, json.loads(answer)]).encode()
+            entry_ptr.append(len(entries))
+        post_ptr, postings = array("I", [0]), array("I")
+        for doc_ids in postings_by_id:
+            postings.extend(doc_ids)
+            post_ptr.append(len(postings))
+
+        arrays = {
+            "post_ptr": post_ptr,
+            "postings": postings,
+            "doc_ptr": doc_ptr,
+            "doc_tokens": doc_tokens,
+            "entry_ptr": entry_ptr,
+        }
+        blobs = {name: (values.tobytes(), values.typecode) for name, values in arrays.items()}
+        blobs["entries"] = (bytes(entries), "B")
+        header = {
+            "format": FORMAT_VERSION,
+            "canonicalizer": CANONICALIZER_VERSION,
+            "source": digest.hexdigest()[:16],
+            "min_threshold": min_threshold,
+            "vocabulary": vocabulary,
+            "sections": {name: [len(blob), typecode] for name, (blob, typecode) in blobs.items()},
+        }
+        header_bytes = json.dumps(header).encode()
+        out = bytearray(MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes)
+        for blob, _ in blobs.values():
+            # Sections are aligned so that they can be cast to typed memoryviews in place.
+            out += b"\0" * (-len(out) % ALIGNMENT)
+            out += blob
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "NearestIndex":
+        if data[: len(MAGIC)] != MAGIC:
+            raise ValueError("Not a gitara nearest-neighbour index")
+        [header_length] = struct.unpack_from("<I", data, len(MAGIC))
+        start = len(MAGIC) + 4
+        header = json.loads(bytes(data[start : start + header_length]))
+        header["header_length"] = header_length
+        return cls(header, data)
+
+    @classmethod
+    def load(cls, path: str | os.PathLike | None = None) -> "NearestIndex | None":
+        """Memory-map an index file; return None if it is missing or was built by an incompatible lexer."""
+        path = Path(path) if path is not None else default_index_path()
+        try:
+            with open(path, "rb") as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return None
+        index = cls.from_bytes(buffer)  # type: ignore[arg-type]
+        if index.header["format"] != FORMAT_VERSION or index.header["canonicalizer"] != CANONICALIZER_VERSION:
+            return None
+        return index
+
+    def nearest(self, question: str, threshold: float = DEFAULT_THRESHOLD) -> NearestMatch | None:
+        """Return the most similar known question with similarity >= `threshold`, with its answer filled in."""
+        if threshold < self.header["min_threshold"]:
+            raise ValueError(f"This index supports thresholds >= {self.header['min_threshold']}, got {threshold}")
+        text, template = question_key(question)
+        grams = trigrams(text)
+        vocabulary = self.vocabulary
+        unknown = -1
+        query = sorted(vocabulary.get(trigram, unknown) for trigram in grams)
+        known = {token for token in query if token != unknown}
+        # Unknown trigrams sort first: they are in no document, so they use up the prefix for free.
+        prefix = len(query) - math.ceil(threshold * len(query)) + 1
+        post_ptr, postings = self._post_ptr, self._postings
+        candidates: set[int] = set()
+        for token in query[:prefix]:
+            if token != unknown:
+                candidates.update(postings[post_ptr[token] : post_ptr[token + 1]])
+
+        best, best_similarity = None, threshold
+        doc_ptr, doc_tokens = self._doc_ptr, self._doc_tokens
+        min_length, max_length = threshold * len(query), len(query) / threshold if threshold else math.inf
+        for doc in candidates:
+            start, end = doc_ptr[doc], doc_ptr[doc + 1]
+            if not min_length <= end - start <= max_length:
+                continue
+            overlap = len(known.intersection(doc_tokens[start:end]))
+            similarity = overlap / (len(query) + (end - start) - overlap)
+            if similarity >= best_similarity:
+                best, best_similarity = doc, similarity
+        if best is None:
+            return None
+
+        entry = self._entries[self._entry_ptr[best] : self._entry_ptr[best + 1]]
+        example, example_text, tool_call = json.loads(bytes(entry))
+        if set(PLACEHOLDER.findall(example_text)) != set(PLACEHOLDER.findall(text)):
+            return None
+        if template is not None:
+            tool_call = template.fill(tool_call)
+        return NearestMatch(example, tool_call, best_similarity)
+
+
+def evaluate(index: NearestIndex, rows, thresholds=THRESHOLD_GRID) -> list[dict]:
+    """For each threshold, measure how many rows the bypass answers and how often the rendered command is right."""
+    rows = list(rows)
+    results = []
+    for threshold in thresholds:
+        answered = correct = 0
+        start = time.perf_counter()
+        for question, tool_call in rows:
+            if (match := index.nearest(question, threshold)) is None:
+                continue
+            answered += 1
+            correct += render_git_command(match.tool_call) == render_git_command(tool_call)
+        elapsed = time.perf_counter() - start
+        results.append(
+            {
+                "threshold": threshold,
+                "coverage": answered / len(rows) if rows else 0.0,
+                "accuracy": correct / answered if answered else None,
+                "mean_lookup_ms": 1000 * elapsed / len(rows) if rows else None,
+            }
+        )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or evaluate the nearest-neighbour bypass index")
+    parser.add_argument("action", choices=["build", "evaluate"])
+    parser.add_argument("--data", type=str, default=DEFAULT_DATA, required=False)
+    parser.add_argument("--index", type=str, default=None, required=False)
+    args = parser.parse_args()
+
+    index_path = Path(args.index) if args.index else default_index_path()
+    if args.action == "build":
+        data = NearestIndex.build(read_dataset(args.data))
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        index_path.write_bytes(data)
+        print(f"Wrote {len(NearestIndex.from_bytes(data))} entries ({len(data)} bytes) to {index_path}")
+    else:
+        if (index := NearestIndex.load(index_path)) is None:
+            parser.error(f"No usable index at {index_path}, run the build action first")
+        for result in evaluate(index, read_dataset(args.data)):
+            print(json.dumps(result))
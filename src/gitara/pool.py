@@ -0,0 +1,183 @@
+import logging
+import threading
+import time
+import urllib.request
+from collections.abc import Iterator
+from contextlib import contextmanager
+from functools import cached_property
+
+from openai import DEFAULT_MAX_RETRIES, APIConnectionError, AsyncOpenAI, InternalServerError, OpenAI
+
+DEFAULT_MAX_FAILURES = 3
+DEFAULT_HEALTH_INTERVAL = 5.0
+HEALTH_TIMEOUT = 1.0
+
+# Errors that say something about the endpoint rather than the request: it cannot be reached,
+# timed out or failed internally. Only these count towards ejecting it.
+ENDPOINT_ERRORS = (APIConnectionError, InternalServerError)
+
+
+def local_url(port: int) -> str:
+    return f"http://127.0.0.1:{port}/v1"
+
+
+class Endpoint:
+    """One OpenAI-compatible backend of a pool, with its clients and counters."""
+
+    def __init__(self, base_url: str, max_retries: int | None = None) -> None:
+        self.base_url = base_url.rstrip("/")
+        # The clients' own retries stay on this endpoint; a pool retries elsewhere instead.
+        self.max_retries = DEFAULT_MAX_RETRIES if max_retries is None else max_retries
+        self.healthy = True
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+        self.failures = 0
+        self.ejections = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    @cached_property
+    def client(self) -> OpenAI:
+        return OpenAI(base_url=self.base_url, api_key="EMPTY", max_retries=self.max_retries)
+
+    @cached_property
+    def async_client(self) -> AsyncOpenAI:
+        return AsyncOpenAI(base_url=self.base_url, api_key="EMPTY", max_retries=self.max_retries)
+
+    def stats(self) -> dict:
+        completed = self.requests - self.outstanding
+        return {
+            "url": self.base_url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "ejections": self.ejections,
+            "latency_mean": round(self.latency_total / completed, 4) if completed else None,
+            "latency_max": round(self.latency_max, 4),
+        }
+
+
+class EndpointPool:
+    """
+    Routes requests over several backends serving the same model.
+
+    Each request goes to the healthy endpoint with the fewest requests in flight, and among
+    those to the one that has had the fewest requests, so a sequential client takes turns. An
+    endpoint that fails `max_failures` times in a row (see `ENDPOINT_ERRORS`) is ejected and
+    only gets requests again once a health check (a GET of its model list, every
+    `health_interval` seconds in a background thread) succeeds. If every endpoint is ejected,
+    requests go to all of them rather than failing without trying.
+
+    A pool of one endpoint behaves like a plain client: no health checks, and the client's own
+    retries.
+    """
+
+    def __init__(
+        self,
+        urls: list[str],
+        max_failures: int = DEFAULT_MAX_FAILURES,
+        health_interval: float | None = DEFAULT_HEALTH_INTERVAL,
+    ) -> None:
+        if not urls:
+            raise ValueError("An endpoint pool needs at least one endpoint")
+        self.endpoints = [Endpoint(url, max_retries=0 if len(urls) > 1 else None) for url in urls]
+        self.max_failures = max_failures
+        self.health_interval = health_interval
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._health_thread = None
+        if len(self.endpoints) > 1 and health_interval:
+            self._health_thread = threading.Thread(target=self._check_periodically, daemon=True)
+            self._health_thread.start()
+
+    @property
+    def attempts(self) -> int:
+        """How many endpoints a request may try before its connection error is raised."""
+        return min(2, len(self.endpoints))
+
+    def acquire(self, exclude: Endpoint | None = None) -> Endpoint:
+        with self._lock:
+            candidates = [e for e in self.endpoints if e.healthy and e is not exclude] or [
+                e for e in self.endpoints if e is not exclude
+            ]
+            endpoint = min(candidates or self.endpoints, key=lambda e: (e.outstanding, e.requests))
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def release(self, endpoint: Endpoint, latency: float, error: BaseException | None = None) -> None:
+        with self._lock:
+            endpoint.outstanding -= 1
+            endpoint.latency_total += latency
+            endpoint.latency_max = max(endpoint.latency_max, latency)
+            if error is None:
+                endpoint.failures = 0
+                return
+            endpoint.errors += 1
+            if isinstance(error, ENDPOINT_ERRORS):
+                self._failed(endpoint, error)
+
+    def _failed(self, endpoint: Endpoint, error: BaseException | str) -> None:
+        endpoint.failures += 1
+        if endpoint.healthy and endpoint.failures >= self.max_failures and len(self.endpoints) > 1:
+            endpoint.healthy = False
+            endpoint.ejections += 1
+            logging.warning(f"Ejected endpoint {endpoint.base_url} after {endpoint.failures} failures: {error}")
+
+    @contextmanager
+    def use(self, exclude: Endpoint | None = None) -> Iterator[Endpoint]:
+        """Hold an endpoint for one request, recording its latency and whether it failed."""
+        endpoint = self.acquire(exclude)
+        start = time.perf_counter()
+        error = None
+        try:
+            yield endpoint
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.release(endpoint, time.perf_counter() - start, error)
+
+    def check(self, endpoint: Endpoint) -> bool:
+        """Ask `endpoint` for its model list; re-admit it if it answers, count a failure if not."""
+        try:
+            with urllib.request.urlopen(f"{endpoint.base_url}/models", timeout=HEALTH_TIMEOUT) as response:
+                error = None if response.status == 200 else f"HTTP {response.status}"
+        except OSError as e:
+            # Also HTTP error statuses, as urllib raises them as URLError.
+            error = str(e) or repr(e)
+        with self._lock:
+            if error is None:
+                endpoint.failures = 0
+                if not endpoint.healthy:
+                    endpoint.healthy = True
+                    logging.warning(f"Re-admitted endpoint {endpoint.base_url}")
+            else:
+                self._failed(endpoint, error)
+        return error is None
+
+    def check_all(self) -> None:
+        for endpoint in self.endpoints:
+            self.check(endpoint)
+
+    def _check_periodically(self) -> None:
+        while not self._closed.wait(self.health_interval):
+            self.check_all()
+
+    def stats(self) -> list[dict]:
+        with self._lock:
+            return [endpoint.stats() for endpoint in self.endpoints]
+
+    def close(self) -> None:
+        self._closed.set()
+        for endpoint in self.endpoints:
+            if "client" in endpoint.__dict__:
+                endpoint.client.close()
+
+    async def aclose(self) -> None:
+        self._closed.set()
+        for endpoint in self.endpoints:
+            if "async_client" in endpoint.__dict__:
+                await endpoint.async_client.close()
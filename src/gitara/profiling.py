@@ -0,0 +1,183 @@
+import os
+import subprocess
+import sys
+import time
+from collections import Counter
+from collections.abc import Callable
+from pathlib import Path
+
+PROFILE_MODES = ("cpu", "imports", "alloc")
+SUMMARY_LINES = 10
+# Collapsed-stack paths carrying less than this share of the run are left out of the flamegraph.
+MIN_STACK_SHARE = 1e-4
+MAX_STACK_DEPTH = 200
+
+
+def profile_dir() -> Path:
+    """Where profiles are written: $GITARA_PROFILE_DIR, else `profiles` in gitara's cache directory."""
+    if path := os.environ.get("GITARA_PROFILE_DIR"):
+        return Path(path)
+    # Not `gitara.cache.cache_dir`, which would import sqlite3 before the profile starts.
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return Path(cache_home) / "gitara" / "profiles"
+
+
+def artifact_path(mode: str, suffix: str) -> Path:
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory / f"{mode}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}{suffix}"
+
+
+def _summarize(lines: list[str]) -> None:
+    for line in lines:
+        print(f"# {line}", file=sys.stderr)
+
+
+def _label(func: tuple[str, int, str]) -> str:
+    filename, line, name = func
+    if filename == "~":
+        # Built-ins, named like "<built-in method time.sleep>".
+        return name.strip("<>")
+    return f"{name} ({'/'.join(Path(filename.strip('<>')).parts[-2:])}:{line})"
+
+
+def collapsed_stacks(stats) -> Counter[str]:
+    """
+    Microseconds per call stack, in the collapsed format of flamegraph.pl and speedscope.
+
+    cProfile only keeps caller-callee pairs, not whole stacks, so a function's time is split
+    over the paths leading to it in proportion to the time each caller spent in it, as
+    flameprof does. Recursive calls are cut at the first repeat.
+    """
+    callees: dict[tuple, list[tuple[tuple, float]]] = {}
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        for caller, (_, _, _, cumulative) in callers.items():
+            callees.setdefault(caller, []).append((func, cumulative))
+    total = max((entry[3] for entry in stats.stats.values()), default=0.0) or 1.0
+    stacks: Counter[str] = Counter()
+    pending: list[tuple[tuple, tuple, float]] = [(func, (), 1.0) for func, entry in stats.stats.items() if not entry[4]]
+    while pending:
+        func, path, share = pending.pop()
+        _, _, own, cumulative, _ = stats.stats[func]
+        path = (*path, func)
+        key = ";".join(map(_label, path))
+        stacks[key] += round(own * share * 1e6)
+        if len(path) >= MAX_STACK_DEPTH:
+            continue
+        for callee, edge in callees.get(func, ()):
+            callee_total = stats.stats[callee][3]
+            if callee in path or not callee_total or edge * share < MIN_STACK_SHARE * total:
+                continue
+            pending.append((callee, path, share * edge / callee_total))
+    return +stacks
+
+
+def _profile_cpu(run: Callable[[], None]) -> None:
+    import cProfile
+    import io
+    import pstats
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.runcall(run)
+    finally:
+        path = artifact_path("cpu", ".prof")
+        profiler.dump_stats(path)
+        stats = pstats.Stats(profiler)
+        collapsed = path.with_suffix(".collapsed")
+        collapsed.write_text("".join(f"{stack} {us}\n" for stack, us in sorted(collapsed_stacks(stats).items())))
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(SUMMARY_LINES)
+        table = out.getvalue().splitlines()
+        start = next((i for i, line in enumerate(table) if line.lstrip().startswith("ncalls")), 0)
+        total = stats.get_stats_profile().total_tt
+        _summarize(
+            [f"CPU profile: {path} (pstats), {collapsed} (collapsed stacks), {total:.3f}s profiled"]
+            + [line for line in table[start:] if line.strip()]
+        )
+
+
+def _profile_alloc(run: Callable[[], None]) -> None:
+    import tracemalloc
+
+    tracemalloc.start(25)
+    try:
+        run()
+    finally:
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        path = artifact_path("alloc", ".tracemalloc")
+        snapshot.dump(str(path))
+        top = snapshot.statistics("lineno")
+        report = path.with_suffix(".txt")
+        report.write_text("".join(f"{stat}\n" for stat in top[:100]))
+        _summarize(
+            [
+                f"Allocations: {path} (tracemalloc snapshot), {report} (top lines), "
+                f"peak {peak / 1e6:.1f} MB, {current / 1e6:.1f} MB at exit"
+            ]
+            + [str(stat) for stat in top[:SUMMARY_LINES]]
+        )
+
+
+def parse_importtime(lines: list[str]) -> list[tuple[int, int, str]]:
+    """(self µs, cumulative µs, module) of each line of `-X importtime` output; the module keeps its indentation."""
+    entries = []
+    for line in lines:
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, cumulative, module = line.removeprefix("import time:").split("|", 2)
+        if own.strip().isdigit():
+            entries.append((int(own), int(cumulative), module.rstrip()[1:]))
+    return entries
+
+
+def _profile_imports(argv: list[str]) -> int:
+    """Run the CLI again under `-X importtime`, which can only be turned on when Python starts."""
+    env = {key: value for key, value in os.environ.items() if key != "GITARA_PROFILE"}
+    command = [sys.executable, "-X", "importtime", "-c", 'from gitara.cli import main; main(prog_name="gitara")', *argv]
+    child = subprocess.Popen(command, env=env, stderr=subprocess.PIPE, text=True)
+    timings = []
+    # stderr is always a pipe here; `or ()` only narrows its Optional type.
+    for line in child.stderr or ():
+        if line.startswith("import time:"):
+            timings.append(line)
+        else:
+            sys.stderr.write(line)
+    returncode = child.wait()
+    path = artifact_path("imports", ".txt")
+    path.write_text("".join(timings))
+    entries = parse_importtime(timings)
+    # Modules imported directly, not by another module; their cumulative times add up to the total.
+    top_level = [entry for entry in entries if not entry[2].startswith(" ")]
+    slowest = sorted(top_level, key=lambda entry: -entry[1])[:SUMMARY_LINES]
+    _summarize(
+        [
+            f"Import times: {path} (-X importtime), {len(entries)} modules in "
+            f"{sum(entry[1] for entry in top_level) / 1000:.1f} ms, slowest:"
+        ]
+        + [f"{cumulative / 1000:8.1f} ms  {module}" for _, cumulative, module in slowest]
+    )
+    return returncode
+
+
+def run_profiled(mode: str, argv: list[str]) -> None:
+    """
+    Run the gitara CLI with `argv` under profiler `mode`, then write the profile and summarize it on stderr.
+
+    `cpu` profiles the run, imports included, with cProfile and writes the stats and collapsed
+    stacks for a flamegraph; `imports` records `-X importtime` output; `alloc` traces memory
+    allocations with tracemalloc. Profiles are written to `profile_dir()`.
+    """
+    if mode not in PROFILE_MODES:
+        raise SystemExit(f"Error: Unknown GITARA_PROFILE {mode!r}, expected one of {', '.join(PROFILE_MODES)}")
+    if mode == "imports":
+        sys.exit(_profile_imports(argv))
+
+    def run() -> None:
+        from gitara.cli import main
+
+        main(args=argv, prog_name="gitara")
+
+    (_profile_cpu if mode == "cpu" else _profile_alloc)(run)
@@ -0,0 +1,129 @@
+import argparse
+import re
+import statistics
+import time
+
+from gitara.dataset import read_dataset
+
+DEFAULT_DATA = "finetuning/data/test.jsonl"
+
+# Everything before the question is a constant, so that consecutive requests share a byte-identical
+# prefix (tools, system prompt, examples) and the backend can reuse its KV cache for all of it.
+SYSTEM_PROMPT = """
+You are a tool-calling model working on the task in the 'task_description' XML block:
+
+<task_description>Respond with the next git operation tool call based on the desired action</task_description>
+
+You will be given a single task in the 'question' XML block.
+Solve the task in 'question' block by generating an appropriate tool call according to the provided tool schema.
+Generate only the answer, do not generate anything else.
+
+
+Rules for generating the answers:
+- It should be a JSON object with exactly two keys: "name" and "parameters".
+- Do not include any other keys.
+- Do not add anything, except valid JSON.
+- Do not include trailing commas.
+- Do not add anything before/after the tool call.
+- Stick to the format of the following examples:
+
+{"name": "refresh_page", "parameters": {}}
+{"name": "get_weather", "parameters": {"location": "Paris, France"}}
+"""
+
+QUESTION_PREFIX = """Here are examples that show how this task can be solved
+In examples, contexts are in the context XML block, tasks in the question XML block, solutions in the answer XML block
+When solving a real task, generate only the answer, do not generate anything else
+
+
+<example>
+<question>apply stash@{5}</question>
+<answer>{"name": "git_stash", "parameters": {"action": "apply", "stash_ref": "stash@{5}"}}</answer>
+</example>
+
+
+<example>
+<question>commit fix: typos</question>
+<answer>{"name": "git_commit", "parameters": {"message": "fix: typos"}}</answer>
+</example>
+Now for the real task, solve the task in question block.
+Generate only the solution, do not generate anything else.
+
+<question>"""
+QUESTION_SUFFIX = "</question>"
+
+_SYSTEM_DIRECTIVE = re.compile(r'^SYSTEM[ \t]+(?:""".*?"""|[^\n]*)[ \t]*\n?', re.MULTILINE | re.DOTALL)
+
+
+def build_messages(question: str, system_prompt: bool = True) -> list[dict[str, str]]:
+    """
+    Chat messages asking for the tool call for `question`.
+
+    The question comes last, after the constant system prompt and examples. Without
+    `system_prompt`, the system message is left out for a model whose Modelfile already sets
+    it (see `render_modelfile`).
+    """
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}] if system_prompt else []
+    messages.append({"role": "user", "content": QUESTION_PREFIX + question + QUESTION_SUFFIX})
+    return messages
+
+
+def render_modelfile(base: str) -> str:
+    """Return the Ollama Modelfile `base` with its SYSTEM directive replaced by gitara's system prompt."""
+    base = _SYSTEM_DIRECTIVE.sub("", base).rstrip("\n")
+    return f'{base}\nSYSTEM """{SYSTEM_PROMPT}"""\n'
+
+
+def benchmark(client, questions: list[str], repeats: int = 1) -> dict:
+    """
+    Compare backend latency with the stable prompt against the same prompt made unstable.
+
+    The unstable variant starts the system prompt with a per-request id, as a timestamp or any
+    other per-call formatting would, so the backend cannot reuse anything it cached from the
+    previous request. `client` is a `DistilLabsLLM` (only its first endpoint is measured); each
+    variant is measured in its own block, after one warm-up request, so that it has the
+    backend's cache to itself.
+    """
+    variants = {
+        "stable": lambda i, question: build_messages(question),
+        "unstable": lambda i, question: [
+            {"role": "system", "content": f"Request {i}\n{SYSTEM_PROMPT}"},
+            *build_messages(question, system_prompt=False),
+        ],
+    }
+    report: dict[str, dict[str, float]] = {}
+    for name, messages in variants.items():
+        latencies = []
+        for i, question in enumerate([questions[0]] + questions * repeats):
+            kwargs = {**client.request_kwargs(question), "messages": messages(i, question)}
+            start = time.perf_counter()
+            client.pool.endpoints[0].client.chat.completions.create(**kwargs)
+            if i:
+                latencies.append(time.perf_counter() - start)
+        report[name] = {"mean": statistics.mean(latencies), "p50": statistics.median(latencies)}
+    return {**report, "gain": 1 - report["stable"]["mean"] / report["unstable"]["mean"]}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bake the system prompt into a Modelfile, or benchmark prefix reuse")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+    modelfile_parser = subparsers.add_parser("modelfile", help="Print a Modelfile with gitara's SYSTEM prompt")
+    modelfile_parser.add_argument("base", type=str, help="Modelfile of the downloaded model")
+    benchmark_parser = subparsers.add_parser("benchmark", help="Measure the latency gain of the stable prompt prefix")
+    benchmark_parser.add_argument("--data", type=str, default=DEFAULT_DATA, required=False)
+    benchmark_parser.add_argument("--limit", type=int, default=20, required=False)
+    benchmark_parser.add_argument("--model", type=str, default="gitara", required=False)
+    benchmark_parser.add_argument("--port", type=int, default=11434, required=False)
+    args = parser.parse_args()
+
+    if args.action == "modelfile":
+        with open(args.base) as f:
+            print(render_modelfile(f.read()), end="")
+    else:
+        from gitara.model_client import DistilLabsLLM
+
+        questions = [question for question, _ in read_dataset(args.data)][: args.limit]
+        report = benchmark(DistilLabsLLM(model_name=args.model, port=args.port), questions)
+        for name in ("stable", "unstable"):
+            print(f"{name:<9} mean {report[name]['mean']:.3f}s  p50 {report[name]['p50']:.3f}s")
+        print(f"gain: {report['gain']:.1%}")
@@ -1,3 +1,117 @@
+import json
+from collections.abc import Callable, Iterable, Iterator
+from functools import partial
+
+from gitara.dataset import DEFAULT_CHUNK_SIZE, map_chunks
+from gitara.tools import COMMANDS
+from gitara.validation import VALIDATOR
+
+
+def _words(step) -> Callable[[dict], str]:
+    """The function returning the words a step other than `require` and `case` adds, each after a space, or ""."""
+    if isinstance(step, str):
+        word = " " + step
+        return lambda args: word
+    kind, key = step[0], step[1]
+    if kind == "flag":
+        flag = " " + step[2]
+        return lambda args: flag if args.get(key) else ""
+    if kind == "value":
+        template, options = " " + step[2], step[3] if len(step) > 3 else {}
+        default, skip = options.get("default"), options.get("skip")
+        if "default_if" in options:
+            condition = options["default_if"]
+
+            def value(args: dict) -> str:
+                found = args.get(key, default if args.get(condition) else None)
+                return template.format(found) if found and found != skip else ""
+
+            return value
+        return lambda args: template.format(found) if (found := args.get(key, default)) and found != skip else ""
+    if kind == "quoted":
+        return lambda args: f' {step[2]} "{found}"' if (found := args.get(key)) else ""
+    if kind == "option":
+        return lambda args: f" {step[2]} {found}" if (found := args.get(key)) else ""
+    if kind == "either":
+        if_true, if_false = " " + step[2], " " + step[3]
+        return lambda args: if_true if args.get(key) else if_false
+    if kind == "list":
+        default = step[2]
+        return lambda args: " " + " ".join(items) if (items := args.get(key) or default) else ""
+    if kind == "first":
+        options = [_words(option) for option in step[1]]
+
+        def first(args: dict) -> str:
+            for option in options:
+                if words := option(args):
+                    return words
+            return ""
+
+        return first
+    raise ValueError(f"Unknown render step {step!r}")
+
+
+def _build_steps(steps: list) -> Callable[[dict, str], str]:
+    """
+    The function appending the words of `steps` to a command, given the tool's arguments.
+
+    A `require` step returns its error instead, and a `case` step hands over to the function of
+    the branch it picks, which goes on with the steps that follow the case.
+    """
+    # Literal words before the first argument-dependent step are added as one string.
+    literal = ""
+    words: list[Callable[[dict], str]] = []
+    then = None
+    for i, step in enumerate(steps):
+        if isinstance(step, tuple) and step[0] in ("require", "case"):
+            then = _build_branch(step, steps[i + 1 :])
+            break
+        if isinstance(step, str) and not words:
+            literal += " " + step
+        else:
+            words.append(_words(step))
+
+    def render(args: dict, command: str) -> str:
+        command += literal
+        for add in words:
+            command += add(args)
+        return command if then is None else then(args, command)
+
+    return render
+
+
+def _build_branch(step: tuple, rest: list) -> Callable[[dict, str], str]:
+    """The function for a `require` or `case` step followed by the steps in `rest`."""
+    if step[0] == "require":
+        keys, error, then = step[1], "# Error: " + step[2], _build_steps(rest)
+        return lambda args, command: then(args, command) if any(args.get(key) for key in keys) else error
+    _, key, default, cases, echo = step
+    branches = [
+        (match if isinstance(match, tuple) else (match,), _build_steps([*case_steps, *rest]))
+        for match, case_steps in cases.items()
+    ]
+    otherwise = _build_steps(rest)
+
+    def case(args: dict, command: str) -> str:
+        value = args.get(key, default)
+        if echo:
+            command += " " + value
+        render = next((render for values, render in branches if value in values), otherwise)
+        return render(args, command)
+
+    return case
+
+
+def build_renderer(steps: list) -> Callable[[dict], str]:
+    """Build the function rendering a tool's arguments as a git command from its steps in `COMMANDS`."""
+    render = _build_steps(steps)
+    return lambda args: render(args, "git")
+
+
+# One function per tool, built from COMMANDS when the module is imported.
+RENDERERS: dict[str, Callable[[dict], str]] = {name: build_renderer(steps) for name, steps in COMMANDS.items()}
+
+
 def render_git_command(tool_call: dict) -> str:
     """
     Render a tool call as a git command.
@@ -14,135 +128,62 @@ def render_git_command(tool_call: dict) -> str:
     if not isinstance(args, dict):
         args = {}
 
-    cmd = ["git"]
-    match name:
-        case "git_status":
-            cmd.append("status")
-            if args.get("verbose"):
-                cmd.append("--verbose")
-            if args.get("ignored"):
-                cmd.append("--ignored")
-        case "git_add":
-            cmd.append("add")
-            files = args.get("files", [])
-            if not files:
-                files = ["."]
-            cmd.extend(files)
-        case "git_commit":
-            cmd.append("commit")
-            message = args.get("message")
-            amend = args.get("amend")
-            if not message and not amend:
-                return "# Error: message is required"
-            if amend:
-                cmd.append("--amend")
-            if message:
-                cmd.extend(["-m", f'"{message}"'])
-        case "git_push":
-            cmd.append("push")
-            if remote := args.get("remote", "origin" if args.get("branch") else None):
-                cmd.append(remote)
-            if branch := args.get("branch"):
-                cmd.append(branch)
-            if args.get("force"):
-                cmd.append("--force")
-            if args.get("set_upstream"):
-                cmd.append("--set-upstream")
-        case "git_pull":
-            cmd.append("pull")
-            branch = args.get("branch")
-            if remote := args.get("remote", "origin" if branch else None):
-                cmd.append(remote)
-            if branch:
-                cmd.append(branch)
-            if args.get("rebase"):
-                cmd.append("--rebase")
-        case "git_branch":
-            cmd.append("branch")
-            match args.get("action", "list"):
-                case "list":
-                    if args.get("all"):
-                        cmd.append("--all")
-                case "delete":
-                    if branch_name := args.get("branch_name"):
-                        d_flag = "-D" if args.get("force") else "-d"
-                        cmd.extend([d_flag, branch_name])
-                    else:
-                        return "# Error: branch name is required"
-        case "git_switch":
-            cmd.append("switch")
-            if args.get("create"):
-                cmd.append("-c")
-            elif args.get("detach"):
-                cmd.append("--detach")
-            if branch := args.get("branch"):
-                cmd.append(branch)
-        case "git_restore":
-            cmd.append("restore")
-            if source := args.get("source"):
-                cmd.append(f"--source={source}")
-            restore_target = args.get("restore_target", "worktree")
-            if restore_target == "staged":
-                cmd.append("--staged")
-            elif restore_target == "both":
-                cmd.extend(["--staged", "--worktree"])
-            if files := args.get("files", []):
-                cmd.extend(files)
-        case "git_merge":
-            cmd.append("merge")
-            if branch := args.get("branch"):
-                cmd.append(branch)
-            if args.get("no_ff"):
-                cmd.append("--no-ff")
-            elif args.get("ff_only"):
-                cmd.append("--ff-only")
-            strategy = args.get("strategy")
-            if strategy and strategy != "recursive":
-                cmd.append(f"--strategy={strategy}")
-        case "git_stash":
-            action = args.get("action", "save")
-            cmd.extend(["stash", action])
-            match action:
-                case "save":
-                    if message := args.get("message"):
-                        cmd.extend(["-m", f'"{message}"'])
-                    if args.get("include_untracked"):
-                        cmd.append("--include-untracked")
-                case "pop" | "apply" | "drop":
-                    if stash_ref := args.get("stash_ref"):
-                        cmd.append(stash_ref)
-                case "show":
-                    if args.get("patch"):
-                        cmd.append("--patch")
-                    if stash_ref := args.get("stash_ref"):
-                        cmd.append(stash_ref)
-        case "git_rebase":
-            cmd.append("rebase")
-            if args.get("continue"):
-                cmd.append("--continue")
-            elif args.get("abort"):
-                cmd.append("--abort")
-            elif target := args.get("target"):
-                cmd.append(target)
-        case "git_reset":
-            cmd.append("reset")
-            if mode := args.get("mode"):
-                cmd.append(f"--{mode}")
-            else:
-                return "# Error: mode is required"
-            if target := args.get("target"):
-                cmd.append(target)
-        case "git_log":
-            cmd.append("log")
-            if ref := args.get("ref"):
-                cmd.append(ref)
-            if limit := args.get("limit"):
-                cmd.extend(["-n", str(limit)])
-            if args.get("oneline"):
-                cmd.append("--oneline")
-            if args.get("graph"):
-                cmd.append("--graph")
-        case _:
-            return f"# Unknown git command: {name}"
-
-    return " ".join(cmd)
+    try:
+        render = RENDERERS[name]
+    except (KeyError, TypeError):
+        return f"# Unknown git command: {name}"
+    return render(args)
+
+
+def parse_row(text: str) -> tuple[str | None, dict]:
+    """
+    Return the question (None if there is none) and tool call of one JSONL row.
+
+    A row is either a finetuning example, whose `answer` holds the call as a JSON string (or
+    an object), or a bare tool call; either way the call may name its arguments `parameters`,
+    as the model does, and they may themselves be a JSON string.
+    """
+    row = json.loads(text)
+    if not isinstance(row, dict):
+        raise ValueError("row is not a JSON object")
+    answer = row.get("answer", row)
+    if isinstance(answer, str):
+        answer = json.loads(answer)
+    if not isinstance(answer, dict) or "name" not in answer:
+        raise ValueError("row has no tool call")
+    arguments = answer.get("arguments", answer.get("parameters", {}))
+    if isinstance(arguments, str):
+        arguments = json.loads(arguments)
+    return row.get("question"), {"name": answer["name"], "arguments": arguments}
+
+
+def render_row(line: int, text: str, validate: bool = False) -> dict:
+    """Render one JSONL row into a result record, capturing any error instead of raising."""
+    question = tool_call = command = error = None
+    try:
+        question, tool_call = parse_row(text)
+        if validate and (errors := VALIDATOR.errors(tool_call)):
+            error = "; ".join(errors)
+        else:
+            command = render_git_command(tool_call)
+    except Exception as e:
+        error = str(e) or repr(e)
+    return {"line": line, "question": question, "tool_call": tool_call, "command": command, "error": error}
+
+
+def _render_chunk(chunk: list[tuple[int, str]], validate: bool = False) -> list[dict]:
+    return [render_row(line, text, validate) for line, text in chunk]
+
+
+def render_many(
+    lines: Iterable[str], workers: int = 0, chunk_size: int = DEFAULT_CHUNK_SIZE, validate: bool = False
+) -> Iterator[dict]:
+    """
+    Render JSONL rows lazily, yielding one record per non-blank line, in input order.
+
+    A row that cannot be parsed, validated (with `validate`) or rendered gets a record with
+    its `error` instead of stopping the others. With `workers`, chunks of `chunk_size` rows
+    are rendered in that many processes (see `map_chunks`).
+    """
+    rows = ((line, text) for line, text in enumerate(lines, start=1) if text.strip())
+    yield from map_chunks(partial(_render_chunk, validate=validate), rows, workers, chunk_size)
@@ -0,0 +1,165 @@
+import ast
+import json
+import re
+from collections.abc import Iterable
+
+from gitara.streaming import JsonObjectScanner
+from gitara.tools import TOOLS
+
+_FENCE = re.compile(r"```(?:json|JSON)?\s*(.*?)\s*```", re.DOTALL)
+_TAG = re.compile(r"<tool_call>\s*(.*?)\s*(?:</tool_call>|$)", re.DOTALL)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_INTEGER = re.compile(r"-?\d+")
+_NAME_KEYS = ("name", "tool", "tool_name", "function_name")
+_ARGUMENT_KEYS = ("arguments", "parameters", "args", "params", "input")
+_PROPERTIES = {tool["function"]["name"]: tool["function"]["parameters"]["properties"] for tool in TOOLS}
+
+
+class RepairError(ValueError):
+    pass
+
+
+def _load(text: str, repairs: list[str]):
+    """Parse the first JSON (or Python literal) value in `text`, noting how it had to be cleaned up."""
+    text = text.strip()
+    if (match := _TAG.search(text)) is not None:
+        repairs.append("tool_call_tag")
+        text = match.group(1)
+    if (match := _FENCE.search(text)) is not None:
+        repairs.append("code_fence")
+        text = match.group(1)
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    start = min((i for i in (text.find("{"), text.find("[")) if i >= 0), default=-1)
+    if start < 0:
+        raise RepairError(f"No JSON object in {text!r}")
+    scanner = JsonObjectScanner()
+    scanner.feed(text[start:])
+    candidate = text[start : start + scanner.end] if scanner.end is not None else text[start:]
+    if candidate != text:
+        repairs.append("surrounding_text")
+    try:
+        return json.loads(candidate)
+    except json.JSONDecodeError:
+        pass
+    without_commas = _TRAILING_COMMA.sub(r"\1", candidate)
+    if without_commas != candidate:
+        try:
+            value = json.loads(without_commas)
+            repairs.append("trailing_comma")
+            return value
+        except json.JSONDecodeError:
+            pass
+    try:
+        # Single quotes, True/False/None: the model wrote a Python dict.
+        value = ast.literal_eval(without_commas)
+        repairs.append("python_literal")
+        return value
+    except (ValueError, SyntaxError, MemoryError, RecursionError) as e:
+        raise RepairError(f"Cannot parse {candidate!r}") from e
+
+
+def repair_arguments(text: str | None, repairs: list[str]) -> dict:
+    """The arguments object in `text`, cleaned up like a whole call; empty arguments are {}."""
+    if text is None or not text.strip():
+        return {}
+    arguments = _load(text, repairs)
+    if isinstance(arguments, str):
+        repairs.append("stringified_arguments")
+        arguments = _load(arguments, repairs)
+    if not isinstance(arguments, dict):
+        raise RepairError(f"Arguments are not an object: {text!r}")
+    return arguments
+
+
+def _as_call(value, repairs: list[str]) -> dict:
+    if isinstance(value, list):
+        calls = [_as_call(item, repairs) for item in value]
+        if not calls or any(call != calls[0] for call in calls):
+            raise RepairError(f"Expected one tool call, got {len(calls)}")
+        repairs.append("single_item_list" if len(calls) == 1 else "duplicate_calls")
+        return calls[0]
+    if not isinstance(value, dict):
+        raise RepairError(f"Not a tool call: {value!r}")
+    if isinstance(value.get("function"), dict):
+        repairs.append("nested_function")
+        value = value["function"]
+    name_key = next((key for key in _NAME_KEYS if isinstance(value.get(key), str)), None)
+    if name_key is None:
+        raise RepairError(f"Tool call without a name: {value!r}")
+    if name_key != "name":
+        repairs.append("name_key")
+    arguments_key = next((key for key in _ARGUMENT_KEYS if key in value), None)
+    if arguments_key is None:
+        repairs.append("missing_arguments")
+        arguments = {}
+    else:
+        if arguments_key != "arguments":
+            repairs.append("parameters_key")
+        arguments = value[arguments_key]
+        if arguments is None:
+            arguments = {}
+        elif isinstance(arguments, str):
+            repairs.append("stringified_arguments")
+            arguments = repair_arguments(arguments, repairs)
+        elif not isinstance(arguments, dict):
+            raise RepairError(f"Arguments are not an object: {arguments!r}")
+    return {"name": value[name_key], "arguments": arguments}
+
+
+def _coerce(value, spec: dict):
+    """`value` converted to the schema's type if it is an unambiguous spelling of one, else unchanged."""
+    match spec["type"], value:
+        case "integer", str() if _INTEGER.fullmatch(value.strip()):
+            return int(value)
+        case "boolean", str() if value.strip().lower() in ("true", "false"):
+            return value.strip().lower() == "true"
+        case "array", str():
+            return [value]
+        case "string", int() | float() if not isinstance(value, bool):
+            return str(value)
+    return value
+
+
+def coerce_arguments(tool_call: dict, repairs: list[str]) -> dict:
+    """Convert arguments of the wrong type, such as "5" for an integer, to the type their schema gives."""
+    properties = _PROPERTIES.get(tool_call["name"])
+    if properties is None:
+        return tool_call
+    arguments = {}
+    for key, value in tool_call["arguments"].items():
+        if (spec := properties.get(key)) is not None and (coerced := _coerce(value, spec)) is not value:
+            repairs.append("coerced_type")
+            value = coerced
+        arguments[key] = value
+    return {"name": tool_call["name"], "arguments": arguments}
+
+
+def parse_message(tool_calls: Iterable[tuple[str | None, str | None]], content: str | None) -> tuple[dict, list[str]]:
+    """
+    Extract one tool call from a model's message, repairing what a small model commonly gets wrong.
+
+    `tool_calls` are the (name, arguments text) pairs of the message's native tool calls; if
+    there are none, the call is looked for in `content`, in a code fence, a <tool_call> tag or
+    surrounding prose. Trailing commas, Python literals, `parameters` instead of `arguments`,
+    arguments encoded as a string and arguments of the wrong type are fixed. Returns the call
+    and the kinds of repair it needed (empty for a well-formed call), or raises `RepairError`.
+    The result is not validated against the schema.
+    """
+    repairs: list[str] = []
+    calls = [(name, arguments) for name, arguments in tool_calls]
+    if calls:
+        parsed = [{"name": name, "arguments": repair_arguments(arguments, repairs)} for name, arguments in calls]
+        if any(call != parsed[0] for call in parsed) or not isinstance(parsed[0]["name"], str):
+            raise RepairError(f"Expected one tool call, got {len(parsed)}")
+        if len(parsed) > 1:
+            repairs.append("duplicate_calls")
+        tool_call = parsed[0]
+    elif content and content.strip():
+        repairs.append("content_fallback")
+        tool_call = _as_call(_load(content, repairs), repairs)
+    else:
+        raise RepairError("Neither a tool call nor content in the message")
+    return coerce_arguments(tool_call, repairs), repairs
@@ -0,0 +1,367 @@
+import argparse
+import hashlib
+import json
+import re
+import time
+from pathlib import Path
+
+from gitara.dataset import read_dataset
+from gitara.tools import TOOLS, normalize_tool_call
+
+DEFAULT_DATA = ("finetuning/synthetic-data/train.jsonl",)
+# Held out from the measurement that enables rules, to check that their precision carries over.
+EVAL_DATA = ("finetuning/synthetic-data/test.jsonl", "finetuning/data/test.jsonl")
+DEFAULT_MIN_PRECISION = 0.98
+DEFAULT_MIN_SUPPORT = 3
+STATS_PATH = Path(__file__).parent / "rules.json"
+
+# Entities a rule may capture. Branch names exclude the words that would make a phrasing ambiguous
+# ("switch to the previous branch", "delete this branch").
+_NOT_A_NAME = r"(?!(?:a|an|the|it|this|that|my|our|new|previous|last|current|other|branch|commit|tag|head)(?: |$))"
+BRANCH = _NOT_A_NAME + r"[\w][\w./-]*"
+REF = _NOT_A_NAME + r"[\w][\w./~^@{}-]*"
+STASH = r"stash@\{\d+\}"
+PATH = r"(?!\.$)[\w./-]*\.[\w-]+|[\w.-]+/[\w./-]*"
+
+_ARGUMENT_TYPES = {
+    tool["function"]["name"]: {
+        name: spec["type"] for name, spec in tool["function"]["parameters"]["properties"].items()
+    }
+    for tool in TOOLS
+}
+_PUNCTUATION = str.maketrans({"‐": "-", "‑": "-", "‒": "-", "–": "-", "—": "-", "‘": "'", "’": "'", "“": '"', "”": '"'})
+_GROUP = re.compile(r"\(\?P<\w+>")
+
+
+def normalize(question: str) -> str:
+    """Collapse whitespace, unify dashes and quotes and drop trailing punctuation; case is kept for captured names."""
+    return " ".join(question.translate(_PUNCTUATION).split()).rstrip(".!?")
+
+
+class Rule:
+    """
+    A phrasing that always means the same tool call.
+
+    `pattern` must match the whole (normalized, case-insensitive) question. Its named groups are
+    copied into the arguments, converted to the parameter's type in TOOLS (an `integer` is
+    parsed, an `array` gets the value as its only item), on top of the fixed `arguments`.
+    """
+
+    def __init__(self, name: str, pattern: str, tool: str, arguments: dict | None = None) -> None:
+        self.name = name
+        self.pattern = pattern
+        self.tool = tool
+        self.arguments = arguments or {}
+        self.regex = re.compile(pattern, re.IGNORECASE)
+        types = _ARGUMENT_TYPES[tool]
+        unknown = set(self.regex.groupindex) - set(types)
+        if unknown or set(self.arguments) - set(types):
+            raise ValueError(f"Rule {name!r} sets arguments that {tool} does not take: {sorted(unknown)}")
+        self._types = {group: types[group] for group in self.regex.groupindex}
+
+    def fingerprint(self) -> str:
+        """Hash of what the rule matches and answers; measured precision is only trusted for the same fingerprint."""
+        payload = json.dumps([self.pattern, self.tool, self.arguments], sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+    def tool_call(self, match: re.Match) -> dict:
+        arguments = dict(self.arguments)
+        for group, value in match.groupdict().items():
+            if value is None:
+                continue
+            match self._types[group]:
+                case "integer":
+                    arguments[group] = int(value)
+                case "array":
+                    arguments[group] = [value]
+                case _:
+                    arguments[group] = value
+        return {"name": self.tool, "arguments": arguments}
+
+    def apply(self, question: str) -> dict | None:
+        match = self.regex.fullmatch(normalize(question))
+        return self.tool_call(match) if match is not None else None
+
+
+RULES = [
+    Rule(
+        "status",
+        r"(?:git )?status"
+        r"|(?:(?:show|give|check|see|display)(?: me)? )?(?:a |the )?(?:quick |brief |simple |concise |current )?"
+        r"(?:git |repo |repository |branch )?status(?: overview)?(?:, nothing else| without diffs)?"
+        r"|what(?:'s| is) the (?:current )?(?:git |repo |repository |branch )?status",
+        "git_status",
+    ),
+    Rule(
+        "status_verbose",
+        r"(?:git )?status (?:--verbose|-v|with diffs(?: only)?)"
+        r"|(?:show|give|display)(?: me)? (?:a |the )?(?:detailed |verbose )?status (?:with|including) (?:detailed )?diffs",
+        "git_status",
+        {"verbose": True},
+    ),
+    Rule(
+        "status_ignored",
+        r"git status --ignored"
+        r"|(?:show|list|display)(?: me)?(?: all)?(?: the)? ignored files(?: in the (?:repo|repository)| only)?"
+        r"|(?:show|list|display) (?:the )?status including ignored files",
+        "git_status",
+        {"ignored": True},
+    ),
+    Rule(
+        "add_all",
+        r"git add (?:\.|-a|--all)"
+        r"|(?:stage|add) (?:all|everything|every (?:changed|modified) file|the (?:whole|entire) (?:repository|project))"
+        r"(?: changes| changed files| files| modified files)?"
+        r"(?: in the (?:repo|repository|folder|directory))?",
+        "git_add",
+        {"files": ["."]},
+    ),
+    Rule("add_path", rf"(?:git add|stage|add)(?: just| only)? (?:the )?(?P<files>{PATH})(?: file)?", "git_add"),
+    Rule(
+        "commit_message",
+        r"""(?:git )?commit (?:with (?:the )?message |-m )?["'](?P<message>[^"']+)["']""",
+        "git_commit",
+    ),
+    Rule(
+        "commit_amend",
+        r"git commit --amend|(?:just )?amend (?:the )?(?:last|previous) commit",
+        "git_commit",
+        {"amend": True},
+    ),
+    Rule(
+        "push",
+        r"(?:git )?push(?: (?:my |the )?(?:current |local )?(?:changes|commits|work|branch))?(?: to origin)?",
+        "git_push",
+    ),
+    Rule(
+        "force_push",
+        r"git push --force|force[ -]push (?:my |the )?(?:current )?(?:changes|work)",
+        "git_push",
+        {"force": True},
+    ),
+    Rule("pull", r"(?:git )?pull|(?:just )?pull the latest(?: changes)?(?: from origin)?", "git_pull"),
+    Rule(
+        "pull_rebase",
+        r"git pull --rebase|pull (?:with|and|using) rebase"
+        r"|(?:pull and rebase|pull|update) the current branch(?: using rebase)?",
+        "git_pull",
+        {"rebase": True},
+    ),
+    Rule(
+        "branch_list",
+        r"git branch|(?:list|show)(?: me)? (?:only )?(?:the |my |all )?(?:local )?branches(?: only)?",
+        "git_branch",
+        {"action": "list"},
+    ),
+    Rule(
+        "branch_list_all",
+        r"git branch (?:-a|--all)"
+        r"|(?:list|show) (?:all|every) branch(?:es)? including remotes?|(?:list|show) remote branches too",
+        "git_branch",
+        {"action": "list", "all": True},
+    ),
+    Rule(
+        "branch_delete",
+        rf"(?:delete|remove) (?:the )?(?:local )?branch (?:named |called )?(?P<branch_name>{BRANCH})",
+        "git_branch",
+        {"action": "delete"},
+    ),
+    Rule(
+        "branch_force_delete",
+        rf"force[ -](?:delete|remove) (?:the )?(?:local )?branch (?:named |called )?(?P<branch_name>{BRANCH})",
+        "git_branch",
+        {"action": "delete", "force": True},
+    ),
+    Rule(
+        "switch",
+        rf"(?:switch|change|move|jump|go) (?:over )?to (?:the )?(?:branch )?(?P<branch>{BRANCH})(?: branch)?",
+        "git_switch",
+    ),
+    Rule(
+        "switch_create",
+        rf"create (?:and switch to |(?:a )?(?:new )?branch (?=\S+ and switch))(?P<branch>{BRANCH})"
+        r"(?: and switch(?: to it)?)?",
+        "git_switch",
+        {"create": True},
+    ),
+    Rule(
+        "merge",
+        rf"merge (?:the )?(?:branch )?(?P<branch>{BRANCH})(?: branch)?"
+        r"(?: into (?:this|the current|my current|my) branch)?",
+        "git_merge",
+    ),
+    Rule("stash", r"(?:git )?stash(?: (?:my |all )?(?:changes|work))?", "git_stash", {"action": "save"}),
+    Rule(
+        "stash_list",
+        r"git stash list"
+        r"|(?:list|show)(?: all| my)?(?: the)?(?: current)? stash(?:es| entries| list)(?: currently stored)?",
+        "git_stash",
+        {"action": "list"},
+    ),
+    Rule(
+        "stash_clear",
+        r"git stash clear|clear (?:all )?(?:the )?stash(?:es)?(?: now)?",
+        "git_stash",
+        {"action": "clear"},
+    ),
+    Rule(
+        "stash_pop",
+        r"git stash pop|pop (?:the )?(?:latest |last |most recent )?stash",
+        "git_stash",
+        {"action": "pop"},
+    ),
+    Rule("stash_ref", rf"(?:git stash )?(?P<action>pop|apply|drop) (?P<stash_ref>{STASH})", "git_stash"),
+    Rule(
+        "rebase_abort",
+        r"git rebase --abort"
+        r"|(?:abort|cancel|stop) (?:the )?(?:current |ongoing |in-progress )?rebase(?: operation| in progress)?",
+        "git_rebase",
+        {"abort": True},
+    ),
+    Rule(
+        "rebase_continue",
+        r"git rebase --continue|continue (?:the )?rebase(?: now| after (?:fixing|resolving) (?:the )?conflicts)?",
+        "git_rebase",
+        {"continue": True},
+    ),
+    Rule(
+        "rebase_onto", rf"rebase (?:my branch |this branch |the current branch )?onto (?P<target>{REF})", "git_rebase"
+    ),
+    Rule("reset", r"(?:git reset --|(?=\w+ reset))(?P<mode>soft|mixed|hard)(?: reset(?: to head)?)?", "git_reset"),
+    Rule("reset_to", rf"(?P<mode>soft|mixed|hard) reset to (?:the )?(?:commit |tag )?(?P<target>{REF})", "git_reset"),
+    Rule("log", r"(?:git )?log|(?:show|display|view)(?: me)? the (?:default )?(?:commit )?(?:log|history)", "git_log"),
+    Rule(
+        "log_oneline",
+        r"(?:git )?log (?:--)?one-?line(?: (?:-n ?)?(?P<limit>\d+))?|(?:show |display )?(?:the |a )?one-?line log",
+        "git_log",
+        {"oneline": True},
+    ),
+    Rule("log_limit", r"(?:git log -n ?|(?:show|list)(?: me)? (?:the )?last )(?P<limit>\d+)(?: commits)?", "git_log"),
+    Rule("log_graph", r"(?:git )?log (?:--)?graph|show (?:the )?(?:commit |branch )?graph", "git_log", {"graph": True}),
+]
+
+
+class RuleSet:
+    """
+    The rules to answer from, tried in order and compiled into a single alternation.
+
+    A question that no rule matches costs one failed regex match, a few microseconds, before it
+    falls through to the cache and the model. `load` only enables rules whose precision was
+    measured on the training data (see `measure`) and is at least `min_precision`, over at
+    least `min_support` matched questions; a rule that changed since it was measured stays
+    disabled until it is measured again.
+    """
+
+    def __init__(self, rules) -> None:
+        self.rules = list(rules)
+        alternatives = (f"(?P<r{i}>{_GROUP.sub('(?:', rule.pattern)})" for i, rule in enumerate(self.rules))
+        self._combined = re.compile("|".join(alternatives), re.IGNORECASE) if self.rules else None
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    @classmethod
+    def from_stats(
+        cls,
+        stats: dict,
+        min_precision: float = DEFAULT_MIN_PRECISION,
+        min_support: int = DEFAULT_MIN_SUPPORT,
+        rules=RULES,
+    ) -> "RuleSet":
+        """Enable the `rules` whose measurements in `stats` (see `measure`) are current and good enough."""
+        enabled = []
+        for rule in rules:
+            measured = stats.get(rule.name)
+            if (
+                measured is not None
+                and measured["precision"] is not None
+                and measured["fingerprint"] == rule.fingerprint()
+                and measured["matched"] >= min_support
+                and measured["precision"] >= min_precision
+            ):
+                enabled.append(rule)
+        return cls(enabled)
+
+    @classmethod
+    def load(
+        cls,
+        min_precision: float = DEFAULT_MIN_PRECISION,
+        min_support: int = DEFAULT_MIN_SUPPORT,
+        path: str | Path | None = None,
+    ) -> "RuleSet":
+        """Enable the built-in rules according to the measurements shipped with gitara (or saved at `path`)."""
+        try:
+            stats = json.loads(Path(path or STATS_PATH).read_text())
+        except FileNotFoundError:
+            stats = {}
+        return cls.from_stats(stats, min_precision, min_support)
+
+    def match(self, question: str) -> tuple[Rule, dict] | None:
+        """Return the first rule matching `question` and its tool call, or None."""
+        if self._combined is None:
+            return None
+        text = normalize(question)
+        if (match := self._combined.fullmatch(text)) is None:
+            return None
+        rule = self.rules[int(match.lastgroup[1:])]  # type: ignore[index]
+        return rule, rule.tool_call(rule.regex.fullmatch(text))  # type: ignore[arg-type]
+
+
+def measure(rows, rules=RULES) -> dict:
+    """Count how often each rule matches a question and how often its answer equals the label."""
+    stats = {rule.name: {"fingerprint": rule.fingerprint(), "matched": 0, "correct": 0} for rule in rules}
+    for question, tool_call in rows:
+        expected = normalize_tool_call(tool_call)
+        for rule in rules:
+            if (answer := rule.apply(question)) is not None:
+                stats[rule.name]["matched"] += 1
+                stats[rule.name]["correct"] += normalize_tool_call(answer) == expected
+    for measured in stats.values():
+        measured["precision"] = measured["correct"] / measured["matched"] if measured["matched"] else None
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the precision of the rule-based front-end")
+    parser.add_argument("--data", type=str, nargs="+", default=list(DEFAULT_DATA), required=False)
+    parser.add_argument(
+        "--eval-data",
+        type=str,
+        nargs="+",
+        default=list(EVAL_DATA),
+        required=False,
+        help="Held-out data to report precision on, without using it to enable rules",
+    )
+    parser.add_argument("--min-precision", type=float, default=DEFAULT_MIN_PRECISION, required=False)
+    parser.add_argument("--min-support", type=int, default=DEFAULT_MIN_SUPPORT, required=False)
+    parser.add_argument("--write", action="store_true", help=f"Save the measurements to {STATS_PATH}")
+    args = parser.parse_args()
+
+    rows = [row for path in args.data for row in read_dataset(path)]
+    stats = measure(rows)
+    heldout = measure(row for path in args.eval_data for row in read_dataset(path))
+    print(f"{'':<20} {'measured':>18} {'held out':>18}")
+    for name, measured in stats.items():
+        enabled = (measured["precision"] or 0) >= args.min_precision and measured["matched"] >= args.min_support
+        columns = [
+            f"{m['correct']:>5}/{m['matched']:<5} {m['precision']:.3f}" if m["precision"] is not None else f"{'-':>18}"
+            for m in (measured, heldout[name])
+        ]
+        print(f"{name:<20} {columns[0]:>18} {columns[1]:>18} {'' if enabled else 'disabled'}")
+    if args.write:
+        STATS_PATH.write_text(json.dumps(stats, indent=2) + "\n")
+
+    ruleset = RuleSet.from_stats(stats, args.min_precision, args.min_support)
+    enabled_heldout = [heldout[rule.name] for rule in ruleset.rules]
+    matched = sum(m["matched"] for m in enabled_heldout)
+    correct = sum(m["correct"] for m in enabled_heldout)
+    print(
+        f"Held-out precision of the enabled rules: {correct}/{matched}"
+        + (f" ({correct / matched:.3f})" if matched else "")
+    )
+    start = time.perf_counter()
+    answered = sum(ruleset.match(question) is not None for question, _ in rows)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{len(ruleset)} rules enabled, answering {answered}/{len(rows)} questions in {1e6 * elapsed / len(rows):.1f}us each"
+    )
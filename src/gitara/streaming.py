@@ -0,0 +1,129 @@
+import json
+import time
+
+from openai.types.chat import ChatCompletionChunk
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+class JsonObjectScanner:
+    """
+    Incrementally scans JSON text for the end of its top-level object.
+
+    Only string, escape and bracket state is tracked, so each character is looked at once and
+    the end of the object is known as soon as its closing brace arrives, however much the
+    producer sends after it.
+    """
+
+    def __init__(self) -> None:
+        self.text = ""
+        self.end: int | None = None
+        self._open: list[str] = []
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk: str) -> bool:
+        """Append `chunk`; return True once the top-level object is complete (`text[:end]`)."""
+        if self.end is not None:
+            return True
+        start = len(self.text)
+        self.text += chunk
+        for i in range(start, len(self.text)):
+            c = self.text[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif c == "\\":
+                    self._escaped = True
+                elif c == '"':
+                    self._in_string = False
+            elif c == '"':
+                self._in_string = True
+            elif c in _CLOSERS:
+                self._open.append(_CLOSERS[c])
+            elif c in "}]" and self._open:
+                self._open.pop()
+                if not self._open:
+                    self.end = i + 1
+                    return True
+        return False
+
+    def value(self):
+        """The complete object, or None if it has not arrived yet or is not valid JSON."""
+        if self.end is None:
+            return None
+        try:
+            return json.loads(self.text[: self.end])
+        except json.JSONDecodeError:
+            return None
+
+    def partial(self):
+        """Best-effort parse of the text so far, with open strings, arrays and objects closed; None if impossible."""
+        if not self._open:
+            return self.value()
+        text = self.text + ('"' if self._in_string and not self._escaped else "")
+        text = text.rstrip().rstrip(",")
+        if text.endswith(":"):
+            text += "null"
+        try:
+            return json.loads(text + "".join(reversed(self._open)))
+        except json.JSONDecodeError:
+            # Typically a key without its value yet, or half a literal such as `tr`.
+            return None
+
+
+class ToolCallStream:
+    """
+    The state of a streamed chat completion, fed chunk by chunk until it holds one tool call.
+
+    `arguments` holds as much of the call's arguments as can be parsed so far, so a caller can
+    show the command forming. `ttft` (time to first token) and `time_to_call` (time until the
+    call was complete) are in seconds since the stream was created; the request was sent then.
+    """
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.name: str | None = None
+        self.arguments: dict = {}
+        self.ttft: float | None = None
+        self.time_to_call: float | None = None
+        self.chunks = 0
+        self.content = ""
+        self._scanner = JsonObjectScanner()
+
+    @property
+    def complete(self) -> bool:
+        return self.time_to_call is not None
+
+    @property
+    def arguments_text(self) -> str:
+        """The call's arguments as streamed, up to the end of the object once it is complete."""
+        return self._scanner.text[: self._scanner.end]
+
+    def tool_call(self) -> dict:
+        return {"name": self.name, "arguments": self.arguments}
+
+    def feed(self, chunk: ChatCompletionChunk) -> bool:
+        """Apply one chunk; return True once the tool call is complete."""
+        self.chunks += 1
+        if self.complete or not chunk.choices:
+            return self.complete
+        delta = chunk.choices[0].delta
+        if self.ttft is None and (delta.content or delta.tool_calls):
+            self.ttft = time.perf_counter() - self.started
+        if delta.content:
+            # Kept for a model that writes its call as text instead.
+            self.content += delta.content
+        for tool_call in delta.tool_calls or []:
+            # Only the first call is used, as in the non-streamed path.
+            if tool_call.index != 0 or tool_call.function is None:
+                continue
+            if tool_call.function.name:
+                self.name = tool_call.function.name
+            if tool_call.function.arguments:
+                done = self._scanner.feed(tool_call.function.arguments)
+                if isinstance(partial := self._scanner.partial(), dict):
+                    self.arguments = partial
+                if done and isinstance(self._scanner.value(), dict) and self.name:
+                    self.time_to_call = time.perf_counter() - self.started
+        return self.complete
@@ -0,0 +1,221 @@
+import argparse
+import json
+import re
+
+from gitara.dataset import read_dataset
+from gitara.renderer import render_git_command
+
+# Bump whenever the lexer changes, so cached templates from an older lexer are not reused.
+CANONICALIZER_VERSION = 1
+
+DEFAULT_DATA = "finetuning/synthetic-data/train.jsonl"
+
+# Slot kinds, tried in order at each position: the first pattern that matches a token wins.
+SLOT_PATTERNS = [
+    ("M", re.compile(r'"([^"]+)"|“([^”]+)”|\'([^\']+)\'')),
+    (
+        "M",
+        re.compile(
+            r"(?:^|(?<=commit )|(?<=message ))"
+            r"((?:feat|fix|chore|docs|refactor|test|style|perf|build|ci)(?:\([^)]*\))?!?: .+?)(?=,| and | \(|$)"
+        ),
+    ),
+    ("S", re.compile(r"(stash@\{\d+\})")),
+    ("R", re.compile(r"(HEAD(?:~\d+|\^+))")),
+    ("P", re.compile(r"((?:[\w.-]+/)*\.?[\w-]+\.[A-Za-z][\w]*)(?![\w/-])")),
+    ("B", re.compile(r"((?:[A-Za-z][\w.-]*/)+[\w.-]*\w)")),
+    (
+        "B",
+        re.compile(r"(v\d+(?:\.\d+)*|[0-9a-f]*\d[0-9a-f]*[a-f][0-9a-f]*|[0-9a-f]*[a-f][0-9a-f]*\d[0-9a-f]*)(?![\w.-])"),
+    ),
+    ("B", re.compile(r"([A-Za-z][\w.]*[-_][\w.-]*\w|main|master|develop|dev|trunk)(?![\w/-])")),
+    ("N", re.compile(r"(\d+)(?![\w.-])")),
+]
+# A slot may only start at the beginning of the question or after one of these characters.
+TOKEN_START = re.compile(r"(?:^|(?<=[\s(\[,:]))")
+PLACEHOLDER = re.compile(r"<([A-Z])(\d+)>")
+MIN_HEX_LENGTH = 6
+
+
+def _lex(question: str) -> tuple[str, dict[str, str]]:
+    """Replace entities in `question` with typed placeholders, returning the template text and the slots."""
+    parts: list[str] = []
+    slots: dict[str, str] = {}
+    placeholders: dict[str, str] = {}
+    counts: dict[str, int] = {}
+    pos = 0
+    literal_start = 0
+    while pos < len(question):
+        if not TOKEN_START.match(question, pos):
+            pos += 1
+            continue
+        for kind, pattern in SLOT_PATTERNS:
+            match = pattern.match(question, pos)
+            if match is None:
+                continue
+            value = next(group for group in match.groups() if group is not None)
+            if kind == "B" and value.isalnum() and not value.startswith("v") and len(value) < MIN_HEX_LENGTH:
+                # Short hex-looking words ("add", "bad", "a1") are far more likely to be prose than hashes.
+                if value not in ("main", "master", "develop", "dev", "trunk"):
+                    continue
+            if (placeholder := placeholders.get(value)) is None:
+                counts[kind] = counts.get(kind, 0) + 1
+                placeholder = placeholders[value] = f"<{kind}{counts[kind]}>"
+                slots[placeholder] = value
+            value_start, value_end = match.span(next(i for i, g in enumerate(match.groups(), 1) if g is not None))
+            parts.append(question[literal_start:value_start].lower())
+            parts.append(placeholder)
+            parts.append(question[value_end : match.end()].lower())
+            pos = literal_start = match.end()
+            break
+        else:
+            pos += 1
+    parts.append(question[literal_start:].lower())
+    return " ".join("".join(parts).split()), slots
+
+
+class QuestionTemplate:
+    """
+    A question with its entities (branch names, paths, stash refs, revisions, messages, counts)
+    replaced by typed placeholders such as `<B1>` or `<N1>`.
+
+    Two questions with the same `text` differ only in their slot values, so the tool call
+    answering one can be turned into the answer to the other: `lift` replaces slot values in a
+    tool call with placeholders and `fill` substitutes this template's values back in.
+    """
+
+    def __init__(self, text: str, slots: dict[str, str]) -> None:
+        self.text = text
+        self.slots = slots
+
+    def __repr__(self) -> str:
+        return f"QuestionTemplate({self.text!r}, {self.slots!r})"
+
+    def lift(self, tool_call: dict) -> dict | None:
+        """
+        Replace slot values in the tool call arguments with their placeholders.
+
+        Returns None unless every slot is used in the arguments: an entity the answer ignores
+        might matter for a different value (e.g. "push to origin" vs "push to upstream").
+        """
+        # Longest values first, so "feature-x" is not split by a slot for "x".
+        replacements = sorted(self.slots.items(), key=lambda item: -len(item[1]))
+        pattern = re.compile("|".join(rf"(?<![\w-]){re.escape(value)}(?![\w-])" for _, value in replacements))
+        by_value = {value: placeholder for placeholder, value in replacements}
+        used: set[str] = set()
+
+        def lift_value(value):
+            if isinstance(value, bool):
+                return value
+            if isinstance(value, int):
+                if (placeholder := by_value.get(str(value))) is not None:
+                    used.add(placeholder)
+                    return placeholder
+                return value
+            if isinstance(value, str):
+                if PLACEHOLDER.search(value) or (value.isdigit() and value in by_value):
+                    # Already ambiguous, or would be filled back in as an integer.
+                    raise ValueError(value)
+
+                def substitute(match: re.Match) -> str:
+                    used.add(by_value[match.group()])
+                    return by_value[match.group()]
+
+                return pattern.sub(substitute, value)
+            if isinstance(value, list):
+                return [lift_value(item) for item in value]
+            return value
+
+        arguments = tool_call.get("arguments", {})
+        if not self.slots or not isinstance(arguments, dict):
+            return None
+        try:
+            lifted = {key: lift_value(value) for key, value in arguments.items()}
+        except ValueError:
+            return None
+        if used != set(self.slots):
+            return None
+        return {"name": tool_call.get("name"), "arguments": lifted}
+
+    def fill(self, tool_call: dict) -> dict:
+        """Substitute this template's slot values into a lifted tool call."""
+
+        def fill_value(value):
+            if isinstance(value, str):
+                # `lift` only turns integer arguments into a bare count placeholder.
+                if (match := PLACEHOLDER.fullmatch(value)) and match.group(1) == "N" and value in self.slots:
+                    return int(self.slots[value])
+                return PLACEHOLDER.sub(lambda match: self.slots.get(match.group(), match.group()), value)
+            if isinstance(value, list):
+                return [fill_value(item) for item in value]
+            return value
+
+        arguments = {key: fill_value(value) for key, value in tool_call.get("arguments", {}).items()}
+        return {"name": tool_call.get("name"), "arguments": arguments}
+
+
+def canonicalize(question: str) -> QuestionTemplate | None:
+    """Lex `question` into a template, or return None if it has no entities worth lifting."""
+    if PLACEHOLDER.search(question):
+        return None
+    text, slots = _lex(question)
+    if not slots:
+        return None
+    return QuestionTemplate(text, slots)
+
+
+def evaluate(rows) -> dict:
+    """
+    Replay (question, tool call) pairs through a template cache, as the client would see them.
+
+    The first question of each template populates the cache; every later one is a hit whose
+    slot-filled answer is compared with the row's own tool call, both structurally and by the
+    rendered command (the labels are not consistent about spelling out default arguments).
+    """
+    store: dict[str, dict] = {}
+    exact: set[str] = set()
+    total = exact_hits = hits = correct = rendered_correct = 0
+    mismatches = []
+    for question, tool_call in rows:
+        total += 1
+        normalized = " ".join(question.split())
+        if normalized in exact:
+            exact_hits += 1
+            continue
+        exact.add(normalized)
+        template = canonicalize(question)
+        if template is None:
+            continue
+        if (cached := store.get(template.text)) is not None:
+            hits += 1
+            filled = template.fill(cached)
+            correct += filled == tool_call
+            if render_git_command(filled) == render_git_command(tool_call):
+                rendered_correct += 1
+            else:
+                mismatches.append({"question": question, "expected": tool_call, "filled": filled})
+        elif (lifted := template.lift(tool_call)) is not None:
+            store[template.text] = lifted
+    return {
+        "rows": total,
+        "exact_hits": exact_hits,
+        "template_hits": hits,
+        "hit_rate": (exact_hits + hits) / total if total else 0.0,
+        "template_accuracy": correct / hits if hits else 1.0,
+        "rendered_accuracy": rendered_correct / hits if hits else 1.0,
+        "templates": len(store),
+        "mismatches": mismatches,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure template cache hit rate and slot-fill accuracy")
+    parser.add_argument("--data", type=str, default=DEFAULT_DATA, required=False)
+    parser.add_argument("--show-mismatches", type=int, default=10, required=False)
+    args = parser.parse_args()
+
+    report = evaluate(read_dataset(args.data))
+    mismatches = report.pop("mismatches")
+    print(json.dumps(report, indent=2))
+    for mismatch in mismatches[: args.show_mismatches]:
+        print(json.dumps(mismatch))
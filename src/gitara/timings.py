@@ -0,0 +1,194 @@
+import argparse
+import json
+import math
+import time
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+PERCENTILES = (50, 90, 99)
+# Extra fields some backends add to a completion: llama.cpp's `timings`, in milliseconds.
+SERVER_TIMINGS = {"prompt_ms": "server_prefill", "predicted_ms": "server_decode"}
+
+_current: ContextVar["Timings | None"] = ContextVar("gitara_timings", default=None)
+_depth: ContextVar[int] = ContextVar("gitara_timings_depth", default=0)
+_DISABLED = nullcontext()
+
+
+def _percentile(values, q: float) -> float | None:
+    """Nearest-rank percentile, as in `gitara.evaluation`."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(math.ceil(q / 100 * len(ordered)), 1) - 1]
+
+
+class Timings:
+    """
+    The spans and token usage of one gitara call.
+
+    A span is a named, timed stage such as the HTTP request; spans opened inside another are
+    nested under it. `stages` sums the spans by name, which is what batch tooling aggregates.
+    """
+
+    def __init__(self, started: float | None = None) -> None:
+        self.started = time.perf_counter() if started is None else started
+        self.finished: float | None = None
+        self.spans: list[tuple[str, float, float, int]] = []
+        self.usage: Counter[str] = Counter()
+
+    def add(self, name: str, start: float, end: float, depth: int | None = None) -> None:
+        """Record a span measured elsewhere, by its `time.perf_counter()` bounds."""
+        self.spans.append((name, start, end, _depth.get() if depth is None else depth))
+
+    def stages(self) -> dict[str, float]:
+        """Milliseconds spent in each stage, summed over its spans."""
+        stages: dict[str, float] = {}
+        for name, start, end, _ in self.spans:
+            stages[name] = stages.get(name, 0.0) + (end - start) * 1000
+        return {name: round(ms, 3) for name, ms in stages.items()}
+
+    def to_dict(self) -> dict:
+        finished = self.finished if self.finished is not None else time.perf_counter()
+        return {
+            "total_ms": round((finished - self.started) * 1000, 3),
+            "stages": self.stages(),
+            "spans": [
+                {
+                    "name": name,
+                    "start_ms": round((start - self.started) * 1000, 3),
+                    "ms": round((end - start) * 1000, 3),
+                    "depth": depth,
+                }
+                for name, start, end, depth in sorted(self.spans, key=lambda span: (span[1], span[3]))
+            ],
+            "usage": dict(self.usage),
+        }
+
+    def format(self) -> list[str]:
+        """Human-readable lines: the spans in the order they started, indented by nesting, then the tokens."""
+        timings = self.to_dict()
+        width = max((2 * span["depth"] + len(span["name"]) for span in timings["spans"]), default=0)
+        lines = [f"Timings (total {timings['total_ms']:.1f} ms):"]
+        for span in timings["spans"]:
+            label = "  " * span["depth"] + span["name"]
+            lines.append(f"  {label:<{width}}  {span['ms']:9.2f} ms")
+        if usage := timings["usage"]:
+            lines.append("Tokens: " + ", ".join(f"{key.removesuffix('_tokens')} {n}" for key, n in usage.items()))
+        return lines
+
+
+class _Span:
+    __slots__ = ("timings", "name", "start", "token")
+
+    def __init__(self, timings: Timings, name: str) -> None:
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self) -> "_Span":
+        self.token = _depth.set(_depth.get() + 1)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        end = time.perf_counter()
+        _depth.reset(self.token)
+        self.timings.add(self.name, self.start, end)
+
+
+def span(name: str):
+    """
+    Time the enclosed block as stage `name` of the call being timed, if any.
+
+    Without `collect`, this is one context variable lookup and returns a shared no-op context.
+    """
+    if (timings := _current.get()) is None:
+        return _DISABLED
+    return _Span(timings, name)
+
+
+def add_span(name: str, start: float, end: float) -> None:
+    """Record a stage measured elsewhere, such as the time to the first streamed token."""
+    if (timings := _current.get()) is not None:
+        timings.add(name, start, end)
+
+
+def record_usage(usage: object | None, extra: dict | None = None) -> None:
+    """
+    Add a response's token `usage` to the call being timed, if any.
+
+    `extra` is the response's fields beyond the OpenAI schema; prefill and decode times that a
+    backend reports there (see `SERVER_TIMINGS`) are recorded as stages ending now.
+    """
+    if (timings := _current.get()) is None:
+        return
+    if usage is not None:
+        for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+            timings.usage[key] += getattr(usage, key, None) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        if cached := getattr(details, "cached_tokens", None):
+            timings.usage["cached_prompt_tokens"] += cached
+    server = (extra or {}).get("timings")
+    if isinstance(server, dict):
+        end = time.perf_counter()
+        for key, name in SERVER_TIMINGS.items():
+            if isinstance(ms := server.get(key), (int, float)):
+                timings.add(name, end - ms / 1000, end)
+
+
+@contextmanager
+def collect(started: float | None = None) -> Iterator[Timings]:
+    """Record the spans opened in this block, including in threads and tasks it starts with its context."""
+    timings = Timings(started)
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+        timings.finished = time.perf_counter()
+
+
+def summarize(records: Iterable[dict]) -> dict:
+    """
+    Aggregate the timings of many calls, as exported by `Timings.to_dict`, into percentiles per stage.
+
+    Records may also be batch results or exported lines that hold them under "timings".
+    """
+    stages: dict[str, list[float]] = {"total": []}
+    usage: Counter[str] = Counter()
+    calls = 0
+    for record in records:
+        timings = record.get("timings", record)
+        if not timings:
+            continue
+        calls += 1
+        stages["total"].append(timings["total_ms"])
+        for name, ms in timings["stages"].items():
+            stages.setdefault(name, []).append(ms)
+        usage.update(timings.get("usage", {}))
+    return {
+        "calls": calls,
+        "stages_ms": {
+            name: {
+                "count": len(values),
+                "mean": round(sum(values) / len(values), 3) if values else None,
+                **{f"p{q}": _percentile(values, q) for q in PERCENTILES},
+            }
+            for name, values in stages.items()
+        },
+        "usage": dict(usage),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-stage latency percentiles of exported gitara timings")
+    parser.add_argument("paths", nargs="+", help="JSONL files written with --timings-json or batch --timings")
+    args = parser.parse_args()
+
+    def read(paths):
+        for path in paths:
+            with open(path) as f:
+                yield from (json.loads(line) for line in f if line.strip())
+
+    print(json.dumps(summarize(read(args.paths)), indent=2))
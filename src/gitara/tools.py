@@ -0,0 +1,609 @@
+import argparse
+import json
+
+DEFAULT_TOOL_PROFILE = "full"
+
+TOOLS: list[dict] = [
+    {
+        "type": "function",
+        "function": {
+            "name": "git_status",
+            "description": "Check the current status of the repository (modified files, staged changes, branch info)",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "verbose": {
+                        "type": "boolean",
+                        "description": "Show detailed status including diffs",
+                        "default": False,
+                    },
+                    "ignored": {
+                        "type": "boolean",
+                        "description": "Show ignored files",
+                        "default": False,
+                    },
+                },
+                "required": [],
+                "additionalProperties": False,
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "git_add",
+            "description": "Stage files for commit",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "files": {
+                        "type": "array",
+                        "description": "List of file paths to stage (use ['.'] for all files)",
+                        "items": {"type": "string"},
+                        "minItems": 1,
+                    }
+                },
+                "required": ["files"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "git_commit",
+            "description": "Create a commit with staged changes",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "message": {
+                        "type": "string",
+                        "description": "Commit message describing the changes (required unless amend=true)",
+                        "minLength": 1,
+                    },
+                    "amend": {
+                        "type": "boolean",
+                        "description": "Amend the previous commit instead of creating new one",
+                        "default": False,
+                    },
+                },
+                "required": [],
+                "additionalProperties": False,
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "git_push",
+            "description": "Push commits to remote repository",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "remote": {
+                        "type": "string",
+                        "description": "Remote name",
+                        "default": "origin",
+                    },
+                    "branch": {
+                        "type": "string",
+                        "description": "Branch name (current branch if not specified)",
+                    },
+                    "force": {
+                        "type": "boolean",
+                        "description": "Force push (use with caution)",
+                        "default": False,
+                    },
+                    "set_upstream": {
+                        "type": "boolean",
+                        "description": "Set upstream tracking for the branch",
+                        "default": False,
+                    },
+                },
+                "required": [],
+                "additionalProperties": False,
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "git_pull",
+            "description": "Pull changes from remote repository",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "remote": {
+                        "type": "string",
+                        "description": "Remote name",
+                        "default": "origin",
+                    },
+                    "branch": {
+                        "type": "string",
+                        "description": "Branch name (current branch if not specified)",
+                    },
+                    "rebase": {
+                        "type": "boolean",
+                        "description": "Rebase instead of merge",
+                        "default": False,
+                    },
+                },
+                "required": [],
+                "additionalProperties": False,
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "git_branch",
+            "description": "List, or delete branches (use `git_switch` for branch creation)",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "action": {
+                        "type": "string",
+                        "description": "Action to perform",
+                        "enum": ["delete", "list"],
+                    },
+                    "branch_name": {
+                        "type": "string",
+                        "description": "Name of the branch (required for delete)",
+                    },
+                    "force": {
+                        "type": "boolean",
+                        "description": "Force delete even if not merged (only for delete action)",
+                        "default": False,
+                    },
+                    "all": {
+                        "type": "boolean",
+                        "description": "Show all branches including remotes (only for list action)",
+                        "default": False,
+                    },
+                },
+                "required": ["action"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "git_switch",
+            "description": "Switch to a different branch",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "branch": {
+                        "type": "string",
+                        "description": "Branch name to switch to (not needed if detach is true)",
+                    },
+                    "create": {
+                        "type": "boolean",
+                        "description": "Create new branch before switching",
+                        "default": False,
+                    },
+                    "detach": {
+                        "type": "boolean",
+                        "description": "Switch to a commit in detached HEAD state",
+                        "default": False,
+                    },
+                },
+                "required": [],
+                "additionalProperties": False,
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "git_restore",
+            "description": "Restore files in working tree and/or staging area",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "files": {
+                        "type": "array",
+                        "description": "List of file paths to restore",
+                        "items": {"type": "string"},
+                        "minItems": 1,
+                    },
+                    "source": {
+                        "type": "string",
+                        "description": "Restore source (e.g., HEAD, commit hash)",
+                        "default": "HEAD",
+                    },
+                    "restore_target": {
+                        "type": "string",
+                        "enum": ["worktree", "staged", "both"],
+                        "default": "worktree",
+                    },
+                },
+                "required": ["files"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "git_merge",
+            "description": "Merge branches together",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "branch": {
+                        "type": "string",
+                        "description": "Branch to merge into current branch",
+                    },
+                    "no_ff": {
+                        "type": "boolean",
+                        "description": "Always create a merge commit, even if fast-forward is possible",
+                        "default": False,
+                    },
+                    "ff_only": {
+                        "type": "boolean",
+                        "description": "Only allow fast-forward merges (fail if not possible)",
+                        "default": False,
+                    },
+                    "strategy": {
+                        "type": "string",
+                        "description": "Merge strategy to use",
+                        "enum": ["recursive", "resolve", "ours", "subtree"],
+                        "default": "recursive",
+                    },
+                },
+                "required": ["branch"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "git_stash",
+            "description": "Temporarily save uncommitted changes",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "action": {
+                        "type": "string",
+                        "description": "Stash operation",
+                        "enum": [
+                            "save",
+                            "pop",
+                            "apply",
+                            "list",
+                            "drop",
+                            "clear",
+                            "show",
+                        ],
+                    },
+                    "message": {
+                        "type": "string",
+                        "description": "Message for stash save (only for save action)",
+                    },
+                    "stash_ref": {
+                        "type": "string",
+                        "description": "Stash reference (e.g., 'stash@{0}', 'stash@{2}') for pop/apply/drop/show actions",
+                        "default": "stash@{0}",
+                    },
+                    "include_untracked": {
+                        "type": "boolean",
+                        "description": "Include untracked files in stash (only for save action)",
+                        "default": False,
+                    },
+                    "patch": {
+                        "type": "boolean",
+                        "description": "Show full patch/diff when using action=show",
+                        "default": False,
+                    },
+                },
+                "required": ["action"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "git_rebase",
+            "description": "Reapply commits on top of another base",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "target": {
+                        "type": "string",
+                        "description": "Target branch or commit to rebase onto (required unless continue or abort are true)",
+                    },
+                    "continue": {
+                        "type": "boolean",
+                        "description": "Continue after resolving conflicts",
+                        "default": False,
+                    },
+                    "abort": {
+                        "type": "boolean",
+                        "description": "Abort the rebase operation",
+                        "default": False,
+                    },
+                },
+                "required": [],
+                "additionalProperties": False,
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "git_reset",
+            "description": "Reset current HEAD to specified state",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "mode": {
+                        "type": "string",
+                        "description": "Reset mode",
+                        "enum": ["soft", "mixed", "hard"],
+                    },
+                    "target": {
+                        "type": "string",
+                        "description": "Commit hash or reference (e.g., HEAD~1)",
+                        "default": "HEAD",
+                    },
+                },
+                "required": ["mode"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "git_log",
+            "description": "View commit history",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "ref": {
+                        "type": "string",
+                        "description": "Branch, tag, or commit to show history for (default: current branch)",
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "Number of commits to show",
+                        "default": 10,
+                        "minimum": 1,
+                    },
+                    "oneline": {
+                        "type": "boolean",
+                        "description": "Condensed one-line format",
+                        "default": False,
+                    },
+                    "graph": {
+                        "type": "boolean",
+                        "description": "Show branch graph",
+                        "default": False,
+                    },
+                },
+                "required": [],
+                "additionalProperties": False,
+            },
+        },
+    },
+]
+
+DEFAULTS = {
+    tool["function"]["name"]: {
+        name: spec["default"]
+        for name, spec in tool["function"]["parameters"]["properties"].items()
+        if "default" in spec
+    }
+    for tool in TOOLS
+}
+
+
+def normalize_tool_call(tool_call: dict) -> dict:
+    """Drop arguments equal to their default in TOOLS, so that spelling out a default does not count as a mistake."""
+    name = tool_call.get("name")
+    defaults = DEFAULTS.get(name, {})
+    arguments = tool_call.get("arguments") or {}
+    return {
+        "name": name,
+        "arguments": {key: value for key, value in arguments.items() if key not in defaults or defaults[key] != value},
+    }
+
+
+# How each tool call is rendered as a git command, built into one function per tool by
+# `gitara.renderer`. A step is a literal word or one of:
+#   ("flag", key, word)                    `word` if the argument is truthy
+#   ("value", key, template[, options])    the argument formatted into `template` if truthy; options are
+#                                          "default" (if absent), "default_if" (use the default only if
+#                                          that argument is truthy) and "skip" (a value to leave out)
+#   ("list", key, default)                 the argument's items, or `default` if there are none
+#   ("quoted", key, flag)                  `flag` and the argument in double quotes, if truthy
+#   ("option", key, flag)                  `flag` and the argument as a string, if truthy
+#   ("either", key, if_true, if_false)     one word or the other depending on the argument
+#   ("first", steps)                       only the first of the flag or value `steps` that applies
+#   ("require", keys, error)               "# Error: <error>" unless one of `keys` is truthy
+#   ("case", key, default, cases, echo)    the steps for the argument's value (a tuple key matches any
+#                                          of its values); with `echo`, the value itself first
+COMMANDS: dict[str, list] = {
+    "git_status": ["status", ("flag", "verbose", "--verbose"), ("flag", "ignored", "--ignored")],
+    "git_add": ["add", ("list", "files", ["."])],
+    "git_commit": [
+        "commit",
+        ("require", ("message", "amend"), "message is required"),
+        ("flag", "amend", "--amend"),
+        ("quoted", "message", "-m"),
+    ],
+    "git_push": [
+        "push",
+        ("value", "remote", "{}", {"default": "origin", "default_if": "branch"}),
+        ("value", "branch", "{}"),
+        ("flag", "force", "--force"),
+        ("flag", "set_upstream", "--set-upstream"),
+    ],
+    "git_pull": [
+        "pull",
+        ("value", "remote", "{}", {"default": "origin", "default_if": "branch"}),
+        ("value", "branch", "{}"),
+        ("flag", "rebase", "--rebase"),
+    ],
+    "git_branch": [
+        "branch",
+        (
+            "case",
+            "action",
+            "list",
+            {
+                "list": [("flag", "all", "--all")],
+                "delete": [
+                    ("require", ("branch_name",), "branch name is required"),
+                    ("either", "force", "-D", "-d"),
+                    ("value", "branch_name", "{}"),
+                ],
+            },
+            False,
+        ),
+    ],
+    "git_switch": [
+        "switch",
+        ("first", [("flag", "create", "-c"), ("flag", "detach", "--detach")]),
+        ("value", "branch", "{}"),
+    ],
+    "git_restore": [
+        "restore",
+        ("value", "source", "--source={}"),
+        ("case", "restore_target", "worktree", {"staged": ["--staged"], "both": ["--staged", "--worktree"]}, False),
+        ("list", "files", None),
+    ],
+    "git_merge": [
+        "merge",
+        ("value", "branch", "{}"),
+        ("first", [("flag", "no_ff", "--no-ff"), ("flag", "ff_only", "--ff-only")]),
+        ("value", "strategy", "--strategy={}", {"skip": "recursive"}),
+    ],
+    "git_stash": [
+        "stash",
+        (
+            "case",
+            "action",
+            "save",
+            {
+                "save": [("quoted", "message", "-m"), ("flag", "include_untracked", "--include-untracked")],
+                ("pop", "apply", "drop"): [("value", "stash_ref", "{}")],
+                "show": [("flag", "patch", "--patch"), ("value", "stash_ref", "{}")],
+            },
+            True,
+        ),
+    ],
+    "git_rebase": [
+        "rebase",
+        ("first", [("flag", "continue", "--continue"), ("flag", "abort", "--abort"), ("value", "target", "{}")]),
+    ],
+    "git_reset": [
+        "reset",
+        ("require", ("mode",), "mode is required"),
+        ("value", "mode", "--{}"),
+        ("value", "target", "{}"),
+    ],
+    "git_log": [
+        "log",
+        ("value", "ref", "{}"),
+        ("option", "limit", "-n"),
+        ("flag", "oneline", "--oneline"),
+        ("flag", "graph", "--graph"),
+    ],
+}
+
+
+def _compact_schema(schema: dict, descriptions: bool) -> dict:
+    properties = {}
+    for name, spec in schema["properties"].items():
+        spec = {key: value for key, value in spec.items() if descriptions or key != "description"}
+        if spec.get("type") == "boolean" and spec.get("default") is False:
+            # False is what an omitted flag means anyway.
+            del spec["default"]
+        properties[name] = spec
+    compact = {"type": schema["type"], "properties": properties}
+    if schema.get("required"):
+        compact["required"] = schema["required"]
+    return compact
+
+
+def _profile(descriptions: bool) -> list[dict]:
+    return [
+        {
+            "type": tool["type"],
+            "function": {
+                "name": tool["function"]["name"],
+                "description": tool["function"]["description"],
+                "parameters": _compact_schema(tool["function"]["parameters"], descriptions),
+            },
+        }
+        for tool in TOOLS
+    ]
+
+
+# Variants of TOOLS that cost fewer prompt tokens. "compact" drops what the schema implies anyway
+# (`additionalProperties`, empty `required`, `"default": False`); "minimal" also drops the
+# parameter descriptions, keeping names, types, enums and meaningful defaults.
+TOOL_PROFILES: dict[str, list[dict]] = {
+    "full": TOOLS,
+    "compact": _profile(descriptions=True),
+    "minimal": _profile(descriptions=False),
+}
+
+
+def count_tokens(text: str, tokenizer_path: str) -> int:
+    """Count tokens with the model's `tokenizer.json` (needs the optional `tokenizers` package)."""
+    from tokenizers import Tokenizer
+
+    return len(Tokenizer.from_file(tokenizer_path).encode(text, add_special_tokens=False).ids)
+
+
+def profile_sizes(tokenizer_path: str | None = None) -> dict[str, dict]:
+    """Size of each profile's serialized schemas, in bytes and, with a tokenizer, in tokens."""
+    sizes = {}
+    for name, tools in TOOL_PROFILES.items():
+        text = json.dumps(tools)
+        sizes[name] = {
+            "bytes": len(text.encode()),
+            "tokens": count_tokens(text, tokenizer_path) if tokenizer_path else None,
+        }
+    return sizes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the size, latency and accuracy of the tool schema profiles")
+    parser.add_argument("action", choices=["sizes", "benchmark"])
+    parser.add_argument("--tokenizer", type=str, default=None, required=False, help="The model's tokenizer.json")
+    parser.add_argument("--data", type=str, default="finetuning/data/test.jsonl", required=False)
+    parser.add_argument("--model", type=str, default="gitara", required=False)
+    parser.add_argument("--port", type=int, default=11434, required=False)
+    args = parser.parse_args()
+
+    sizes = profile_sizes(args.tokenizer)
+    if args.action == "sizes":
+        for name, size in sizes.items():
+            print(json.dumps({"profile": name, **size}))
+    else:
+        from gitara.dataset import read_dataset
+        from gitara.evaluation import evaluate
+        from gitara.model_client import DistilLabsLLM
+
+        for name, size in sizes.items():
+            client = DistilLabsLLM(model_name=args.model, port=args.port, tool_profile=name)
+            # One request at a time, so that latency reflects prefill rather than queueing.
+            report = evaluate(client, read_dataset(args.data), concurrency=1)
+            print(
+                json.dumps(
+                    {
+                        "profile": name,
+                        **size,
+                        "accuracy": report["accuracy"],
+                        "latency_mean": report["latency"]["mean"],
+                        "latency_p50": report["latency"]["p50"],
+                    }
+                )
+            )
@@ -0,0 +1,150 @@
+import argparse
+import json
+import time
+from collections import Counter
+from collections.abc import Callable
+from typing import Any
+
+from gitara.dataset import read_dataset
+from gitara.tools import TOOLS, normalize_tool_call
+
+DEFAULT_DATA = "finetuning/synthetic-data/train.jsonl"
+DEFAULT_CALLS = 1_000_000
+
+# Exact types: bool is a subclass of int, but True is not a valid integer argument.
+_TYPES: dict[str, type[Any]] = {"string": str, "integer": int, "boolean": bool, "array": list, "object": dict}
+
+
+class ToolCallError(ValueError):
+    pass
+
+
+def _compile_value(path: str, spec: dict) -> Callable[[object], str | None]:
+    """Return a check for one value of schema `spec`, giving an error message or None."""
+    expected = _TYPES[spec["type"]]
+    enum = frozenset(spec["enum"]) if "enum" in spec else None
+    minimum = spec.get("minimum")
+    min_length = spec.get("minLength")
+    min_items = spec.get("minItems")
+    item = _compile_value(f"{path}[]", spec["items"]) if "items" in spec else None
+
+    def check(value) -> str | None:
+        if type(value) is not expected:
+            return f"{path} must be of type {spec['type']}, not {type(value).__name__}"
+        if enum is not None and value not in enum:
+            return f"{path} must be one of {sorted(enum)}, not {value!r}"
+        if minimum is not None and value < minimum:
+            return f"{path} must be at least {minimum}"
+        if min_length is not None and len(value) < min_length:
+            return f"{path} must not be shorter than {min_length}"
+        if min_items is not None and len(value) < min_items:
+            return f"{path} must have at least {min_items} items"
+        if item is not None:
+            for element in value:
+                if (error := item(element)) is not None:
+                    return error
+        return None
+
+    return check
+
+
+class ToolCallValidator:
+    """
+    Checks tool calls against the schemas in TOOLS, compiled once into plain Python checks.
+
+    Each tool's schema becomes its required and known parameter names plus one check per
+    parameter (type, enum, minimum, minLength, minItems and item checks), so validating a
+    call is a few set operations and one function call per argument rather than a walk over
+    the schema.
+    """
+
+    def __init__(self, tools: list[dict] = TOOLS) -> None:
+        self.tools: dict[str, tuple[frozenset, dict]] = {}
+        for tool in tools:
+            function = tool["function"]
+            parameters = function["parameters"]
+            checks = {key: _compile_value(key, spec) for key, spec in parameters["properties"].items()}
+            self.tools[function["name"]] = (frozenset(parameters.get("required", [])), checks)
+
+    def errors(self, tool_call) -> list[str]:
+        """Everything wrong with `tool_call`; empty if it is valid. Missing arguments count as no arguments."""
+        if type(tool_call) is not dict:
+            return ["tool call must be an object"]
+        name = tool_call.get("name")
+        if not isinstance(name, str) or (tool := self.tools.get(name)) is None:
+            return [f"unknown tool {name!r}"]
+        required, checks = tool
+        arguments = tool_call.get("arguments")
+        if arguments is None:
+            arguments = {}
+        elif type(arguments) is not dict:
+            return ["arguments must be an object"]
+        errors = [f"missing required argument {key!r}" for key in required - arguments.keys()]
+        for key, value in arguments.items():
+            if (check := checks.get(key)) is None:
+                errors.append(f"unknown argument {key!r}")
+            elif (error := check(value)) is not None:
+                errors.append(error)
+        return errors
+
+    def validate(self, tool_call) -> dict:
+        """Return `tool_call` if it is valid, or raise `ToolCallError` listing what is wrong with it."""
+        if errors := self.errors(tool_call):
+            raise ToolCallError(
+                f"Invalid {tool_call.get('name') if type(tool_call) is dict else ''} call: {'; '.join(errors)}"
+            )
+        return tool_call
+
+    def normalize(self, tool_call: dict) -> dict:
+        """Validate `tool_call` and drop the arguments equal to their default."""
+        return normalize_tool_call(self.validate(tool_call))
+
+
+VALIDATOR: ToolCallValidator = ToolCallValidator()
+
+
+def check_dataset(rows, validator: ToolCallValidator = VALIDATOR) -> dict:
+    """Validate every (question, tool call) row; count the invalid ones and their errors."""
+    rows = list(rows)
+    errors: Counter[str] = Counter()
+    invalid = []
+    for question, tool_call in rows:
+        if row_errors := validator.errors(tool_call):
+            errors.update(row_errors)
+            invalid.append({"question": question, "tool_call": tool_call, "errors": row_errors})
+    return {"rows": len(rows), "invalid": len(invalid), "errors": dict(errors.most_common()), "examples": invalid[:10]}
+
+
+def benchmark(tool_calls: list[dict], calls: int = DEFAULT_CALLS, validator: ToolCallValidator = VALIDATOR) -> dict:
+    """Time validating and normalizing `calls` tool calls, cycling through `tool_calls`."""
+    repeats = -(-calls // len(tool_calls))
+    sample = (tool_calls * repeats)[:calls]
+    start = time.perf_counter()
+    for tool_call in sample:
+        validator.errors(tool_call)
+    validate_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for tool_call in sample:
+        validator.normalize(tool_call)
+    normalize_seconds = time.perf_counter() - start
+    return {
+        "calls": calls,
+        "validate_seconds": round(validate_seconds, 3),
+        "normalize_seconds": round(normalize_seconds, 3),
+        "validate_us": round(validate_seconds / calls * 1e6, 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate a dataset's tool calls against TOOLS, or time validation")
+    parser.add_argument("action", choices=["check", "benchmark"])
+    parser.add_argument("--data", type=str, nargs="+", default=[DEFAULT_DATA], required=False)
+    parser.add_argument("--calls", type=int, default=DEFAULT_CALLS, required=False)
+    args = parser.parse_args()
+
+    rows = [row for path in args.data for row in read_dataset(path)]
+    if args.action == "check":
+        report = check_dataset(rows)
+        print(json.dumps(report, indent=2))
+        raise SystemExit(1 if report["invalid"] else 0)
+    print(json.dumps(benchmark([tool_call for _, tool_call in rows], args.calls)))
@@ -0,0 +1,257 @@
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+QUESTION_RE = re.compile(r".*<question>(.*?)</question>\s*$", re.DOTALL)
+
+
+class StubBackend:
+    """A minimal OpenAI-compatible chat completions server for tests.
+
+    Answers are looked up by the question extracted from the last user message; unknown
+    questions get `default` and questions in `errors` get a 400 response. Every received
+    payload is recorded in `requests`. Streamed requests get the call's arguments a few
+    characters per chunk, followed by `trailing` whitespace chunks, `chunk_delay` apart, like a
+    model that keeps generating after the call is complete. Requests with `tool_choice="none"`,
+    as sent with constrained decoding, get the call as a {"name", "parameters"} object in the
+    message content. While `failing` is set, every request, health checks included, gets a 500.
+
+    Like Ollama, the model is loaded on the first request, which takes `load_delay`, and unloaded
+    once it has been idle for the request's `keep_alive` seconds, if it sent one. With
+    `native_api`, Ollama's /api/generate (loading or, with keep_alive 0, unloading the model)
+    and /api/ps are served too; their payloads are recorded in `native_requests`.
+    """
+
+    def __init__(
+        self,
+        answers: dict[str, dict] | None = None,
+        default: dict | None = None,
+        delay: float = 0.0,
+        errors: set[str] | None = None,
+        trailing: int = 0,
+        chunk_delay: float = 0.0,
+        load_delay: float = 0.0,
+        native_api: bool = True,
+    ):
+        self.answers = answers or {}
+        self.default = default or {"name": "git_status", "arguments": {}}
+        self.delay = delay
+        self.errors = errors or set()
+        self.trailing = trailing
+        self.chunk_delay = chunk_delay
+        self.failing = False
+        self.requests: list[dict] = []
+        self.load_delay = load_delay
+        self.native_api = native_api
+        self.native_requests: list[dict] = []
+        self.loaded = False
+        self.loads = 0
+        self.unloads = 0
+        self.expires_at: float | None = None
+        self._load_lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    def start(self) -> "StubBackend":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def ensure_loaded(self, keep_alive=None) -> float:
+        """Load the model unless it is loaded, and restart its keep-alive; return the time spent loading."""
+        with self._load_lock:
+            if self.expires_at is not None and time.monotonic() >= self.expires_at:
+                self.loaded = False
+            loading = 0.0
+            if not self.loaded:
+                time.sleep(self.load_delay)
+                self.loaded = True
+                self.loads += 1
+                loading = self.load_delay
+            if isinstance(keep_alive, int | float) and keep_alive >= 0:
+                self.expires_at = time.monotonic() + keep_alive
+            elif keep_alive is not None:
+                self.expires_at = None
+            return loading
+
+    def unload(self) -> None:
+        with self._load_lock:
+            if self.loaded:
+                self.loaded = False
+                self.unloads += 1
+
+    def generate(self, payload: dict) -> dict:
+        if payload.get("keep_alive") == 0:
+            self.unload()
+            return {"model": payload["model"], "response": "", "done": True, "done_reason": "unload"}
+        loading = self.ensure_loaded(payload.get("keep_alive"))
+        return {
+            "model": payload["model"],
+            "response": "",
+            "done": True,
+            "done_reason": "load",
+            "load_duration": int(loading * 1e9),
+        }
+
+    def question_for(self, payload: dict) -> str:
+        content = payload["messages"][-1]["content"]
+        match = QUESTION_RE.search(content)
+        return match.group(1) if match else content
+
+    def answer_for(self, payload: dict) -> dict:
+        return self.answers.get(self.question_for(payload), self.default)
+
+    def completion(self, payload: dict) -> dict:
+        answer = self.answer_for(payload)
+        message: dict[str, object]
+        if payload.get("tool_choice") == "none":
+            content = json.dumps({"name": answer["name"], "parameters": answer["arguments"]})
+            message = {"role": "assistant", "content": content}
+            finish_reason = "stop"
+        else:
+            message = {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [
+                    {
+                        "id": "call_0",
+                        "type": "function",
+                        "function": {"name": answer["name"], "arguments": json.dumps(answer["arguments"])},
+                    }
+                ],
+            }
+            finish_reason = "tool_calls"
+        return {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "stub"),
+            "choices": [{"index": 0, "finish_reason": finish_reason, "message": message}],
+            "usage": {"prompt_tokens": 100, "completion_tokens": 10, "total_tokens": 110},
+        }
+
+    def chunks(self, payload: dict):
+        answer = self.answer_for(payload)
+        arguments = json.dumps(answer["arguments"])
+
+        def chunk(delta: dict, finish_reason: str | None = None) -> dict:
+            return {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": payload.get("model", "stub"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+
+        def tool_call_delta(function: dict) -> dict:
+            return {"tool_calls": [{"index": 0, "id": "call_0", "type": "function", "function": function}]}
+
+        yield chunk({"role": "assistant", "content": None})
+        yield chunk(tool_call_delta({"name": answer["name"], "arguments": ""}))
+        for i in range(0, len(arguments), 4):
+            yield chunk(tool_call_delta({"arguments": arguments[i : i + 4]}))
+        for _ in range(self.trailing):
+            yield chunk({"content": " "})
+        yield chunk({}, finish_reason="tool_calls")
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        backend = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, body: dict) -> None:
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if backend.failing:
+                    self._send_json(500, {"error": {"message": "stub failure", "type": "server_error"}})
+                    return
+                if self.path.startswith("/api/"):
+                    if not backend.native_api or self.path != "/api/ps":
+                        self._send_json(404, {"error": "not found"})
+                        return
+                    models = [{"name": "gitara", "size": 2_000_000, "size_vram": 1_000_000}] if backend.loaded else []
+                    self._send_json(200, {"models": models})
+                    return
+                self._send_json(200, {"object": "list", "data": [{"id": "stub", "object": "model"}]})
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if self.path.startswith("/api/"):
+                    backend.native_requests.append(payload)
+                    if not backend.native_api or self.path != "/api/generate":
+                        self._send_json(404, {"error": "not found"})
+                        return
+                    self._send_json(200, backend.generate(payload))
+                    return
+                backend.requests.append(payload)
+                if backend.failing:
+                    self._send_json(500, {"error": {"message": "stub failure", "type": "server_error"}})
+                    return
+                backend.ensure_loaded(payload.get("keep_alive"))
+                if backend.delay:
+                    time.sleep(backend.delay)
+                if backend.question_for(payload) in backend.errors:
+                    self._send_json(400, {"error": {"message": "stub error", "type": "invalid_request_error"}})
+                    return
+                if payload.get("stream"):
+                    self._send_stream(payload)
+                    return
+                self._send_json(200, backend.completion(payload))
+
+            def _send_stream(self, payload: dict) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                try:
+                    for chunk in backend.chunks(payload):
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                        self.wfile.flush()
+                        time.sleep(backend.chunk_delay)
+                    self.wfile.write(b"data: [DONE]\n\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client stopped reading early.
+                    pass
+
+        return Handler
+
+
+@pytest.fixture
+def stub_backend():
+    backends: list[StubBackend] = []
+
+    def start(**kwargs) -> StubBackend:
+        backend = StubBackend(**kwargs).start()
+        backends.append(backend)
+        return backend
+
+    yield start
+    for backend in backends:
+        backend.stop()
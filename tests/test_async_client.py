@@ -0,0 +1,63 @@
+import asyncio
+import time
+
+import pytest
+
+from gitara.cache import ResponseCache
+from gitara.model_client import AsyncDistilLabsLLM, DistilLabsLLM
+
+PUSH = {"name": "git_push", "arguments": {"branch": "feature-x"}}
+
+
+def test_invoke_matches_sync_client(stub_backend):
+    backend = stub_backend(answers={"push feature-x": PUSH})
+
+    async def run():
+        async with AsyncDistilLabsLLM(model_name="gitara", port=backend.port) as client:
+            return await client.invoke("push feature-x")
+
+    assert asyncio.run(run()) == DistilLabsLLM(model_name="gitara", port=backend.port).invoke("push feature-x")
+    assert backend.requests[0] == backend.requests[1]
+
+
+def test_invoke_many_limits_in_flight(stub_backend):
+    backend = stub_backend(answers={"push feature-x": PUSH}, delay=0.1)
+    questions = ["push feature-x" if i % 2 else "status" for i in range(8)]
+
+    async def run():
+        # Not coalesced, so that all eight reach the backend.
+        client = AsyncDistilLabsLLM(model_name="gitara", port=backend.port, max_in_flight=4, coalesce=False)
+        async with client:
+            return await client.invoke_many(questions)
+
+    start = time.perf_counter()
+    results = asyncio.run(run())
+    elapsed = time.perf_counter() - start
+
+    assert results == [PUSH if i % 2 else {"name": "git_status", "arguments": {}} for i in range(8)]
+    # Four at a time takes two rounds of 0.1s; one at a time would take 0.8s.
+    assert 0.2 <= elapsed < 0.6
+
+
+def test_invoke_timeout(stub_backend):
+    backend = stub_backend(delay=0.5)
+
+    async def run():
+        async with AsyncDistilLabsLLM(model_name="gitara", port=backend.port, timeout=0.1) as client:
+            await client.invoke("status")
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(run())
+
+
+def test_invoke_many_return_exceptions(tmp_path, stub_backend):
+    backend = stub_backend(errors={"broken"})
+
+    async def run():
+        cache = ResponseCache(tmp_path / "cache.sqlite3")
+        async with AsyncDistilLabsLLM(model_name="gitara", port=backend.port, cache=cache) as client:
+            return await client.invoke_many(["status", "broken", "status"], return_exceptions=True)
+
+    ok, failed, again = asyncio.run(run())
+    assert ok == again == {"name": "git_status", "arguments": {}}
+    assert isinstance(failed, Exception)
@@ -0,0 +1,55 @@
+import io
+import json
+import time
+
+from click.testing import CliRunner
+
+from gitara import cli
+from gitara.batch import translate_many
+from gitara.model_client import DistilLabsLLM
+
+PUSH = {"name": "git_push", "arguments": {"branch": "feature-x"}}
+
+
+def test_translate_many_preserves_order(stub_backend):
+    backend = stub_backend(answers={"push feature-x": PUSH}, delay=0.05)
+    client = DistilLabsLLM(model_name="gitara", port=backend.port)
+    queries = ["push feature-x" if i % 2 else "status" for i in range(16)]
+
+    start = time.perf_counter()
+    records = list(translate_many(client, queries, concurrency=8))
+    elapsed = time.perf_counter() - start
+
+    assert [record["query"] for record in records] == queries
+    assert records[1]["command"] == "git push origin feature-x"
+    assert records[0]["tool_call"] == {"name": "git_status", "arguments": {}}
+    assert all(record["error"] is None for record in records)
+    assert elapsed < 16 * 0.05 / 2
+
+
+def test_translate_many_survives_failures(stub_backend):
+    backend = stub_backend(errors={"broken"})
+    client = DistilLabsLLM(model_name="gitara", port=backend.port)
+
+    records = list(translate_many(client, ["status", "broken", "show status"], concurrency=2, ordered=False))
+
+    assert sorted(record["query"] for record in records) == ["broken", "show status", "status"]
+    [failed] = [record for record in records if record["error"] is not None]
+    assert failed["query"] == "broken"
+    assert failed["command"] is None
+
+
+def test_cli_batch_from_stdin(stub_backend, monkeypatch, tmp_path):
+    backend = stub_backend(answers={"push feature-x": PUSH}, errors={"broken"})
+    monkeypatch.setattr(cli, "PORT", backend.port)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+
+    result = CliRunner().invoke(cli.main, ["--batch", "-"], input="push feature-x\n\nbroken\nstatus\n")
+
+    records = [json.loads(line) for line in io.StringIO(result.stdout)]
+    assert [record["command"] for record in records] == ["git push origin feature-x", None, "git status"]
+    assert result.exit_code == 1
+
+
+def test_cli_requires_query_or_batch():
+    assert CliRunner().invoke(cli.main, []).exit_code == 2
@@ -0,0 +1,62 @@
+import time
+
+from gitara.cache import ResponseCache
+from gitara.model_client import DistilLabsLLM
+
+PUSH = {"name": "git_push", "arguments": {"branch": "feature-x"}}
+
+
+def test_get_put_roundtrip(tmp_path):
+    cache = ResponseCache(tmp_path / "cache.sqlite3")
+    assert cache.get("ns", "push feature-x") is None
+    cache.put("ns", "push feature-x", PUSH)
+    assert cache.get("ns", "push feature-x") == PUSH
+    assert cache.get("ns", "  push   feature-x ") == PUSH
+    assert cache.get("other-ns", "push feature-x") is None
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+def test_persists_across_instances(tmp_path):
+    ResponseCache(tmp_path / "cache.sqlite3").put("ns", "q", PUSH)
+    assert ResponseCache(tmp_path / "cache.sqlite3").get("ns", "q") == PUSH
+
+
+def test_ttl_expiry(tmp_path):
+    cache = ResponseCache(tmp_path / "cache.sqlite3", ttl=0.05)
+    cache.put("ns", "q", PUSH)
+    time.sleep(0.1)
+    assert cache.get("ns", "q") is None
+    assert len(cache) == 0
+
+
+def test_lru_eviction(tmp_path):
+    cache = ResponseCache(tmp_path / "cache.sqlite3", max_entries=2)
+    cache.put("ns", "a", PUSH)
+    cache.put("ns", "b", PUSH)
+    cache.get("ns", "a")
+    cache.put("ns", "c", PUSH)
+    assert len(cache) == 2
+    assert cache.get("ns", "a") == PUSH
+    assert cache.get("ns", "b") is None
+    assert cache.get("ns", "c") == PUSH
+
+
+def test_client_uses_cache(tmp_path, stub_backend):
+    backend = stub_backend(answers={"push feature-x": PUSH})
+    cache = ResponseCache(tmp_path / "cache.sqlite3")
+    client = DistilLabsLLM(model_name="gitara", port=backend.port, cache=cache)
+
+    assert client.invoke("push feature-x") == PUSH
+    assert client.invoke("push feature-x") == PUSH
+    assert len(backend.requests) == 1
+
+
+def test_schema_change_invalidates(tmp_path, stub_backend, monkeypatch):
+    backend = stub_backend(answers={"push feature-x": PUSH})
+    cache = ResponseCache(tmp_path / "cache.sqlite3")
+    DistilLabsLLM(model_name="gitara", port=backend.port, cache=cache).invoke("push feature-x")
+
+    monkeypatch.setattr(DistilLabsLLM, "get_prompt", lambda self, question: [{"role": "user", "content": question}])
+    client = DistilLabsLLM(model_name="gitara", port=backend.port, cache=cache)
+    client.invoke("push feature-x")
+    assert len(backend.requests) == 2
@@ -0,0 +1,137 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from gitara.batch import translate_many
+from gitara.coalescing import AsyncSingleFlight, SingleFlight
+from gitara.model_client import AsyncDistilLabsLLM, DistilLabsLLM
+
+STATUS = {"name": "git_status", "arguments": {}}
+
+
+def test_single_flight_shares_result_and_error():
+    flight = SingleFlight()
+    started = threading.Event()
+    calls = []
+
+    def slow(value):
+        calls.append(value)
+        started.set()
+        time.sleep(0.1)
+        if isinstance(value, Exception):
+            raise value
+        return {"value": value}
+
+    with ThreadPoolExecutor(4) as pool:
+        leader = pool.submit(flight.do, "a", lambda: slow(1))
+        started.wait()
+        followers = [pool.submit(flight.do, "a", lambda: slow(2)) for _ in range(3)]
+        results = [future.result() for future in [leader, *followers]]
+    assert results == [{"value": 1}] * 4
+    assert results[1] is not results[0]
+    assert calls == [1]
+
+    started.clear()
+    error = ValueError("backend down")
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(flight.do, "a", lambda: slow(error))
+        started.wait()
+        follower = pool.submit(flight.do, "a", lambda: slow(3))
+        for future in (leader, follower):
+            with pytest.raises(ValueError, match="backend down"):
+                future.result()
+    assert flight.stats() == {"requests": 6, "coalesced": 4, "coalesced_rate": 0.6667, "in_flight": 0}
+
+
+def test_concurrent_identical_invokes_share_one_request(stub_backend):
+    backend = stub_backend(delay=0.2)
+    client = DistilLabsLLM(model_name="gitara", port=backend.port)
+    questions = ["show status", "show  status ", "show status", "something else"]
+    with ThreadPoolExecutor(len(questions)) as pool:
+        results = list(pool.map(client.invoke, questions))
+    assert results == [STATUS] * 4
+    assert len(backend.requests) == 2
+    assert client.coalescer.stats()["coalesced"] == 2
+
+
+def test_coalescing_can_be_turned_off(stub_backend):
+    backend = stub_backend(delay=0.1)
+    client = DistilLabsLLM(model_name="gitara", port=backend.port, coalesce=False)
+    with ThreadPoolExecutor(3) as pool:
+        assert list(pool.map(client.invoke, ["show status"] * 3)) == [STATUS] * 3
+    assert len(backend.requests) == 3
+    assert client.coalescer.stats() == {"requests": 0, "coalesced": 0, "coalesced_rate": None, "in_flight": 0}
+
+
+def test_batch_load_follows_duplication(stub_backend):
+    backend = stub_backend(delay=0.1)
+    client = DistilLabsLLM(model_name="gitara", port=backend.port)
+    records = list(translate_many(client, ["status"] * 4 + ["log"] * 4, concurrency=8))
+    assert all(record["error"] is None for record in records)
+    assert len(backend.requests) == 2
+
+
+def test_errors_reach_every_waiter(stub_backend):
+    backend = stub_backend(errors={"broken"}, delay=0.1)
+    client = DistilLabsLLM(model_name="gitara", port=backend.port, max_requeries=0)
+    with ThreadPoolExecutor(3) as pool:
+        futures = [pool.submit(client.invoke, "broken") for _ in range(3)]
+        errors = [future.exception() for future in futures]
+    assert all(error is not None for error in errors)
+    assert (client.coalescer.calls, client.coalescer.coalesced) == (1, 2)
+
+
+def test_async_invokes_share_one_request(stub_backend):
+    backend = stub_backend(delay=0.2)
+
+    async def run():
+        async with AsyncDistilLabsLLM(model_name="gitara", port=backend.port) as client:
+            results = await client.invoke_many(["status"] * 5)
+            return results, client.coalescer.stats()
+
+    results, stats = asyncio.run(run())
+    assert results == [STATUS] * 5
+    assert len(backend.requests) == 1
+    assert stats == {"requests": 5, "coalesced": 4, "coalesced_rate": 0.8, "in_flight": 0}
+
+
+def test_async_waiter_timeout_leaves_the_call_running():
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def slow():
+        calls.append(1)
+        await asyncio.sleep(0.2)
+        return "done"
+
+    async def run():
+        impatient = asyncio.create_task(asyncio.wait_for(flight.do("a", slow), 0.05))
+        await asyncio.sleep(0)
+        patient = asyncio.create_task(flight.do("a", slow))
+        with pytest.raises(TimeoutError):
+            await impatient
+        return await patient
+
+    assert asyncio.run(run()) == "done"
+    assert calls == [1]
+
+
+def test_async_call_is_cancelled_with_its_last_waiter():
+    flight = AsyncSingleFlight()
+    finished = []
+
+    async def slow():
+        await asyncio.sleep(0.2)
+        finished.append(1)
+
+    async def run():
+        with pytest.raises(TimeoutError):
+            await asyncio.wait_for(flight.do("a", slow), 0.05)
+        await asyncio.sleep(0.3)
+
+    asyncio.run(run())
+    assert finished == []
+    assert flight.stats()["in_flight"] == 0
@@ -0,0 +1,167 @@
+import os
+import sys
+import tempfile
+import threading
+
+import pytest
+from click.testing import CliRunner
+
+from gitara import cli, launcher
+from gitara.cache import ResponseCache
+from gitara.daemon import DaemonServer
+
+PUSH = {"name": "git_push", "arguments": {"branch": "feature-x"}}
+
+
+@pytest.fixture
+def socket_path(monkeypatch):
+    # Unix socket paths are limited to ~100 bytes, which pytest's tmp_path can exceed.
+    with tempfile.TemporaryDirectory(dir="/tmp") as directory:
+        path = os.path.join(directory, "gitara.sock")
+        monkeypatch.setenv("GITARA_SOCKET", path)
+        yield path
+
+
+@pytest.fixture
+def daemon_server(socket_path, stub_backend, tmp_path):
+    backend = stub_backend(answers={"push feature-x": PUSH})
+    server = DaemonServer(socket_path, model_name="gitara", port=backend.port, cache=ResponseCache(tmp_path / "c"))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, backend
+    server.shutdown()
+    server.server_close()
+
+
+def test_parse_query_args(monkeypatch):
+    monkeypatch.delenv("GITARA_ENDPOINTS", raising=False)
+    monkeypatch.delenv("GITARA_KEEP_ALIVE", raising=False)
+    assert launcher.parse_query_args(["push feature-x", "--show-json"]) == {
+        "op": "invoke",
+        "query": "push feature-x",
+        "no_cache": False,
+        "show_json": True,
+        "settings": {"endpoints": [], "keep_alive": None},
+    }
+    assert launcher.parse_query_args(["--batch", "-"]) is None
+    assert launcher.parse_query_args(["daemon"]) is None
+    assert launcher.parse_query_args(["render"]) is None
+    assert launcher.parse_query_args(["a", "b"]) is None
+    assert launcher.parse_query_args([]) is None
+
+
+def test_launcher_uses_daemon(daemon_server, monkeypatch, capsys):
+    server, backend = daemon_server
+    monkeypatch.setattr(sys, "argv", ["gitara", "push feature-x"])
+    launcher.main()
+    launcher.main()
+
+    assert capsys.readouterr().out == "git push origin feature-x\n" * 2
+    assert len(backend.requests) == 1
+    assert server.status()["requests"] == 2
+    assert server.status()["cache_hits"] == 1
+
+
+def test_launcher_runs_queries_with_other_endpoints_itself(daemon_server, monkeypatch, capsys, tmp_path):
+    server, backend = daemon_server
+    monkeypatch.setattr(cli, "PORT", backend.port)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    monkeypatch.setenv("GITARA_ENDPOINTS", backend.base_url)
+    monkeypatch.setattr(sys, "argv", ["gitara", "push feature-x"])
+    with pytest.raises(SystemExit) as exc_info:
+        launcher.main()
+    assert exc_info.value.code == 0
+    assert capsys.readouterr().out == "git push origin feature-x\n"
+    assert server.status()["requests"] == 0
+    assert len(backend.requests) == 1
+
+
+def test_daemon_serves_its_endpoints(socket_path, stub_backend, tmp_path, monkeypatch, capsys):
+    backend = stub_backend(answers={"push feature-x": PUSH})
+    server = DaemonServer(
+        socket_path, model_name="gitara", port=1, cache=ResponseCache(tmp_path / "c"), endpoints=[backend.base_url]
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        monkeypatch.setenv("GITARA_ENDPOINTS", backend.base_url)
+        monkeypatch.setattr(sys, "argv", ["gitara", "push feature-x"])
+        launcher.main()
+        assert capsys.readouterr().out == "git push origin feature-x\n"
+        assert server.status()["requests"] == 1
+        assert server.status()["settings"] == {"endpoints": [backend.base_url], "keep_alive": None}
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_launcher_runs_queries_with_another_keep_alive_itself(daemon_server, monkeypatch, capsys, tmp_path):
+    server, backend = daemon_server
+    monkeypatch.setattr(cli, "PORT", backend.port)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    monkeypatch.setenv("GITARA_KEEP_ALIVE", "30m")
+    monkeypatch.setattr(sys, "argv", ["gitara", "push feature-x"])
+    with pytest.raises(SystemExit) as exc_info:
+        launcher.main()
+    assert exc_info.value.code == 0
+    assert capsys.readouterr().out == "git push origin feature-x\n"
+    assert server.status()["requests"] == 0
+    assert backend.requests[0]["keep_alive"] == "30m"
+
+
+def test_daemon_keeps_the_model_loaded_for_its_keep_alive(socket_path, stub_backend, tmp_path, monkeypatch, capsys):
+    backend = stub_backend(answers={"push feature-x": PUSH})
+    server = DaemonServer(
+        socket_path, model_name="gitara", port=backend.port, cache=ResponseCache(tmp_path / "c"), keep_alive=600
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        monkeypatch.delenv("GITARA_ENDPOINTS", raising=False)
+        monkeypatch.setenv("GITARA_KEEP_ALIVE", " 600")
+        monkeypatch.setattr(sys, "argv", ["gitara", "push feature-x"])
+        launcher.main()
+        assert capsys.readouterr().out == "git push origin feature-x\n"
+        assert server.status()["requests"] == 1
+        assert backend.requests[0]["keep_alive"] == 600
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_launcher_reports_daemon_errors(daemon_server, monkeypatch, capsys):
+    _, backend = daemon_server
+    backend.errors.add("broken")
+    monkeypatch.setattr(sys, "argv", ["gitara", "broken"])
+    with pytest.raises(SystemExit) as exc_info:
+        launcher.main()
+    assert exc_info.value.code == 1
+    assert capsys.readouterr().err.startswith("Error: ")
+
+
+def test_daemon_bypass_needs_an_index(socket_path, tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    with pytest.raises(RuntimeError, match="No bypass index"):
+        DaemonServer(socket_path, model_name="gitara", port=1, cache=ResponseCache(tmp_path / "c"), bypass=True)
+
+
+def test_request_without_daemon(socket_path):
+    assert launcher.request({"op": "status"}) is None
+
+
+def test_cli_daemon_lifecycle(socket_path, stub_backend, monkeypatch, tmp_path):
+    backend = stub_backend(answers={"push feature-x": PUSH})
+    monkeypatch.setattr(cli, "PORT", backend.port)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    monkeypatch.setenv("PYTHONPATH", os.pathsep.join(sys.path))
+    runner = CliRunner()
+
+    result = runner.invoke(cli.main, ["daemon", "start"])
+    assert result.exit_code == 0, result.output
+    try:
+        assert launcher.request({"op": "invoke", "query": "push feature-x"})["command"] == "git push origin feature-x"
+        result = runner.invoke(cli.main, ["daemon", "status"])
+        assert result.exit_code == 0
+        assert '"requests": 1' in result.output
+    finally:
+        assert runner.invoke(cli.main, ["daemon", "stop"]).output == "gitara daemon stopped\n"
+    assert not os.path.exists(socket_path)
+    assert runner.invoke(cli.main, ["daemon", "status"]).exit_code == 1
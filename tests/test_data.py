@@ -0,0 +1,85 @@
+import json
+from collections import Counter
+from pathlib import Path
+
+from click.testing import CliRunner
+
+from gitara import data
+from gitara.data import StratifiedSplitter, build, new_report, scan
+
+DATA = Path(__file__).parent.parent / "finetuning" / "synthetic-data"
+
+
+def row(question: str, name: str, **parameters) -> str:
+    return json.dumps({"question": question, "answer": json.dumps({"name": name, "parameters": parameters})})
+
+
+ROWS = [
+    row("show the status", "git_status"),
+    row("show the status", "git_status"),  # Duplicate.
+    row("Show  the status!", "git_status", verbose=False),  # Near duplicate: same call once defaults are dropped.
+    row("show the STATUS", "git_status", verbose=True),  # Conflict with the first answer.
+    row("stage everything", "git_add"),  # Missing files.
+    "{not json",
+    row("stage a.txt", "git_add", files=["a.txt"]),
+    "",
+]
+
+
+def test_scan_rejects_and_counts():
+    report = new_report()
+    rows = list(scan(ROWS, report))
+    assert [r["question"] for r in rows] == ["show the status", "stage a.txt"]
+    assert report["rows"] == 7
+    assert report["accepted"] == 2
+    assert report["rejected"] == {
+        "duplicate": 1,
+        "near_duplicate": 1,
+        "conflict": 1,
+        "invalid_call": 1,
+        "invalid_json": 1,
+    }
+    assert report["by_argument"] == {"git_status": {}, "git_add": {"files": 1}}
+    assert "missing required argument 'files'" in report["errors"]
+
+    report = new_report()
+    assert len(list(scan(ROWS, report, near_duplicates=False))) == 3
+
+
+def test_split_is_stratified_and_deterministic():
+    splitter = StratifiedSplitter(test_fraction=0.25, shards=2)
+    assigned = [splitter.assign(tool) for tool in ["git_add"] * 8 + ["git_status"] * 4]
+    assert Counter(split for split, _ in assigned[:8]) == {"train": 6, "test": 2}
+    assert Counter(split for split, _ in assigned[8:]) == {"train": 3, "test": 1}
+    assert Counter(shard for split, shard in assigned[:8] if split == "train") == {0: 3, 1: 3}
+    splitter = StratifiedSplitter(test_fraction=0.25, shards=2)
+    assert [splitter.assign(tool) for tool in ["git_add"] * 8 + ["git_status"] * 4] == assigned
+
+
+def test_build_is_the_same_with_workers(tmp_path):
+    paths = [str(DATA / "train.jsonl"), str(DATA / "test.jsonl")]
+    serial = build(paths, tmp_path / "serial", shards=3)
+    parallel = build(paths, tmp_path / "parallel", shards=3, workers=2, chunk_size=500)
+    assert serial == parallel
+    assert serial["rejected"].keys() <= {"duplicate", "near_duplicate", "conflict"}
+    assert sum(serial["files"].values()) == serial["accepted"]
+    for name in serial["files"]:
+        assert (tmp_path / "serial" / name).read_bytes() == (tmp_path / "parallel" / name).read_bytes()
+
+    test = sum(count for name, count in serial["files"].items() if name.startswith("test"))
+    assert abs(test / serial["accepted"] - 0.1) < 0.01
+
+
+def test_cli(tmp_path):
+    source = tmp_path / "rows.jsonl"
+    source.write_text("\n".join(ROWS) + "\n")
+    runner = CliRunner()
+    result = runner.invoke(data.main, ["validate", str(source)])
+    assert result.exit_code == 1
+    assert json.loads(result.output)["rejected"]["invalid_json"] == 1
+
+    result = runner.invoke(data.main, ["build", str(source), "--out", str(tmp_path / "out"), "--test-fraction", "0"])
+    assert result.exit_code == 0, result.output
+    lines = (tmp_path / "out" / "train.jsonl").read_text().splitlines()
+    assert [json.loads(line)["question"] for line in lines] == ["show the status", "stage a.txt"]
+    assert json.loads((tmp_path / "out" / "report.json").read_text())["accepted"] == 2
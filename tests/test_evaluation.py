@@ -0,0 +1,84 @@
+import json
+
+from click.testing import CliRunner
+
+from gitara import evaluation
+from gitara.evaluation import normalize_tool_call, percentile
+from gitara.nearest import NearestIndex
+
+
+def write_dataset(path, rows):
+    with open(path, "w") as f:
+        for question, answer in rows:
+            f.write(json.dumps({"question": question, "answer": json.dumps(answer)}) + "\n")
+
+
+def test_normalize_tool_call():
+    assert normalize_tool_call(
+        {"name": "git_push", "arguments": {"remote": "origin", "branch": "main", "force": False}}
+    ) == {"name": "git_push", "arguments": {"branch": "main"}}
+    assert normalize_tool_call({"name": "git_log", "arguments": {"limit": 5}}) == {
+        "name": "git_log",
+        "arguments": {"limit": 5},
+    }
+    assert normalize_tool_call({"name": "git_status", "arguments": None}) == {"name": "git_status", "arguments": {}}
+
+
+def test_percentile():
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([0.5], 90) == 0.5
+    assert percentile([], 50) is None
+
+
+def test_eval_report(tmp_path, stub_backend):
+    backend = stub_backend(
+        answers={
+            "push main": {"name": "git_push", "arguments": {"branch": "main", "remote": "origin"}},
+            "show 5 commits": {"name": "git_log", "arguments": {"limit": 10}},
+        },
+        errors={"broken"},
+    )
+    data = tmp_path / "test.jsonl"
+    write_dataset(
+        data,
+        [
+            ("push main", {"name": "git_push", "parameters": {"branch": "main"}}),
+            ("show 5 commits", {"name": "git_log", "parameters": {"limit": 5}}),
+            ("status", {"name": "git_status", "parameters": {"verbose": False}}),
+            ("broken", {"name": "git_status", "parameters": {}}),
+        ],
+    )
+    output = tmp_path / "report.json"
+
+    result = CliRunner().invoke(
+        evaluation.main, ["--data", str(data), "--port", str(backend.port), "--output", str(output)]
+    )
+
+    assert result.exit_code == 0, result.output
+    report = json.loads(output.read_text())
+    assert (report["rows"], report["correct"], report["errors"]) == (4, 2, 1)
+    assert report["per_tool"]["git_status"] == {"rows": 2, "correct": 1, "accuracy": 0.5}
+    assert report["per_tool"]["git_log"]["correct"] == 0
+    assert set(report["latency"]) == {"mean", "p50", "p90", "p99"}
+    assert sorted(failure["query"] for failure in report["failures"]) == ["broken", "show 5 commits"]
+
+
+def test_eval_bypass_report(tmp_path, stub_backend):
+    backend = stub_backend(default={"name": "git_rebase", "arguments": {"abort": True}})
+    rows = [("abort the rebase in progress", {"name": "git_rebase", "parameters": {"abort": True}})]
+    data = tmp_path / "test.jsonl"
+    write_dataset(data, rows)
+    index = tmp_path / "index.bin"
+    index.write_bytes(NearestIndex.build([(q, {"name": a["name"], "arguments": a["parameters"]}) for q, a in rows]))
+    output = tmp_path / "report.json"
+
+    result = CliRunner().invoke(
+        evaluation.main,
+        ["--data", str(data), "--port", str(backend.port), "--bypass-index", str(index), "--output", str(output)],
+    )
+
+    assert result.exit_code == 0, result.output
+    [*_, exact] = json.loads(output.read_text())["bypass"]
+    assert exact == {"threshold": 1.0, "coverage": 1.0, "accuracy": 1.0, "agreement": 1.0}
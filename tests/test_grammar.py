@@ -0,0 +1,114 @@
+import json
+import re
+from pathlib import Path
+
+import pytest
+
+from gitara.dataset import read_dataset
+from gitara.grammar import STOP, call_schema, gbnf, max_call_length, parse_call, response_format
+from gitara.model_client import DistilLabsLLM
+from gitara.tools import TOOLS
+
+DATA = Path(__file__).parent.parent / "finetuning" / "synthetic-data"
+TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"|\[(?:[^\]\\]|\\.)*\]|\{\d+,\d+\}|[a-z][a-z0-9-]*|[()?|]|\s+')
+ANSWER = {"name": "git_reset", "arguments": {"mode": "hard", "target": "HEAD~1"}}
+
+
+def gbnf_to_regex(grammar: str) -> re.Pattern:
+    """The grammar has no recursion, so it can be inlined into a regex to check what it accepts."""
+    rules = dict(line.split(" ::= ", 1) for line in grammar.splitlines() if line)
+
+    def expand(name: str) -> str:
+        pattern = []
+        for token in TOKEN.findall(rules[name]):
+            if token.isspace():
+                continue
+            if token.startswith('"'):
+                pattern.append(re.escape(json.loads(token)))
+            elif token[0] in "[{()?|":
+                pattern.append(token)
+            else:
+                pattern.append(f"(?:{expand(token)})")
+        return "".join(pattern)
+
+    return re.compile(expand("root"))
+
+
+def answers() -> list[str]:
+    rows = [row for name in ("train.jsonl", "test.jsonl") for row in read_dataset(str(DATA / name))]
+    return [json.dumps({"name": call["name"], "parameters": call["arguments"]}, ensure_ascii=False) for _, call in rows]
+
+
+def test_grammar_accepts_every_training_answer():
+    grammar = gbnf_to_regex(gbnf())
+    texts = answers()
+    assert all(grammar.fullmatch(text) for text in texts)
+    assert max(len(text) for text in texts) < max_call_length()
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        '{"name": "git_add", "parameters": {}}',  # Missing required parameter.
+        '{"name": "git_reset", "parameters": {"mode": "medium"}}',  # Not in the enum.
+        '{"name": "git_log", "parameters": {"limit": "5"}}',  # Wrong type.
+        '{"name": "git_log", "parameters": {"limit": 0}}',  # Below the minimum.
+        '{"name": "git_status", "parameters": {"verbose": true, "color": true}}',  # Unknown parameter.
+        '{"name": "git_blame", "parameters": {}}',  # Unknown tool.
+        '{"name": "git_status", "parameters": {}} {"name": "git_status", "parameters": {}}',
+    ],
+)
+def test_grammar_rejects_invalid_calls(text):
+    assert gbnf_to_regex(gbnf()).fullmatch(text) is None
+
+
+def test_schema_is_bounded_and_closed():
+    schema = call_schema()
+    assert [variant["properties"]["name"]["const"] for variant in schema["anyOf"]] == [
+        tool["function"]["name"] for tool in TOOLS
+    ]
+    for variant, tool in zip(schema["anyOf"], TOOLS):
+        parameters = variant["properties"]["parameters"]
+        assert parameters["additionalProperties"] is False
+        assert parameters["required"] == tool["function"]["parameters"]["required"]
+        for key, spec in parameters["properties"].items():
+            assert spec.get("enum") == tool["function"]["parameters"]["properties"][key].get("enum")
+            if spec["type"] == "string" and "enum" not in spec:
+                assert spec["maxLength"]
+
+
+@pytest.mark.parametrize("decoding", ["json_schema", "gbnf"])
+def test_constrained_request_payload(stub_backend, decoding):
+    backend = stub_backend(default=ANSWER)
+    client = DistilLabsLLM(model_name="gitara", port=backend.port, decoding=decoding)
+    assert client.invoke("throw away my last commit") == ANSWER
+
+    [payload] = backend.requests
+    assert payload["tools"] == TOOLS
+    assert payload["tool_choice"] == "none"
+    assert payload["max_tokens"] == max_call_length()
+    assert payload["stop"] == STOP
+    if decoding == "json_schema":
+        assert payload["response_format"] == response_format()
+        assert "grammar" not in payload
+    else:
+        assert payload["grammar"] == gbnf()
+        assert "response_format" not in payload
+    assert client.cache_namespace != DistilLabsLLM(model_name="gitara").cache_namespace
+
+
+def test_constrained_decoding_is_opt_in(stub_backend):
+    backend = stub_backend()
+    DistilLabsLLM(model_name="gitara", port=backend.port).invoke("status")
+    assert {"response_format", "grammar", "max_tokens", "stop"}.isdisjoint(backend.requests[0])
+
+    with pytest.raises(ValueError):
+        DistilLabsLLM(model_name="gitara", decoding="regex")
+    with pytest.raises(ValueError):
+        DistilLabsLLM(model_name="gitara", decoding="gbnf", stream=True)
+
+
+def test_parse_call():
+    assert parse_call('{"name": "git_status", "parameters": {}}') == {"name": "git_status", "arguments": {}}
+    with pytest.raises(ValueError):
+        parse_call('{"name": "git_status", "arguments": {}}')
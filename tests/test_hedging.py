@@ -0,0 +1,124 @@
+import asyncio
+import time
+
+from click.testing import CliRunner
+
+from gitara import cli, evaluation
+from gitara.hedging import HedgePolicy
+from gitara.model_client import AsyncDistilLabsLLM, DistilLabsLLM
+from gitara.pool import EndpointPool
+
+STATUS = {"name": "git_status", "arguments": {}}
+
+
+def test_policy_delay_and_cap():
+    policy = HedgePolicy(percentile=90, max_rate=0.2, initial_delay=0.5)
+    assert policy.delay() == 0.5
+    for i in range(100):
+        policy.record(0.1)
+        policy.record_primary((i + 1) / 100)
+    assert policy.delay() == 0.9
+    # The budget counts the request asking: 20% of 101.
+    assert [policy.allow() for _ in range(25)].count(True) == 21
+    stats = policy.stats()
+    assert (stats["hedged"], stats["capped"], stats["hedge_rate"]) == (21, 4, 0.21)
+    assert stats["p99_improvement_at_least"] == 0.89
+
+
+def test_first_request_can_be_hedged_at_the_default_rate():
+    policy = HedgePolicy()
+    assert [policy.allow() for _ in range(2)] == [True, False]
+    for _ in range(9):
+        policy.record(0.1)
+    assert not policy.allow()
+    policy.record(0.1)
+    assert policy.allow()
+
+
+def test_hedge_beats_stalled_endpoint(stub_backend):
+    stalled, fast = stub_backend(delay=1.0), stub_backend()
+    # At the default max_rate, as for a single `gitara --hedge` query.
+    hedge = HedgePolicy(initial_delay=0.05)
+    client = DistilLabsLLM(
+        model_name="gitara", pool=EndpointPool([stalled.base_url, fast.base_url], health_interval=None), hedge=hedge
+    )
+    start = time.perf_counter()
+    assert client.invoke("status") == STATUS
+    assert time.perf_counter() - start < 0.5
+    assert len(stalled.requests) == len(fast.requests) == 1
+    client.close()
+    time.sleep(1.0)
+    # The stalled first attempt was left to finish, so the improvement is measured.
+    stats = hedge.stats()
+    assert (stats["requests"], stats["hedged"], stats["hedge_wins"]) == (1, 1, 1)
+    assert stats["p99_improvement_at_least"] > 0.5
+
+
+def test_fast_answers_are_not_hedged(stub_backend):
+    backend = stub_backend()
+    hedge = HedgePolicy(initial_delay=1.0, max_rate=1.0)
+    client = DistilLabsLLM(model_name="gitara", port=backend.port, hedge=hedge)
+    assert [client.invoke(f"status {i}") for i in range(3)] == [STATUS] * 3
+    assert len(backend.requests) == 3
+    assert hedge.stats()["hedged"] == 0
+
+
+def test_hedge_rate_is_capped(stub_backend):
+    backends = [stub_backend(delay=0.05), stub_backend(delay=0.05)]
+    hedge = HedgePolicy(initial_delay=0.01, max_rate=0.25)
+    client = DistilLabsLLM(model_name="gitara", endpoints=[backend.base_url for backend in backends], hedge=hedge)
+    for i in range(8):
+        client.invoke(f"status {i}")
+    stats = hedge.stats()
+    assert stats["hedged"] <= 2
+    assert stats["hedged"] + stats["capped"] == 8
+    assert sum(len(backend.requests) for backend in backends) == 8 + stats["hedged"]
+    client.close()
+
+
+def test_single_endpoint_is_not_hedged(stub_backend):
+    backend = stub_backend(delay=0.1)
+    hedge = HedgePolicy(initial_delay=0.01, max_rate=1.0)
+    client = DistilLabsLLM(model_name="gitara", port=backend.port, hedge=hedge)
+    assert client.invoke("status") == STATUS
+    time.sleep(0.15)
+    # A duplicate could only go to the same, slow server.
+    assert len(backend.requests) == 1
+    assert hedge.stats()["hedged"] == 0
+
+
+def test_cli_hedges_only_with_somewhere_to_send_the_duplicate():
+    result = CliRunner().invoke(cli.main, ["status", "--hedge", "95"])
+    assert result.exit_code == 2
+    assert "--hedge needs a second --endpoint or a --hedge-model" in result.output
+    result = CliRunner().invoke(evaluation.main, ["--hedge", "95"])
+    assert result.exit_code == 2
+    assert "--hedge needs a second --endpoint or a --hedge-model" in result.output
+
+
+def test_hedge_to_another_model(stub_backend):
+    backend = stub_backend(delay=0.1)
+    hedge = HedgePolicy(initial_delay=0.01, max_rate=1.0, model="gitara-small")
+    client = DistilLabsLLM(model_name="gitara", port=backend.port, hedge=hedge)
+    assert client.invoke("status") == STATUS
+    time.sleep(0.15)
+    assert sorted(payload["model"] for payload in backend.requests) == ["gitara", "gitara-small"]
+
+
+def test_async_hedge_cancels_the_loser(stub_backend):
+    stalled, fast = stub_backend(delay=1.0), stub_backend()
+    hedge = HedgePolicy(initial_delay=0.05, max_rate=1.0)
+    pool = EndpointPool([stalled.base_url, fast.base_url], health_interval=None)
+
+    async def run():
+        async with AsyncDistilLabsLLM(model_name="gitara", pool=pool, hedge=hedge) as client:
+            start = time.perf_counter()
+            result = await client.invoke("status")
+            return result, time.perf_counter() - start
+
+    result, elapsed = asyncio.run(run())
+    assert result == STATUS
+    assert elapsed < 0.5
+    assert hedge.stats()["hedge_wins"] == 1
+    # The cancelled request no longer counts as in flight.
+    assert [stats["outstanding"] for stats in pool.stats()] == [0, 0]
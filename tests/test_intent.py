@@ -0,0 +1,67 @@
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+
+from gitara import cli, intent
+from gitara.dataset import read_dataset
+from gitara.intent import IntentClassifier, evaluate
+from gitara.model_client import DistilLabsLLM
+from gitara.tools import TOOLS
+
+DATA = Path(__file__).parent.parent / "finetuning" / "synthetic-data"
+
+
+@pytest.fixture(scope="module")
+def model():
+    rows = list(read_dataset(str(DATA / "train.jsonl")))
+    return IntentClassifier.train(rows[::4], epochs=3)
+
+
+def test_top_k_recall(model):
+    results = {result["k"]: result for result in evaluate(model, read_dataset(str(DATA / "test.jsonl")))}
+    assert results[3]["top_k_recall"] > 0.95
+    assert results[3]["recall"] >= results[3]["top_k_recall"]
+    assert results[3]["schema_bytes"] < 1
+
+
+def test_round_trip(model, tmp_path):
+    path = tmp_path / "intent.bin"
+    path.write_bytes(model.to_bytes())
+    loaded = IntentClassifier.load(path)
+    question = "abort the rebase in progress"
+    assert loaded.predict(question) == model.predict(question)
+    assert loaded.predict(question)[0][0] == "git_rebase"
+    assert sum(probability for _, probability in loaded.predict(question)) == pytest.approx(1)
+    assert IntentClassifier.load(tmp_path / "missing.bin") is None
+
+
+def test_client_sends_only_likely_tools(model, stub_backend):
+    backend = stub_backend()
+    client = DistilLabsLLM(model_name="gitara", port=backend.port, tool_filter=model, tool_min_confidence=0.5)
+    client.invoke("abort the rebase in progress")
+    names = [tool["function"]["name"] for tool in backend.requests[-1]["tools"]]
+    assert "git_rebase" in names and len(names) == 3
+    assert names == [tool["function"]["name"] for tool in TOOLS if tool["function"]["name"] in names]
+
+    client = DistilLabsLLM(model_name="gitara", port=backend.port, tool_filter=model, tool_min_confidence=1.01)
+    client.invoke("abort the rebase in progress")
+    assert backend.requests[-1]["tools"] == TOOLS
+
+    assert client.cache_namespace != DistilLabsLLM(model_name="gitara").cache_namespace
+
+
+def test_cli_prunes_tools_only_with_the_flag(model, stub_backend, tmp_path, monkeypatch):
+    backend = stub_backend()
+    monkeypatch.setattr(cli, "PORT", backend.port)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    runner = CliRunner()
+    question = ["--no-cache", "stash my changes"]
+    assert runner.invoke(cli.main, ["--prune-tools", *question]).exit_code == 1
+
+    intent.default_model_path().parent.mkdir(parents=True, exist_ok=True)
+    intent.default_model_path().write_bytes(model.to_bytes())
+    assert runner.invoke(cli.main, question).exit_code == 0
+    assert backend.requests[-1]["tools"] == TOOLS
+    assert runner.invoke(cli.main, ["--prune-tools", *question]).exit_code == 0
+    assert len(backend.requests[-1]["tools"]) < len(TOOLS)
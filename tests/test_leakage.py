@@ -0,0 +1,71 @@
+import json
+from pathlib import Path
+
+from click.testing import CliRunner
+
+from gitara import data
+from gitara.leakage import LeakageIndex, find_leaks, jaccard, lsh_params, shingles
+
+DATA = Path(__file__).parent.parent / "finetuning"
+
+
+def row(question: str, name: str = "git_status") -> str:
+    return json.dumps({"question": question, "answer": json.dumps({"name": name, "parameters": {}})}) + "\n"
+
+
+def test_index_finds_near_duplicates_only():
+    index = LeakageIndex(["show me the status of the repo", "push my branch to origin"], threshold=0.7)
+    assert index.bands * index.rows <= 128
+    [(position, similarity)] = index.query("Show me the status of the repo!")
+    assert (position, similarity) == (0, 1.0)
+    [(position, similarity)] = index.query("show me the status of the repository")
+    assert position == 0
+    assert similarity == round(
+        jaccard(shingles("show me the status of the repo"), shingles("show me the status of the repository")), 4
+    )
+    assert index.query("stage every file in the docs folder") == []
+
+
+def test_lsh_params_follow_the_threshold():
+    # A higher threshold needs more rows per band for the S-curve to rise later.
+    assert lsh_params(0.5, 128)[1] < lsh_params(0.8, 128)[1] < lsh_params(0.95, 128)[1]
+
+
+def test_find_leaks_is_the_same_with_workers(tmp_path):
+    train = tmp_path / "train.jsonl"
+    test = tmp_path / "test.jsonl"
+    train.write_text(
+        row("clear all stashes") + "not json\n" + row("push to origin", "git_push") * 3 + row("list stashes")
+    )
+    test.write_text(row("Clear all stashes.") + row("push to origin") + row("show the log"))
+
+    report = find_leaks(str(train), str(test))
+    assert report["train_rows"] == 6
+    assert report["invalid_train_rows"] == 1
+    assert [(p["test_line"], p["train_line"], p["same_answer"]) for p in report["pairs"]] == [
+        (1, 1, True),
+        (2, 3, False),
+        (2, 4, False),
+        (2, 5, False),
+    ]
+    assert report["clean_test"] == [row("show the log")]
+    assert find_leaks(str(train), str(test), workers=2, chunk_size=2) == report
+
+
+def test_cli_on_finetuning_directory(tmp_path):
+    runner = CliRunner()
+    result = runner.invoke(data.main, ["leakage", str(DATA / "data")])
+    assert result.exit_code == 0, result.output
+    assert json.loads(result.output)["pairs"] == []
+
+    source = tmp_path / "source"
+    source.mkdir()
+    (source / "train.jsonl").write_text(row("clear all stashes"))
+    (source / "test.jsonl").write_text(row("clear all stashes") + row("show the log"))
+    clean = tmp_path / "clean.jsonl"
+    result = runner.invoke(data.main, ["leakage", str(source), "--clean-test", str(clean), "--shingle-size", "3"])
+    assert result.exit_code == 1
+    assert json.loads(result.output)["leaking_test_rows"] == 1
+    assert clean.read_text() == row("show the log")
+
+    assert runner.invoke(data.main, ["leakage"]).exit_code == 2
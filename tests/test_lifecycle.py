@@ -0,0 +1,61 @@
+from click.testing import CliRunner
+
+from gitara.cli import main
+from gitara.launcher import parse_query_args
+from gitara.lifecycle import parse_keep_alive, probe
+from gitara.model_client import DistilLabsLLM
+
+
+def test_parse_keep_alive():
+    assert [parse_keep_alive(value) for value in (None, " ", "600", "-1", "0", "30m")] == [
+        None,
+        None,
+        600,
+        -1,
+        0,
+        "30m",
+    ]
+
+
+def test_keep_alive_is_sent_with_every_request(stub_backend):
+    backend = stub_backend()
+    DistilLabsLLM(model_name="gitara", port=backend.port, keep_alive="30m").invoke("status")
+    DistilLabsLLM(model_name="gitara", port=backend.port, decoding="gbnf", keep_alive=600).invoke("status")
+    DistilLabsLLM(model_name="gitara", port=backend.port).invoke("status")
+    assert [request.get("keep_alive") for request in backend.requests] == ["30m", 600, None]
+    assert "grammar" in backend.requests[1]
+
+
+def test_warmup_and_unload_commands(stub_backend):
+    backend = stub_backend(load_delay=0.2)
+    runner = CliRunner()
+    result = runner.invoke(main, ["warmup", "--endpoint", backend.base_url, "--keep-alive", "600"])
+    assert result.exit_code == 0, result.output
+    assert "model ready after" in result.output
+    assert backend.loaded and backend.loads == 1
+    assert (backend.requests[0]["keep_alive"], backend.requests[0]["max_tokens"]) == (600, 1)
+
+    result = runner.invoke(main, ["unload", "--endpoint", backend.base_url])
+    assert result.exit_code == 0, result.output
+    assert not backend.loaded and backend.unloads == 1
+    assert backend.native_requests == [{"model": "gitara", "keep_alive": 0}]
+    assert parse_query_args(["warmup"]) is None
+
+
+def test_unload_needs_native_api(stub_backend):
+    backend = stub_backend(native_api=False)
+    result = CliRunner().invoke(main, ["unload", "--endpoint", backend.base_url])
+    assert result.exit_code == 1
+    assert "cannot unload models" in result.stderr
+
+
+def test_probe_measures_load_and_keep_alive(stub_backend):
+    backend = stub_backend(load_delay=0.3)
+    client = DistilLabsLLM(model_name="gitara", port=backend.port, keep_alive=1)
+    report = probe(client, warm_rounds=2, idle=[0.0, 1.2])
+    assert report["unloaded"]
+    assert report["load_seconds"] >= 0.25
+    assert report["cold_seconds"] > report["warm_seconds"]
+    assert [entry["cold"] for entry in report["after_idle"]] == [False, True]
+    assert report["memory"] == {"size": 2_000_000, "size_vram": 1_000_000}
+    assert backend.loads == 2
@@ -0,0 +1,93 @@
+import json
+
+import pytest
+from click.testing import CliRunner
+
+from gitara import cli, nearest
+from gitara.model_client import DistilLabsLLM
+from gitara.nearest import NearestIndex
+
+ROWS = [
+    (
+        "push feature-x to origin and set upstream",
+        {"name": "git_push", "arguments": {"branch": "feature-x", "set_upstream": True}},
+    ),
+    ("show the status including ignored files", {"name": "git_status", "arguments": {"ignored": True}}),
+    ("abort the rebase in progress", {"name": "git_rebase", "arguments": {"abort": True}}),
+    ("show 8 commits with graph", {"name": "git_log", "arguments": {"limit": 8, "graph": True}}),
+    # The answer ignores one of the branches, so the template cannot be reused for other branches.
+    ("merge main into dev-2", {"name": "git_merge", "arguments": {"branch": "main"}}),
+]
+
+
+@pytest.fixture
+def index():
+    return NearestIndex.from_bytes(NearestIndex.build(ROWS))
+
+
+def test_nearest_answers_paraphrases(index):
+    assert len(index) == 4
+    match = index.nearest("show status including ignored files", 0.7)
+    assert match.tool_call == {"name": "git_status", "arguments": {"ignored": True}}
+    assert match.question == "show the status including ignored files"
+    assert 0.7 <= match.similarity < 1
+    assert index.nearest("abort the rebase in progress").similarity == 1.0
+    assert index.nearest("make me a sandwich", 0.6) is None
+
+
+def test_nearest_fills_slots(index):
+    match = index.nearest("push hotfix/login to origin and set upstream")
+    assert match.tool_call == {"name": "git_push", "arguments": {"branch": "hotfix/login", "set_upstream": True}}
+    assert index.nearest("show 20 commits with graph").tool_call == {
+        "name": "git_log",
+        "arguments": {"limit": 20, "graph": True},
+    }
+    # Same words but different slots: the stored answer cannot be filled in.
+    assert index.nearest("push feature-x to main and set upstream", 0.6) is None
+
+
+def test_threshold_below_index_minimum(index):
+    with pytest.raises(ValueError):
+        index.nearest("status", 0.5)
+
+
+def test_load_memory_maps_file(tmp_path, monkeypatch):
+    path = tmp_path / "index.bin"
+    path.write_bytes(NearestIndex.build(ROWS))
+    assert NearestIndex.load(path).nearest("abort the rebase in progress") is not None
+    assert NearestIndex.load(tmp_path / "missing.bin") is None
+
+    monkeypatch.setattr(nearest, "CANONICALIZER_VERSION", -1)
+    assert NearestIndex.load(path) is None
+
+
+def test_client_bypass_and_shadow(index, stub_backend):
+    backend = stub_backend(default={"name": "git_rebase", "arguments": {"continue": True}})
+
+    client = DistilLabsLLM(model_name="gitara", port=backend.port, bypass=index)
+    assert client.invoke("abort the rebase in progress") == {"name": "git_rebase", "arguments": {"abort": True}}
+    assert client.bypass_hits == 1
+    assert backend.requests == []
+
+    client = DistilLabsLLM(model_name="gitara", port=backend.port, bypass=index, bypass_shadow=True)
+    assert client.invoke("abort the rebase in progress") == {"name": "git_rebase", "arguments": {"continue": True}}
+    assert len(backend.requests) == 1
+    [entry] = client.bypass_log
+    assert entry["would_bypass"] and not entry["agree"]
+    assert json.dumps(entry)
+
+
+def test_cli_bypasses_only_with_the_flag(tmp_path, monkeypatch, stub_backend):
+    backend = stub_backend(default={"name": "git_status", "arguments": {}})
+    monkeypatch.setattr(cli, "PORT", backend.port)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    runner = CliRunner()
+    question = "push feature-x to origin and set upstream"
+    assert runner.invoke(cli.main, ["--bypass", question]).exit_code == 1
+
+    nearest.default_index_path().parent.mkdir(parents=True, exist_ok=True)
+    nearest.default_index_path().write_bytes(NearestIndex.build(ROWS))
+    assert runner.invoke(cli.main, ["--bypass", question]).stdout == "git push origin feature-x --set-upstream\n"
+    assert backend.requests == []
+    assert runner.invoke(cli.main, [question]).stdout == "git status\n"
+    assert len(backend.requests) == 1
@@ -0,0 +1,96 @@
+import asyncio
+import socket
+
+import pytest
+from openai import APIConnectionError, InternalServerError
+
+from gitara.model_client import AsyncDistilLabsLLM, DistilLabsLLM
+from gitara.pool import EndpointPool
+
+STATUS = {"name": "git_status", "arguments": {}}
+
+
+def unused_url() -> str:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{s.getsockname()[1]}/v1"
+
+
+def test_routes_to_least_outstanding(stub_backend):
+    fast = stub_backend(delay=0.02)
+    slow = stub_backend(delay=0.2)
+    pool = EndpointPool([fast.base_url, slow.base_url], health_interval=None)
+
+    async def run():
+        async with AsyncDistilLabsLLM(model_name="gitara", pool=pool, max_in_flight=4) as client:
+            return await client.invoke_many([f"status {i}" for i in range(24)])
+
+    assert asyncio.run(run()) == [STATUS] * 24
+    fast_stats, slow_stats = pool.stats()
+    # The slow endpoint keeps its requests in flight longer, so it gets fewer of them.
+    assert fast_stats["requests"] > 2 * slow_stats["requests"] > 0
+    assert fast_stats["latency_mean"] < slow_stats["latency_mean"]
+    assert fast_stats["outstanding"] == slow_stats["outstanding"] == 0
+
+
+def test_sequential_requests_take_turns(stub_backend):
+    backends = [stub_backend(), stub_backend()]
+    client = DistilLabsLLM(model_name="gitara", endpoints=[backend.base_url for backend in backends])
+    for i in range(4):
+        assert client.invoke(f"status {i}") == STATUS
+    assert [len(backend.requests) for backend in backends] == [2, 2]
+    client.close()
+
+
+def test_ejects_failing_endpoint_and_readmits_it(stub_backend):
+    broken, healthy = stub_backend(), stub_backend()
+    broken.failing = True
+    pool = EndpointPool([broken.base_url, healthy.base_url], max_failures=2, health_interval=None)
+    client = DistilLabsLLM(model_name="gitara", pool=pool)
+
+    # Each request that lands on the broken endpoint is retried on the healthy one.
+    assert [client.invoke(f"status {i}") for i in range(6)] == [STATUS] * 6
+    broken_stats, healthy_stats = pool.stats()
+    assert broken_stats["healthy"] is False
+    assert (broken_stats["errors"], broken_stats["ejections"]) == (2, 1)
+    assert healthy_stats["requests"] == 6
+
+    pool.check_all()
+    assert pool.stats()[0]["healthy"] is False
+    broken.failing = False
+    pool.check_all()
+    assert pool.stats()[0]["healthy"] is True
+    client.invoke("status again")
+    assert len(broken.requests) == 3
+
+
+def test_unreachable_endpoint(stub_backend):
+    backend = stub_backend()
+    client = DistilLabsLLM(model_name="gitara", endpoints=[unused_url(), backend.base_url])
+    assert [client.invoke(f"status {i}") for i in range(4)] == [STATUS] * 4
+    dead, alive = client.pool.stats()
+    assert (dead["errors"], dead["healthy"], alive["requests"]) == (3, False, 4)
+    client.close()
+
+    client = DistilLabsLLM(model_name="gitara", pool=EndpointPool([unused_url(), unused_url()], health_interval=None))
+    with pytest.raises(APIConnectionError):
+        client.invoke("status")
+
+
+def test_single_endpoint_is_never_ejected(stub_backend):
+    backend = stub_backend()
+    backend.failing = True
+    pool = EndpointPool([backend.base_url], max_failures=1)
+    assert pool._health_thread is None
+    client = DistilLabsLLM(model_name="gitara", pool=pool)
+    with pytest.raises(InternalServerError):
+        client.invoke("status")
+    assert pool.stats()[0]["healthy"] is True
+
+
+def test_client_is_the_first_endpoints(stub_backend):
+    backend = stub_backend()
+    client = DistilLabsLLM(model_name="gitara", endpoints=[backend.base_url, unused_url()])
+    assert client.client is client.pool.endpoints[0].client
+    assert str(client.client.base_url).rstrip("/") == backend.base_url
+    client.close()
@@ -0,0 +1,72 @@
+import cProfile
+import json
+import pstats
+import time
+
+import pytest
+
+from gitara.profiling import collapsed_stacks, parse_importtime, run_profiled
+
+ROW = json.dumps({"name": "git_status", "arguments": {}})
+
+
+def test_parse_importtime():
+    lines = [
+        "import time: self [us] | cumulative | imported package\n",
+        "import time:       175 |        175 |       _json\n",
+        "import time:       392 |       7191 |   json.decoder\n",
+        "import time:       218 |       7832 | json\n",
+    ]
+    assert parse_importtime(lines) == [(175, 175, "      _json"), (392, 7191, "  json.decoder"), (218, 7832, "json")]
+
+
+def _inner():
+    time.sleep(0.02)
+
+
+def _outer():
+    _inner()
+    sum(range(10_000))
+
+
+def test_collapsed_stacks():
+    profiler = cProfile.Profile()
+    profiler.runcall(_outer)
+    stacks = collapsed_stacks(pstats.Stats(profiler))
+    [sleep] = [stack for stack in stacks if stack.endswith("time.sleep")]
+    assert sleep.split(";")[:2] == [
+        f"_outer (tests/test_profiling.py:{_outer.__code__.co_firstlineno})",
+        f"_inner (tests/test_profiling.py:{_inner.__code__.co_firstlineno})",
+    ]
+    assert stacks[sleep] >= 20_000
+    assert sum(stacks.values()) == pytest.approx(stacks[sleep], rel=0.5)
+
+
+@pytest.mark.parametrize("mode, suffixes", [("cpu", {".prof", ".collapsed"}), ("alloc", {".tracemalloc", ".txt"})])
+def test_run_profiled(mode, suffixes, tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("GITARA_PROFILE_DIR", str(tmp_path / "profiles"))
+    rows = tmp_path / "rows.jsonl"
+    rows.write_text(ROW + "\n")
+    with pytest.raises(SystemExit) as exit_info:
+        run_profiled(mode, ["render", "--jsonl", str(rows)])
+    assert exit_info.value.code == 0
+    out, err = capsys.readouterr()
+    assert json.loads(out)["command"] == "git status"
+    assert {path.suffix for path in (tmp_path / "profiles").iterdir()} == suffixes
+    assert str(tmp_path / "profiles") in err.splitlines()[0]
+
+
+def test_run_profiled_imports(tmp_path, monkeypatch, capfd):
+    monkeypatch.setenv("GITARA_PROFILE_DIR", str(tmp_path))
+    monkeypatch.setenv("GITARA_PROFILE", "imports")
+    with pytest.raises(SystemExit) as exit_info:
+        run_profiled("imports", ["render", "--jsonl", "-"])
+    assert exit_info.value.code == 0
+    [artifact] = tmp_path.iterdir()
+    assert any(entry[2] == "gitara.cli" for entry in parse_importtime(artifact.read_text().splitlines()))
+    assert "gitara.cli" in capfd.readouterr().err
+
+
+def test_unknown_mode():
+    with pytest.raises(SystemExit, match="expected one of cpu, imports, alloc"):
+        run_profiled("wall", [])
@@ -0,0 +1,48 @@
+import json
+
+from gitara.model_client import DistilLabsLLM
+from gitara.prompt import QUESTION_PREFIX, QUESTION_SUFFIX, SYSTEM_PROMPT, benchmark, render_modelfile
+from gitara.tools import TOOLS
+
+
+def test_requests_share_a_byte_identical_prefix(stub_backend):
+    backend = stub_backend()
+    DistilLabsLLM(model_name="gitara", port=backend.port).invoke("push feature-x to origin")
+    DistilLabsLLM(model_name="gitara", port=backend.port).invoke("undo {the} last commit")
+    first, second = backend.requests
+
+    assert {key: value for key, value in first.items() if key != "messages"} == {
+        key: value for key, value in second.items() if key != "messages"
+    }
+    assert json.dumps(first["tools"]) == json.dumps(second["tools"]) == json.dumps(TOOLS)
+    assert first["messages"][:-1] == second["messages"][:-1] == [{"role": "system", "content": SYSTEM_PROMPT}]
+    assert first["messages"][-1]["content"] == QUESTION_PREFIX + "push feature-x to origin" + QUESTION_SUFFIX
+    assert second["messages"][-1]["content"] == QUESTION_PREFIX + "undo {the} last commit" + QUESTION_SUFFIX
+
+
+def test_prompt_fingerprint_is_stable():
+    # Changing any byte of the prefix invalidates every cached answer and the backend's prompt cache.
+    assert DistilLabsLLM(model_name="gitara").prompt_fingerprint() == "86d1ac6ca87b6246"
+    assert (
+        DistilLabsLLM(model_name="gitara").cache_namespace
+        != DistilLabsLLM(model_name="gitara", system_prompt=False).cache_namespace
+    )
+
+
+def test_system_prompt_can_live_in_the_modelfile():
+    base = 'FROM ./model.gguf\nSYSTEM """old\nprompt"""\nPARAMETER temperature 0\nSYSTEM short one\n'
+    modelfile = render_modelfile(base)
+    assert modelfile.startswith("FROM ./model.gguf\nPARAMETER temperature 0\n")
+    assert modelfile.count("SYSTEM") == 1
+    assert modelfile.endswith(f'SYSTEM """{SYSTEM_PROMPT}"""\n')
+
+    messages = DistilLabsLLM(model_name="gitara", system_prompt=False).get_prompt("status")
+    assert [message["role"] for message in messages] == ["user"]
+
+
+def test_benchmark_reports_both_variants(stub_backend):
+    backend = stub_backend()
+    report = benchmark(DistilLabsLLM(model_name="gitara", port=backend.port), ["status", "push"])
+    assert set(report) == {"stable", "unstable", "gain"}
+    unstable = [payload["messages"][0]["content"] for payload in backend.requests[3:]]
+    assert len(set(unstable)) == 3
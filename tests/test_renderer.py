@@ -1,4 +1,16 @@
-from gitara.renderer import render_git_command
+import json
+import random
+from pathlib import Path
+
+from bench_renderer import benchmark, render_git_command_reference
+from click.testing import CliRunner
+
+from gitara import cli
+from gitara.dataset import read_dataset
+from gitara.renderer import render_git_command, render_many
+from gitara.tools import TOOLS
+
+TRAIN = Path(__file__).parent.parent / "finetuning" / "synthetic-data" / "train.jsonl"
 
 
 def test_git_status():
@@ -487,3 +499,76 @@ def test_git_log():
         render_git_command({"name": "git_log", "arguments": {"ref": "feature", "graph": True}})
         == "git log feature --graph"
     )
+
+
+def sample_value(spec: dict, rng: random.Random):
+    if "enum" in spec:
+        return rng.choice([*spec["enum"], "other"])
+    values: dict[str, list] = {
+        "boolean": [True, False],
+        "string": ["main", "", "HEAD~1"],
+        "integer": [0, 3],
+        "array": [[], ["a.txt"], ["a.txt", "b.txt"]],
+    }
+    return rng.choice(values[spec["type"]])
+
+
+def test_table_renderers_match_the_reference():
+    calls = [tool_call for _, tool_call in read_dataset(str(TRAIN))]
+    rng = random.Random(0)
+    for tool in TOOLS:
+        properties = tool["function"]["parameters"]["properties"]
+        for _ in range(500):
+            arguments = {key: sample_value(spec, rng) for key, spec in properties.items() if rng.random() < 0.5}
+            calls.append({"name": tool["function"]["name"], "arguments": arguments})
+    calls += [{"name": "git_blame", "arguments": {}}, {"name": None}, {"name": "git_add", "arguments": "a.txt"}]
+    for tool_call in calls:
+        assert render_git_command(tool_call) == render_git_command_reference(tool_call), tool_call
+
+
+def test_benchmark():
+    report = benchmark([{"name": "git_push", "arguments": {"branch": "main"}}], calls=100, repeats=1)
+    assert report["table"]["calls_per_second"] > 0 and report["speedup"] > 0
+
+
+ROWS = [
+    json.dumps(
+        {"question": "stage a.txt", "answer": json.dumps({"name": "git_add", "parameters": {"files": ["a.txt"]}})}
+    ),
+    "",
+    "not json",
+    json.dumps({"name": "git_log", "arguments": json.dumps({"limit": 3})}),
+    json.dumps({"name": "git_reset", "arguments": {"mode": "medium"}}),
+]
+
+
+def test_render_many_reports_errors_per_row():
+    records = list(render_many(ROWS))
+    assert [record["line"] for record in records] == [1, 3, 4, 5]
+    assert records[0]["question"] == "stage a.txt"
+    assert records[0]["command"] == "git add a.txt"
+    assert records[1]["error"] and records[1]["command"] is None
+    assert records[2]["command"] == "git log -n 3"
+    assert records[3]["command"] == "git reset --medium"
+
+    [invalid] = [record for record in render_many(ROWS, validate=True) if record["line"] == 5]
+    assert invalid["command"] is None and "mode must be one of" in invalid["error"]
+
+
+def test_render_many_with_workers_keeps_order():
+    lines = TRAIN.read_text().splitlines()[:500]
+    assert list(render_many(lines, workers=2, chunk_size=64)) == list(render_many(lines))
+
+
+def test_cli_render(tmp_path):
+    path = tmp_path / "rows.jsonl"
+    path.write_text("\n".join(ROWS) + "\n")
+    result = CliRunner().invoke(cli.main, ["render", "--jsonl", str(path)])
+    assert result.exit_code == 1
+    assert [json.loads(line)["command"] for line in result.stdout.splitlines()] == [
+        "git add a.txt",
+        None,
+        "git log -n 3",
+        "git reset --medium",
+    ]
+    assert "1 rows failed" in result.stderr
@@ -0,0 +1,88 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from gitara.cli import parse_tool_call
+from gitara.model_client import DistilLabsLLM
+from gitara.repair import RepairError, parse_message
+from gitara.validation import ToolCallError
+
+# Model outputs as recorded from backends that do not follow the tool calling format: the
+# message's (name, arguments text) tool calls and content, and what they should parse to.
+CORPUS = [json.loads(line) for line in (Path(__file__).parent / "malformed_outputs.jsonl").read_text().splitlines()]
+
+
+@pytest.mark.parametrize("output", CORPUS, ids=[str(i) for i in range(len(CORPUS))])
+def test_corpus(output):
+    if output["expected"] is None:
+        with pytest.raises(RepairError):
+            parse_message(output["tool_calls"], output["content"])
+        return
+    tool_call, repairs = parse_message(output["tool_calls"], output["content"])
+    assert tool_call == output["expected"]
+    assert repairs == output["repairs"]
+
+
+def test_parse_tool_call_repairs():
+    assert parse_tool_call('```json\n{"name": "git_status", "parameters": {},}\n```') == {
+        "name": "git_status",
+        "arguments": {},
+    }
+    assert parse_tool_call('{"name": "git_log", "arguments": {"limit": 0}}') is None
+
+
+def test_client_repairs_content_answers(stub_backend):
+    backend = stub_backend()
+    content = 'Here you go: {"name": "git_log", "parameters": {"limit": "3"}}'
+    backend.completion = lambda payload: completion({"role": "assistant", "content": content})
+    client = DistilLabsLLM(model_name="gitara", port=backend.port)
+    assert client.invoke("last three commits") == {"name": "git_log", "arguments": {"limit": 3}}
+    assert len(backend.requests) == 1
+    assert client.repairs == {"content_fallback": 1, "surrounding_text": 1, "parameters_key": 1, "coerced_type": 1}
+    assert client.requeries == 0
+
+
+def test_client_asks_again_only_when_repair_fails(stub_backend):
+    backend = stub_backend()
+    answers = iter(["I am not sure what you mean.", '{"name": "git_status", "arguments": {}}'])
+    backend.completion = lambda payload: completion({"role": "assistant", "content": next(answers)})
+    client = DistilLabsLLM(model_name="gitara", port=backend.port)
+    assert client.invoke("status") == {"name": "git_status", "arguments": {}}
+    assert (len(backend.requests), client.requeries) == (2, 1)
+
+    backend = stub_backend(default={"name": "git_log", "arguments": {"limit": 0}})
+    client = DistilLabsLLM(model_name="gitara", port=backend.port, max_requeries=0)
+    with pytest.raises(ToolCallError):
+        client.invoke("no commits")
+    assert len(backend.requests) == 1
+
+
+def completion(message: dict) -> dict:
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "gitara",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": message}],
+    }
+
+
+def test_streamed_content_is_repaired(stub_backend):
+    backend = stub_backend()
+    text = '<tool_call>{"name": "git_stash", "arguments": {"action": "list"}}</tool_call>'
+
+    def chunks(payload):
+        for i in range(0, len(text), 8):
+            yield {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": "gitara",
+                "choices": [{"index": 0, "delta": {"content": text[i : i + 8]}, "finish_reason": None}],
+            }
+
+    backend.chunks = chunks
+    client = DistilLabsLLM(model_name="gitara", port=backend.port, stream=True)
+    assert client.invoke("show my stashes") == {"name": "git_stash", "arguments": {"action": "list"}}
+    assert client.repairs == {"content_fallback": 1, "tool_call_tag": 1}
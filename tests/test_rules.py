@@ -0,0 +1,68 @@
+import json
+from pathlib import Path
+
+from gitara.dataset import read_dataset
+from gitara.model_client import DistilLabsLLM
+from gitara.rules import DEFAULT_DATA, RULES, STATS_PATH, Rule, RuleSet, measure
+
+ROOT = Path(__file__).parent.parent
+ALL_RULES = RuleSet(RULES)
+
+
+def answer(question: str) -> dict | None:
+    match = ALL_RULES.match(question)
+    return match[1] if match is not None else None
+
+
+def test_rules_answer_trivial_queries():
+    assert answer("status") == {"name": "git_status", "arguments": {}}
+    assert answer("Show ignored files.") == {"name": "git_status", "arguments": {"ignored": True}}
+    assert answer("git log oneline 5") == {"name": "git_log", "arguments": {"oneline": True, "limit": 5}}
+    assert answer("abort the rebase") == {"name": "git_rebase", "arguments": {"abort": True}}
+
+
+def test_rules_convert_captures_to_schema_types():
+    assert answer("stage the README.md file") == {"name": "git_add", "arguments": {"files": ["README.md"]}}
+    assert answer("drop stash@{3}") == {"name": "git_stash", "arguments": {"action": "drop", "stash_ref": "stash@{3}"}}
+    # Case and dashes are normalized for matching, but names keep the case they were written in.
+    assert answer("Switch to Feature‑X") == {"name": "git_switch", "arguments": {"branch": "Feature-X"}}
+
+
+def test_rules_fall_through_on_doubt():
+    assert answer("switch to the previous branch") is None
+    assert answer("delete this branch") is None
+    assert answer("status of the upstream remote, then push") is None
+    assert answer("make me a sandwich") is None
+
+
+def test_from_stats_disables_imprecise_and_stale_rules():
+    exact = Rule("exact", r"abort", "git_rebase", {"abort": True})
+    sloppy = Rule("sloppy", r"rebase (?P<target>\S+)", "git_rebase")
+    changed = Rule("changed", r"continue", "git_rebase", {"continue": True})
+    stats = {
+        "exact": {"fingerprint": exact.fingerprint(), "matched": 10, "correct": 10, "precision": 1.0},
+        "sloppy": {"fingerprint": sloppy.fingerprint(), "matched": 10, "correct": 6, "precision": 0.6},
+        "changed": {"fingerprint": "0" * 16, "matched": 10, "correct": 10, "precision": 1.0},
+    }
+    ruleset = RuleSet.from_stats(stats, rules=[exact, sloppy, changed])
+    assert [rule.name for rule in ruleset.rules] == ["exact"]
+    assert ruleset.match("rebase main") is None
+    assert [rule.name for rule in RuleSet.from_stats(stats, min_precision=0.5, rules=[exact, sloppy]).rules] == [
+        "exact",
+        "sloppy",
+    ]
+    assert len(RuleSet.from_stats(stats, min_support=11, rules=[exact])) == 0
+
+
+def test_shipped_measurements_are_current():
+    rows = [row for path in DEFAULT_DATA for row in read_dataset(str(ROOT / path))]
+    assert measure(rows) == json.loads(STATS_PATH.read_text()), "Run `python -m gitara.rules --write`"
+    assert len(RuleSet.load()) >= 10
+
+
+def test_client_answers_from_rules(stub_backend):
+    backend = stub_backend()
+    client = DistilLabsLLM(model_name="gitara", port=backend.port, rules=RuleSet(RULES))
+    assert client.invoke("abort the rebase") == {"name": "git_rebase", "arguments": {"abort": True}}
+    assert client.rule_hits == 1
+    assert backend.requests == []
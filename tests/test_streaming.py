@@ -0,0 +1,111 @@
+import asyncio
+import time
+
+import pytest
+from click.testing import CliRunner
+
+from gitara import cli
+from gitara.model_client import AsyncDistilLabsLLM, DistilLabsLLM
+from gitara.renderer import render_git_command
+from gitara.streaming import JsonObjectScanner, ToolCallStream
+
+ANSWER = {"name": "git_commit", "arguments": {"message": 'fix: escape "}" in {paths}', "amend": True}}
+
+
+def test_scanner_finds_the_end_of_the_object():
+    scanner = JsonObjectScanner()
+    text = '{"message": "a \\" } b", "files": ["x", {"y": [1]}]}  \n  more tokens'
+    for i in range(0, len(text), 3):
+        if scanner.feed(text[i : i + 3]):
+            break
+    assert scanner.value() == {"message": 'a " } b', "files": ["x", {"y": [1]}]}
+    assert scanner.text[scanner.end :].strip() == ""
+
+
+def test_scanner_parses_partial_objects():
+    partials = []
+    scanner = JsonObjectScanner()
+    for c in '{"files": ["a.txt", "b.txt"], "force": true}':
+        scanner.feed(c)
+        partials.append(scanner.partial())
+    assert {"files": ["a.txt", "b."]} in partials
+    assert {"files": ["a.txt", "b.txt"], "force": None} in partials
+    assert partials[-1] == {"files": ["a.txt", "b.txt"], "force": True}
+
+
+def test_stream_stops_once_the_call_is_complete(stub_backend):
+    backend = stub_backend(default=ANSWER, trailing=50, chunk_delay=0.02)
+    client = DistilLabsLLM(model_name="gitara", port=backend.port, stream=True)
+    start = time.perf_counter()
+    assert client.invoke("commit it") == ANSWER
+    # The 50 trailing chunks alone would take a second.
+    assert time.perf_counter() - start < 0.6
+    assert backend.requests[0]["stream"] is True
+
+
+def test_partial_states_show_the_command_forming(stub_backend):
+    backend = stub_backend(default=ANSWER)
+    client = DistilLabsLLM(model_name="gitara", port=backend.port)
+    commands, states = [], []
+
+    def on_partial(state):
+        states.append(state)
+        commands.append(render_git_command(state.tool_call()))
+
+    assert client.invoke("commit it", on_partial=on_partial) == ANSWER
+    assert 'git commit -m "fix: es"' in commands
+    assert commands[-1] == render_git_command(ANSWER)
+    state = states[-1]
+    assert state.complete and 0 < state.ttft <= state.time_to_call
+
+
+def test_streamed_arguments_are_coerced_like_complete_answers(stub_backend):
+    backend = stub_backend(default={"name": "git_log", "arguments": {"limit": "5"}})
+    expected = {"name": "git_log", "arguments": {"limit": 5}}
+    assert DistilLabsLLM(model_name="gitara", port=backend.port).invoke("log") == expected
+    client = DistilLabsLLM(model_name="gitara", port=backend.port, stream=True)
+    assert client.invoke("log") == expected
+    assert client.repairs == {"coerced_type": 1}
+
+    async def run():
+        async with AsyncDistilLabsLLM(model_name="gitara", port=backend.port, stream=True) as client:
+            return await client.invoke("log")
+
+    assert asyncio.run(run()) == expected
+
+
+def test_stream_without_complete_call_fails(stub_backend):
+    backend = stub_backend()
+    backend.chunks = lambda payload: iter([])
+    client = DistilLabsLLM(model_name="gitara", port=backend.port, stream=True)
+    with pytest.raises(RuntimeError):
+        client.invoke("status")
+
+
+def test_stream_log_without_first_token(caplog):
+    state = ToolCallStream()
+    state.name, state.time_to_call = "git_status", 0.01
+    with caplog.at_level("INFO"):
+        DistilLabsLLM(model_name="gitara").log_stream(state)
+    assert "without a timed first token" in caplog.text
+
+
+def test_async_stream(stub_backend):
+    backend = stub_backend(default=ANSWER, trailing=50, chunk_delay=0.02)
+
+    async def run():
+        async with AsyncDistilLabsLLM(model_name="gitara", port=backend.port, stream=True) as client:
+            return await client.invoke("commit it")
+
+    start = time.perf_counter()
+    assert asyncio.run(run()) == ANSWER
+    assert time.perf_counter() - start < 0.6
+
+
+def test_cli_reports_stream_timings(stub_backend, monkeypatch):
+    backend = stub_backend(default=ANSWER)
+    monkeypatch.setattr(cli, "PORT", backend.port)
+    result = CliRunner().invoke(cli.main, ["--no-cache", "--stream", "commit it"])
+    assert result.exit_code == 0, result.output
+    assert result.stdout.strip() == render_git_command(ANSWER)
+    assert "Time to first token" in result.stderr
@@ -0,0 +1,70 @@
+from pathlib import Path
+
+from gitara.cache import ResponseCache
+from gitara.dataset import read_dataset
+from gitara.model_client import DistilLabsLLM
+from gitara.templates import canonicalize, evaluate
+
+TRAIN = Path(__file__).parent.parent / "finetuning" / "synthetic-data" / "train.jsonl"
+
+
+def test_canonicalize_lifts_entities():
+    template = canonicalize("push feature-x to origin and force it")
+    assert template.text == "push <B1> to origin and force it"
+    assert template.slots == {"<B1>": "feature-x"}
+
+    template = canonicalize("Restore docs/README.md from HEAD~2 and apply stash@{3}")
+    assert template.text == "restore <P1> from <R1> and apply <S1>"
+    assert template.slots == {"<P1>": "docs/README.md", "<R1>": "HEAD~2", "<S1>": "stash@{3}"}
+
+    template = canonicalize('stash my work with message "WIP: login" and show 8 commits')
+    assert template.text == 'stash my work with message "<M1>" and show <N1> commits'
+
+    assert canonicalize("show status") is None
+    assert canonicalize("add the readme") is None
+
+
+def test_lift_and_fill():
+    first = canonicalize("push feature-x to origin, force it")
+    lifted = first.lift({"name": "git_push", "arguments": {"branch": "feature-x", "force": True}})
+    assert lifted == {"name": "git_push", "arguments": {"branch": "<B1>", "force": True}}
+
+    second = canonicalize("push hotfix/issue-42 to origin, force it")
+    assert second.text == first.text
+    assert second.fill(lifted) == {"name": "git_push", "arguments": {"branch": "hotfix/issue-42", "force": True}}
+
+
+def test_fill_restores_integers():
+    lifted = canonicalize("undo the last 3 commits").lift(
+        {"name": "git_reset", "arguments": {"mode": "soft", "target": "HEAD~3"}}
+    )
+    assert lifted["arguments"]["target"] == "HEAD~<N1>"
+
+    lifted = canonicalize("show 8 commits").lift({"name": "git_log", "arguments": {"limit": 8}})
+    assert canonicalize("show 20 commits").fill(lifted) == {"name": "git_log", "arguments": {"limit": 20}}
+
+
+def test_lift_requires_every_slot():
+    template = canonicalize("merge main into dev-2")
+    assert template.lift({"name": "git_merge", "arguments": {"branch": "main"}}) is None
+
+
+def test_client_shares_template_answers(tmp_path, stub_backend):
+    backend = stub_backend(answers={"push feature-x": {"name": "git_push", "arguments": {"branch": "feature-x"}}})
+    client = DistilLabsLLM(
+        model_name="gitara", port=backend.port, cache=ResponseCache(tmp_path / "cache.sqlite3"), templates=True
+    )
+
+    assert client.invoke("push feature-x") == {"name": "git_push", "arguments": {"branch": "feature-x"}}
+    assert client.invoke("push feature-y") == {"name": "git_push", "arguments": {"branch": "feature-y"}}
+    assert len(backend.requests) == 1
+
+    client = DistilLabsLLM(model_name="gitara", port=backend.port, cache=ResponseCache(tmp_path / "cache.sqlite3"))
+    client.invoke("push feature-z")
+    assert len(backend.requests) == 2
+
+
+def test_synthetic_train_set():
+    report = evaluate(read_dataset(str(TRAIN)))
+    assert report["template_hits"] > 1000
+    assert report["rendered_accuracy"] > 0.95
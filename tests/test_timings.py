@@ -0,0 +1,91 @@
+import json
+from types import SimpleNamespace
+
+from click.testing import CliRunner
+
+from gitara.batch import translate_many
+from gitara.cli import main
+from gitara.model_client import DistilLabsLLM
+from gitara.timings import add_span, collect, record_usage, span, summarize
+
+STATUS = {"name": "git_status", "arguments": {}}
+
+
+def test_spans_are_free_without_collect():
+    assert span("request") is span("parse")
+    with collect() as timings:
+        with span("model"):
+            with span("request"):
+                pass
+        add_span("imports", timings.started - 0.5, timings.started)
+    with span("render"):
+        pass
+    spans = timings.to_dict()["spans"]
+    assert [(s["name"], s["depth"]) for s in spans] == [("imports", 0), ("model", 0), ("request", 1)]
+    assert spans[0]["ms"] == 500.0
+
+
+def test_usage_and_server_timings():
+    usage = SimpleNamespace(
+        prompt_tokens=100,
+        completion_tokens=10,
+        total_tokens=110,
+        prompt_tokens_details=SimpleNamespace(cached_tokens=90),
+    )
+    record_usage(usage)
+    with collect() as timings:
+        record_usage(usage, {"timings": {"prompt_ms": 20.0, "predicted_ms": 80.0}})
+        record_usage(usage)
+    assert timings.usage == {
+        "prompt_tokens": 200,
+        "completion_tokens": 20,
+        "total_tokens": 220,
+        "cached_prompt_tokens": 180,
+    }
+    assert timings.stages() == {"server_prefill": 20.0, "server_decode": 80.0}
+    assert timings.format()[-1] == "Tokens: prompt 200, completion 20, total 220, cached_prompt 180"
+
+
+def test_invoke_stages(stub_backend):
+    backend = stub_backend()
+    client = DistilLabsLLM(model_name="gitara", port=backend.port)
+    with collect() as timings:
+        assert client.invoke("status") == STATUS
+    stages = timings.to_dict()
+    assert {"rules", "cache", "bypass", "model", "prompt", "request", "parse", "validate"} <= set(stages["stages"])
+    depths = {span["name"]: span["depth"] for span in stages["spans"]}
+    assert depths["model"] < depths["request"]
+    assert stages["usage"] == {"prompt_tokens": 100, "completion_tokens": 10, "total_tokens": 110}
+    assert stages["total_ms"] >= stages["stages"]["model"] >= stages["stages"]["request"]
+
+    with collect() as timings:
+        client.invoke("status", on_partial=lambda state: None)
+    assert {"first_token", "decode"} <= set(timings.stages())
+
+
+def test_batch_timings_aggregate(stub_backend):
+    backend = stub_backend()
+    client = DistilLabsLLM(model_name="gitara", port=backend.port)
+    records = list(translate_many(client, [f"status {i}" for i in range(10)], timings=True))
+    assert all("render" in record["timings"]["stages"] for record in records)
+    summary = summarize(records)
+    assert summary["calls"] == 10
+    assert summary["stages_ms"]["request"]["count"] == 10
+    assert summary["stages_ms"]["total"]["p50"] <= summary["stages_ms"]["total"]["p99"]
+    assert summary["usage"]["total_tokens"] == 1100
+    assert "timings" not in next(translate_many(client, ["status"]))
+
+
+def test_cli_timings(stub_backend, tmp_path):
+    backend = stub_backend()
+    export = tmp_path / "timings.jsonl"
+    args = ["--no-cache", "--endpoint", backend.base_url, "--timings", "--timings-json", str(export)]
+    result = CliRunner().invoke(main, ["status", *args])
+    assert result.exit_code == 0, result.output
+    assert "git status" in result.stdout
+    assert "# Timings (total" in result.stderr
+    assert "# Tokens: prompt 100, completion 10, total 110" in result.stderr
+    [line] = export.read_text().splitlines()
+    exported = json.loads(line)
+    assert exported["query"] == "status"
+    assert {"imports", "setup", "model", "render"} <= set(exported["timings"]["stages"])
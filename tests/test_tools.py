@@ -0,0 +1,40 @@
+import json
+
+import pytest
+
+from gitara.model_client import DistilLabsLLM
+from gitara.tools import TOOL_PROFILES, TOOLS, profile_sizes
+
+
+def test_profiles_get_smaller():
+    assert TOOL_PROFILES["full"] is TOOLS
+    sizes = profile_sizes()
+    assert sizes["full"]["bytes"] > sizes["compact"]["bytes"] > sizes["minimal"]["bytes"]
+    assert sizes["full"]["tokens"] is None
+
+
+def test_compact_profiles_keep_what_the_model_needs():
+    for name in ("compact", "minimal"):
+        for full, compact in zip(TOOLS, TOOL_PROFILES[name]):
+            full, compact = full["function"], compact["function"]
+            assert compact["name"] == full["name"]
+            assert compact["parameters"].get("required", []) == full["parameters"]["required"]
+            assert set(compact["parameters"]["properties"]) == set(full["parameters"]["properties"])
+            for key, spec in compact["parameters"]["properties"].items():
+                original = full["parameters"]["properties"][key]
+                assert spec.get("enum") == original.get("enum")
+                assert spec["type"] == original["type"]
+                if original.get("default") not in (None, False):
+                    assert spec["default"] == original["default"]
+                assert ("description" in spec) == (name == "compact" and "description" in original)
+
+
+def test_client_sends_the_selected_profile(stub_backend):
+    backend = stub_backend()
+    client = DistilLabsLLM(model_name="gitara", port=backend.port, tool_profile="minimal")
+    client.invoke("status")
+    assert json.dumps(backend.requests[0]["tools"]) == json.dumps(TOOL_PROFILES["minimal"])
+    assert client.cache_namespace != DistilLabsLLM(model_name="gitara").cache_namespace
+
+    with pytest.raises(ValueError):
+        DistilLabsLLM(model_name="gitara", tool_profile="tiny")
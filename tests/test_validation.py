@@ -0,0 +1,65 @@
+from pathlib import Path
+
+import pytest
+
+from gitara.cache import ResponseCache
+from gitara.cli import parse_tool_call
+from gitara.dataset import read_dataset
+from gitara.model_client import DistilLabsLLM
+from gitara.validation import VALIDATOR, ToolCallError, benchmark, check_dataset
+
+DATA = Path(__file__).parent.parent / "finetuning" / "synthetic-data"
+
+
+@pytest.mark.parametrize(
+    ("tool_call", "error"),
+    [
+        ({"name": "git_blame", "arguments": {}}, "unknown tool 'git_blame'"),
+        ({"name": ["git_status"], "arguments": {}}, "unknown tool ['git_status']"),
+        ({"name": "git_add", "arguments": {}}, "missing required argument 'files'"),
+        ({"name": "git_add", "arguments": {"files": []}}, "files must have at least 1 items"),
+        ({"name": "git_add", "arguments": {"files": ["a", 1]}}, "files[] must be of type string, not int"),
+        ({"name": "git_reset", "arguments": {"mode": "medium"}}, "mode must be one of"),
+        ({"name": "git_log", "arguments": {"limit": True}}, "limit must be of type integer, not bool"),
+        ({"name": "git_log", "arguments": {"limit": 0}}, "limit must be at least 1"),
+        ({"name": "git_status", "arguments": {"color": True}}, "unknown argument 'color'"),
+        ({"name": "git_status", "arguments": "{}"}, "arguments must be an object"),
+    ],
+)
+def test_invalid_calls(tool_call, error):
+    [message] = VALIDATOR.errors(tool_call)
+    assert message.startswith(error)
+    with pytest.raises(ToolCallError):
+        VALIDATOR.validate(tool_call)
+
+
+def test_dataset_is_valid_and_normalizes():
+    rows = list(read_dataset(str(DATA / "train.jsonl")))
+    assert check_dataset(rows)["invalid"] == 0
+    assert VALIDATOR.normalize({"name": "git_push", "arguments": {"remote": "origin", "force": False}}) == {
+        "name": "git_push",
+        "arguments": {},
+    }
+    assert VALIDATOR.errors({"name": "git_status"}) == []
+    # Generous bound: a compiled check takes a few microseconds.
+    assert benchmark([call for _, call in rows], calls=20_000)["validate_us"] < 50
+
+
+def test_client_rejects_invalid_answers(stub_backend, tmp_path):
+    backend = stub_backend(default={"name": "git_reset", "arguments": {"mode": "medium"}})
+    client = DistilLabsLLM(model_name="gitara", port=backend.port, cache=ResponseCache(tmp_path / "cache.sqlite3"))
+    with pytest.raises(ToolCallError):
+        client.invoke("reset somehow")
+    assert client.lookup("reset somehow")[0] is None
+
+    client = DistilLabsLLM(model_name="gitara", port=backend.port, validator=None)
+    assert client.invoke("reset somehow") == {"name": "git_reset", "arguments": {"mode": "medium"}}
+
+
+def test_parse_tool_call_validates():
+    assert parse_tool_call('{"name": "git_add", "arguments": "{\\"files\\": [\\"a\\"]}"}') == {
+        "name": "git_add",
+        "arguments": {"files": ["a"]},
+    }
+    assert parse_tool_call('{"name": "git_add", "arguments": {}}') is None
+    assert parse_tool_call("[]") is None